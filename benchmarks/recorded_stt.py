@@ -0,0 +1,21 @@
+import asyncio
+import numpy as np
+from modules.stt_module import SpeechToText
+from benchmarks.recordings import load_user_speech
+
+class RecordedSpeechToText(SpeechToText):
+    """SpeechToText real (Vosk) sem microfone, alimentado pelas falas gravadas via feed()"""
+    block_seconds = 0.1
+    trailing_silence = 1.0  # silêncio após a fala para o Vosk fechar o resultado final
+
+    def __init__(self):
+        super().__init__(microphone=False)
+
+    async def say(self, text):
+        """Entrega a gravação da fala em tempo real, em blocos, como faria o microfone"""
+        audio = load_user_speech(text, self.sample_rate)
+        audio = np.concatenate([audio, np.zeros(int(self.trailing_silence * self.sample_rate), dtype=np.int16)])
+        block = int(self.block_seconds * self.sample_rate)
+        for start in range(0, len(audio), block):
+            self.feed(audio[start:start + block])
+            await asyncio.sleep(self.block_seconds)
@@ -0,0 +1,81 @@
+import json
+import wave
+import zlib
+from pathlib import Path
+import numpy as np
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+
+def load_conversation(path=None):
+    """Turnos gravados [{"user", "reply"}] usados por todos os benchmarks"""
+    with open(path or FIXTURES_DIR / "conversation.json", "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def load_wav(path):
+    """Lê um WAV PCM 16 bits mono como (int16, taxa de amostragem)"""
+    with wave.open(str(path), "rb") as f:
+        if f.getsampwidth() != 2:
+            raise ValueError(f"{path}: apenas PCM de 16 bits é suportado")
+        audio = np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16)
+        if f.getnchannels() > 1:
+            audio = audio.reshape(-1, f.getnchannels())[:, 0].copy()
+        return audio, f.getframerate()
+
+def synthetic_speech(text, sample_rate, seconds_per_word=0.25):
+    """Áudio determinístico com cara de fala: sílabas com envelope, pausas entre palavras
+
+    A semente vem do texto, então a mesma frase sempre gera o mesmo sinal.
+    """
+    rng = np.random.default_rng(zlib.crc32(text.encode("utf-8")))
+    words = text.split() or [""]
+    word_samples = int(seconds_per_word * sample_rate)
+    gap = word_samples // 5
+
+    pieces = []
+    for _ in words:
+        t = np.arange(word_samples - gap) / sample_rate
+        pitch = rng.uniform(110.0, 220.0)
+        syllables = rng.integers(1, 4)
+        envelope = np.abs(np.sin(np.pi * syllables * t / t[-1])) if len(t) > 1 else t
+        voiced = sum(np.sin(2 * np.pi * pitch * k * t) / k for k in (1, 2, 3))
+        pieces.append(voiced * envelope * 8000)
+        pieces.append(np.zeros(gap))
+    return np.concatenate(pieces).astype(np.int16)
+
+def speech_for(text, sample_rate):
+    """Áudio de uma fala: gravação em fixtures/speech/<crc>.wav, se houver, ou sintético"""
+    path = FIXTURES_DIR / "speech" / f"{zlib.crc32(text.encode('utf-8')):08x}.wav"
+    if path.exists():
+        audio, rate = load_wav(path)
+        if rate == sample_rate:
+            return audio
+    return synthetic_speech(text, sample_rate)
+
+def user_speech_path(text):
+    """Gravação da fala do usuário para o STT real: fixtures/user_speech/<crc>.wav"""
+    return FIXTURES_DIR / "user_speech" / f"{zlib.crc32(text.encode('utf-8')):08x}.wav"
+
+def load_user_speech(text, sample_rate):
+    """Áudio gravado de uma fala do usuário (sem sintético: o Vosk precisa de voz real)"""
+    audio, rate = load_wav(user_speech_path(text))
+    if rate != sample_rate:
+        raise ValueError(f"{user_speech_path(text).name}: {rate} Hz, esperado {sample_rate} Hz")
+    return audio
+
+def load_frames(count, width, height):
+    """Frames BGR de vídeo: fixtures/video.npy (N, H, W, 3) ou sintéticos determinísticos"""
+    path = FIXTURES_DIR / "video.npy"
+    if path.exists():
+        frames = np.load(path, mmap_mode="r")
+        return [np.ascontiguousarray(frames[i % len(frames)]) for i in range(count)]
+
+    # Cena sintética: fundo com ruído fixo e um "rosto" claro que se desloca
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 60, size=(height, width, 3), dtype=np.uint8)
+    frames = []
+    for i in range(count):
+        frame = background.copy()
+        x = int((width - 120) * (0.5 + 0.4 * np.sin(i / 15.0)))
+        frame[height // 3:height // 3 + 140, x:x + 120] = (170, 190, 220)
+        frames.append(frame)
+    return frames
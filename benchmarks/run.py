@@ -0,0 +1,455 @@
+"""Benchmarks offline do companion: python -m benchmarks.run [--only ...] [--compare base.json]
+
+Roda cada módulo e o pipeline completo a partir das gravações em
+benchmarks/fixtures, com microfone, câmera, LLM e TTS simulados, e grava os
+resultados em JSON para comparar execuções.
+
+Por padrão a escuta é dirigida por texto: o STT simulado emite parciais
+palavra a palavra, sem reconhecer áudio, então o estágio de escuta mede só
+o pipeline a partir da transcrição. Com --recorded-speech, o SpeechToText
+real (Vosk) recebe por feed() as gravações em fixtures/user_speech/<crc>.wav
+(PCM 16 bits, STT_SAMPLE_RATE), uma por fala do usuário.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+from config import settings
+from benchmarks import recordings
+from benchmarks.stubs import NullAvatar, StubTextToSpeech
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+def summarize(samples, elapsed=None):
+    """Percentis (ms) e vazão de uma lista de latências em segundos"""
+    if not samples:
+        return {"count": 0}
+    values = np.asarray(samples, dtype=np.float64) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    total = elapsed if elapsed is not None else values.sum() / 1000
+    return {
+        "count": len(values),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "mean_ms": float(values.mean()),
+        "max_ms": float(values.max()),
+        "throughput_per_s": len(values) / total if total > 0 else None
+    }
+
+async def timed(samples, awaitable):
+    start = time.perf_counter()
+    result = await awaitable
+    samples.append(time.perf_counter() - start)
+    return result
+
+def sentences(text):
+    from modules.segmenter_module import SentenceSegmenter
+    segmenter = SentenceSegmenter()
+    parts = segmenter.feed(text)
+    tail = segmenter.flush()
+    return parts + ([tail] if tail else [])
+
+# Benchmarks por módulo: cada um devolve um dict de métricas
+
+async def bench_emotion(conversation, options):
+    from modules.emotion_module import EmotionEngine
+    from modules.memory_module import MemorySystem
+    engine = EmotionEngine(MemorySystem(), NullAvatar())
+    texts = [turn[key] for turn in conversation for key in ("user", "reply")]
+
+    update, classify = [], []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(options.iterations):
+            for text in texts:
+                await timed(update, engine.update_emotion(text, False))
+                start = time.perf_counter()
+                engine.classify_sentiment(text)
+                classify.append(time.perf_counter() - start)
+    return {"update_emotion": summarize(update), "classify_sentiment": summarize(classify)}
+
+async def bench_gesture(conversation, options):
+    from modules.gesture_module import GestureController
+    controller = GestureController(NullAvatar())
+    texts = [turn["reply"] for turn in conversation]
+
+    analyze, execute = [], []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(options.iterations):
+            for text in texts:
+                gesture = await timed(analyze, controller.analyze_text_for_gestures(text))
+                await timed(execute, controller.execute_gesture(gesture, 0.5))
+    return {"analyze_text_for_gestures": summarize(analyze), "execute_gesture": summarize(execute)}
+
+async def bench_lipsync(conversation, options):
+    from modules.lipsync_module import LipSync
+    tts = StubTextToSpeech()
+    lipsync = LipSync(tts, NullAvatar())
+    clips = [(text, recordings.speech_for(text, tts.sample_rate))
+             for turn in conversation for text in sentences(turn["reply"])]
+
+    cold, warm, update = [], [], []
+    for text, audio in clips:
+        start = time.perf_counter()
+        lipsync.build_timeline(audio, text)
+        cold.append(time.perf_counter() - start)
+    for _ in range(options.iterations):
+        for text, audio in clips:
+            start = time.perf_counter()
+            track = lipsync.build_timeline(audio, text)
+            warm.append(time.perf_counter() - start)
+
+    # Amostragem por frame, como o relógio de renderização faria durante a fala
+    frame_time = 1.0 / settings.RENDER_FPS
+    audio_seconds = 0.0
+    for text, audio in clips:
+        track = lipsync.build_timeline(audio, text)
+        duration = len(audio) / tts.sample_rate
+        audio_seconds += duration
+        lipsync.track, lipsync.track_start = track, 0.0
+        for now in np.arange(0.0, duration, frame_time):
+            start = time.perf_counter()
+            lipsync.update(float(now))
+            update.append(time.perf_counter() - start)
+    return {
+        "build_timeline_cold": summarize(cold),
+        "build_timeline": summarize(warm),
+        "update_per_frame": summarize(update),
+        "audio_seconds": audio_seconds,
+        "g2p_cache": lipsync.g2p.word.cache_info()._asdict()
+    }
+
+async def bench_memory(conversation, options):
+    from modules.memory_module import MemorySystem
+    memory = MemorySystem()
+    with contextlib.redirect_stdout(io.StringIO()):
+        await memory.load()
+
+    add, retrieve = [], []
+    try:
+        for i in range(options.iterations):
+            for turn in conversation:
+                start = time.perf_counter()
+                memory.add_interaction(f"{turn['user']} ({i})", turn["reply"])
+                add.append(time.perf_counter() - start)
+        flush = []
+        await timed(flush, memory.save())
+        # Deixar o índice semântico absorver as pendências antes de consultar
+        await asyncio.sleep(settings.MEMORY_FLUSH_INTERVAL)
+        for turn in conversation:
+            await timed(retrieve, memory.retrieve(turn["user"]))
+    finally:
+        await memory.close()
+    return {
+        "add_interaction": summarize(add),
+        "flush_ms": flush[0] * 1000,
+        "retrieve": summarize(retrieve),
+        "long_term_entries": len(memory.long_term_memory)
+    }
+
+async def bench_prompt(conversation, options):
+    from modules.gemini_module import GeminiBrain
+    from modules.memory_module import MemorySystem
+    brain = GeminiBrain(MemorySystem())
+    history = [
+        {"timestamp": f"t{i}", "input": turn["user"], "response": turn["reply"], "sentiment": "neutral"}
+        for i, turn in enumerate(conversation)
+    ]
+    vision_data = {"faces": [{"name": "Carlos"}], "timestamp": time.monotonic()}
+
+    build = []
+    for _ in range(options.iterations):
+        for i, turn in enumerate(conversation):
+            context = history[max(0, i - 5):i]
+            memories = history[:3]
+            start = time.perf_counter()
+            brain.build_prompt(turn["user"], context, vision_data, memories)
+            build.append(time.perf_counter() - start)
+    return {"build_prompt": summarize(build)}
+
+async def bench_vision(conversation, options):
+    from benchmarks.stub_vision import BenchmarkVision
+    BenchmarkVision.frames = recordings.load_frames(90, settings.FRAME_WIDTH, settings.FRAME_HEIGHT)
+    vision = BenchmarkVision()
+    await vision.load_models()
+
+    staleness, intervals = [], []
+    try:
+        deadline = time.monotonic() + options.vision_seconds
+        last = None
+        while time.monotonic() < deadline:
+            result = await vision.next_result()
+            now = time.monotonic()
+            staleness.append(now - result["timestamp"])
+            if last is not None:
+                intervals.append(now - last)
+            last = now
+    finally:
+        await vision.stop()
+    return {
+        "staleness": summarize(staleness),
+        "result_interval": summarize(intervals),
+        "results_per_s": len(staleness) / options.vision_seconds,
+        "dropped_frames": vision.dropped_frames
+    }
+
+async def bench_companion(conversation, options):
+    """Pipeline completo: turnos falados pelo microfone simulado até o áudio da resposta"""
+    import modules.gemini_module  # o Gemini é obrigatório; sem o SDK o benchmark é pulado
+    from main import VirtualCompanion
+    from modules.fake_gemini_module import FakeGenerativeModel
+    from modules.tracing_module import tracer
+
+    class BenchmarkCompanion(VirtualCompanion):
+        def __init__(self):
+            super().__init__()
+            self.completed_turns = 0
+
+        def register_modules(self, register):
+            register('memory', "modules.memory_module:MemorySystem", loader="load")
+            if options.with_vision:
+                register('vision', "benchmarks.stub_vision:BenchmarkVision", loader="load_models")
+            if options.recorded_speech:
+                register('stt', "benchmarks.recorded_stt:RecordedSpeechToText", loader="load_model")
+            else:
+                register('stt', "benchmarks.stubs:StubSpeechToText", loader="load_model")
+            register('tts', "benchmarks.stubs:StubTextToSpeech", loader="load_model")
+            register('gemini', "modules.gemini_module:GeminiBrain", deps=['memory'], loader="initialize")
+            # O avatar real roda sem modelo VRM; sem pyvrm, o substituto nulo
+            try:
+                import modules.avatar_module
+                register('avatar', "modules.avatar_module:AvatarController")
+            except ImportError:
+                register('avatar', "benchmarks.stubs:NullAvatar")
+            register('lipsync', "modules.lipsync_module:LipSync", deps=['tts', 'avatar'])
+            register('gesture', "modules.gesture_module:GestureController", deps=['avatar'])
+            register('emotion', "modules.emotion_module:EmotionEngine", deps=['memory', 'avatar'])
+
+        async def reasoning_stage(self):
+            await super().reasoning_stage()
+            self.completed_turns += 1
+
+    turns = conversation[:options.turns] if options.turns else conversation
+    if options.recorded_speech:
+        import benchmarks.recorded_stt  # Vosk e PyAudio são necessários; sem eles, pulado
+        missing = [turn["user"] for turn in turns if not recordings.user_speech_path(turn["user"]).exists()]
+        if missing:
+            raise FileNotFoundError(f"falas sem gravação em fixtures/user_speech: {missing}")
+
+    if options.with_vision:
+        from benchmarks.stub_vision import BenchmarkVision
+        BenchmarkVision.frames = recordings.load_frames(90, settings.FRAME_WIDTH, settings.FRAME_HEIGHT)
+
+    tracer.enabled = True
+    tracer.events.clear()
+    tracer.histograms.clear()
+
+    companion = BenchmarkCompanion()
+    with contextlib.redirect_stdout(io.StringIO()):
+        await companion.initialize()
+        if 'stt' not in companion.modules:
+            raise RuntimeError(f"STT indisponível: {companion.registry.errors.get('stt')!r}")
+        replies = {turn["user"]: turn["reply"] for turn in conversation}
+        companion.modules['gemini'].model = FakeGenerativeModel(
+            first_token_latency=options.llm_latency, replies=replies
+        )
+        runner = asyncio.create_task(companion.run())
+
+        turn_times = []
+        started = time.perf_counter()
+        try:
+            for index, turn in enumerate(turns, start=1):
+                start = time.perf_counter()
+                await companion.modules['stt'].say(turn["user"])
+                await wait_idle(companion, index)
+                turn_times.append(time.perf_counter() - start)
+        finally:
+            elapsed = time.perf_counter() - started
+            await companion.stop()
+            runner.cancel()
+            await asyncio.gather(runner, return_exceptions=True)
+
+    metrics = tracer.get_stats()
+    tracer.enabled = settings.TRACE_ENABLED
+    return {
+        "turn_wall_time": summarize(turn_times, elapsed),
+        "turns_per_minute": 60 * len(turn_times) / elapsed if elapsed else None,
+        "latency": metrics,
+        "startup": {
+            name: {phase: round(value, 4) for phase, value in timing.items()}
+            for name, timing in companion.registry.timings.items()
+        },
+        "degraded": sorted(companion.registry.errors),
+        "listening": "vosk" if options.recorded_speech else "texto",
+        "render": companion.render_clock.get_stats(),
+        "sentences_spoken": companion.modules['tts'].sentences
+    }
+
+async def wait_idle(companion, turn_index, timeout=60.0):
+    """Espera a resposta do turno terminar de ser gerada, sintetizada e reproduzida"""
+    deadline = time.monotonic() + timeout
+    idle_checks = 0
+    while time.monotonic() < deadline:
+        idle = (
+            companion.completed_turns >= turn_index
+            and companion.speech_queue.empty()
+            and companion.audio_queue.empty()
+            and companion.modules['tts'].busy == 0
+        )
+        idle_checks = idle_checks + 1 if idle else 0
+        if idle_checks >= 3:
+            return
+        await asyncio.sleep(0.02)
+    raise TimeoutError(f"Turno {turn_index} não terminou em {timeout}s")
+
+BENCHMARKS = {
+    "emotion": bench_emotion,
+    "gesture": bench_gesture,
+    "lipsync": bench_lipsync,
+    "memory": bench_memory,
+    "prompt": bench_prompt,
+    "vision": bench_vision,
+    "companion": bench_companion
+}
+
+@contextlib.contextmanager
+def isolated_settings(directory, options):
+    """Aponta dados e caches para um diretório temporário durante os benchmarks"""
+    overrides = {
+        "MEMORY_DIR": directory / "memory",
+        "FACES_DIR": directory / "faces",
+        "FACE_CACHE_DIR": directory / "face_cache",
+        "TRACE_PATH": directory / "trace.json",
+        "GEMINI_FAKE": True,
+        "MEMORY_EMBEDDING_MODEL": settings.MEMORY_EMBEDDING_MODEL if options.embedding_model else None
+    }
+    previous = {name: getattr(settings, name) for name in overrides}
+    previous_cache_dir = StubTextToSpeech.cache_dir
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+    StubTextToSpeech.cache_dir = directory / "tts_cache"
+    try:
+        yield overrides
+    finally:
+        for name, value in previous.items():
+            setattr(settings, name, value)
+        StubTextToSpeech.cache_dir = previous_cache_dir
+
+async def run_benchmark(name, conversation, options):
+    """Executa um benchmark isolando falhas; dependências ausentes viram 'skipped'"""
+    random.seed(0)
+    if options.tracemalloc:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = {"status": "ok", **await BENCHMARKS[name](conversation, options)}
+    except ImportError as e:
+        result = {"status": "skipped", "reason": f"dependência ausente: {e.name or e}"}
+    except Exception as e:
+        result = {"status": "error", "reason": repr(e)}
+    result["wall_s"] = time.perf_counter() - start
+    if options.tracemalloc:
+        result["peak_python_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    result["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return result
+
+def metadata(options):
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "options": {key: value for key, value in vars(options).items() if key not in ("output", "compare")}
+    }
+
+def compare(results, baseline_path):
+    """Imprime a variação de p50/p95 em relação a uma execução anterior"""
+    with open(baseline_path, "r") as f:
+        baseline = json.load(f)["benchmarks"]
+    print(f"\nComparação com {baseline_path}:")
+    for name, result in results.items():
+        for metric, current, previous in _paired_stats(result, baseline.get(name, {})):
+            for key in ("p50_ms", "p95_ms"):
+                if key in current and key in previous and previous[key]:
+                    change = 100 * (current[key] - previous[key]) / previous[key]
+                    print(f"  {name}.{metric}.{key}: {previous[key]:.3f} -> {current[key]:.3f} ({change:+.1f}%)")
+
+def _paired_stats(current, previous, prefix=""):
+    for key, value in current.items():
+        if not isinstance(value, dict) or not isinstance(previous.get(key), dict):
+            continue
+        if "count" in value:
+            yield prefix + key, value, previous[key]
+        else:
+            yield from _paired_stats(value, previous[key], f"{prefix}{key}.")
+
+def print_report(results):
+    for name, result in results.items():
+        print(f"\n[{name}] {result['status']} em {result['wall_s']:.2f}s"
+              + (f" — {result['reason']}" if "reason" in result else ""))
+        for metric, stats, _ in _paired_stats(result, result):
+            if stats.get("count"):
+                print(f"  {metric:<40} n={stats['count']:<6} p50 {stats['p50_ms']:9.3f}ms  "
+                      f"p95 {stats['p95_ms']:9.3f}ms  p99 {stats['p99_ms']:9.3f}ms")
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks offline do companion virtual")
+    parser.add_argument("--only", help="benchmarks separados por vírgula: " + ",".join(BENCHMARKS))
+    parser.add_argument("--iterations", type=int, default=20, help="repetições da conversa por módulo")
+    parser.add_argument("--turns", type=int, default=0, help="turnos no benchmark completo (0 = todos)")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="latência simulada até o primeiro token")
+    parser.add_argument("--vision-seconds", type=float, default=5.0)
+    parser.add_argument("--with-vision", action="store_true", help="incluir a visão no benchmark completo")
+    parser.add_argument("--recorded-speech", action="store_true",
+                        help="alimentar o STT real com fixtures/user_speech em vez do STT dirigido por texto")
+    parser.add_argument("--embedding-model", action="store_true", help="usar o modelo de embedding configurado")
+    parser.add_argument("--tracemalloc", action="store_true", help="medir o pico de memória Python (mais lento)")
+    parser.add_argument("--conversation", type=Path, help="fixture de conversa alternativa")
+    parser.add_argument("--output", type=Path, help="arquivo JSON de resultados")
+    parser.add_argument("--compare", type=Path, help="resultado anterior para comparação")
+    options = parser.parse_args(argv)
+
+    names = options.only.split(",") if options.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"benchmarks desconhecidos: {', '.join(unknown)}")
+
+    conversation = recordings.load_conversation(options.conversation)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        with isolated_settings(Path(directory), options):
+            for name in names:
+                results[name] = await run_benchmark(name, conversation, options)
+
+    print_report(results)
+    output = options.output or RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"meta": metadata(options), "benchmarks": results}, f, indent=2, default=str)
+    print(f"\nResultados gravados em {output}")
+
+    if options.compare:
+        compare(results, options.compare)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,12 @@
+from modules.vision_module import VisionProcessor
+from benchmarks.stubs import StubCamera
+
+class BenchmarkVision(VisionProcessor):
+    """VisionProcessor real alimentado por frames gravados em vez da câmera"""
+    frames = []
+    fps = 30.0
+
+    async def load_models(self):
+        self.cap = StubCamera(self.frames, self.fps)
+        await self.load_known_faces()
+        await self.start()
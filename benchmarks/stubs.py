@@ -0,0 +1,145 @@
+import asyncio
+import time
+from config import settings
+from modules.tts_cache_module import AudioCache
+from benchmarks.recordings import speech_for
+
+class StubCamera:
+    """Substitui o cv2.VideoCapture: devolve frames gravados na taxa da câmera"""
+    def __init__(self, frames, fps=30.0):
+        self.frames = frames
+        self.frame_time = 1.0 / fps
+        self.index = 0
+        self.next_frame = time.monotonic()
+
+    def isOpened(self):
+        return True
+
+    def set(self, prop, value):
+        return True
+
+    def read(self):
+        delay = self.next_frame - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self.next_frame = max(self.next_frame + self.frame_time, time.monotonic())
+        frame = self.frames[self.index % len(self.frames)]
+        self.index += 1
+        return True, frame
+
+    def release(self):
+        pass
+
+class StubSpeechToText:
+    """Microfone + reconhecedor simulados: transcreve as falas que o benchmark "diz"
+
+    say() reproduz a fala em tempo real emitindo parciais palavra a palavra,
+    uma parcial estável e a final, no mesmo formato de eventos do SpeechToText.
+    """
+    def __init__(self):
+        self.sample_rate = settings.STT_SAMPLE_RATE
+        self.is_listening = False
+        self.events = asyncio.Queue()
+
+    async def load_model(self):
+        self.is_listening = True
+
+    async def stop(self):
+        self.is_listening = False
+
+    async def say(self, text, seconds_per_word=0.3):
+        words = text.split()
+        for count in range(1, len(words) + 1):
+            await asyncio.sleep(seconds_per_word)
+            partial = " ".join(words[:count])
+            self.events.put_nowait({"text": partial, "final": False, "stable": False, "timestamp": time.monotonic()})
+        self.events.put_nowait({"text": text, "final": False, "stable": True, "timestamp": time.monotonic()})
+
+        # Fim da fala, seguido da latência de reconhecimento do Vosk
+        end_of_speech = time.monotonic()
+        await asyncio.sleep(0.05)
+        self.events.put_nowait({
+            "text": text,
+            "final": True,
+            "stable": True,
+            "end_of_speech": end_of_speech,
+            "timestamp": time.monotonic()
+        })
+
+    async def transcripts(self):
+        while self.is_listening:
+            yield await self.events.get()
+
+    async def listen(self):
+        async for event in self.transcripts():
+            if event["final"]:
+                return event["text"]
+        return None
+
+class StubTextToSpeech:
+    """TTS determinístico: áudio sintético com custo de síntese proporcional ao texto"""
+    seconds_per_char = 0.002  # custo aproximado do Piper em CPU
+    cache_dir = None
+
+    def __init__(self):
+        self.sample_rate = 22050
+        self.cache = AudioCache(cache_dir=self.cache_dir)
+        self.busy = 0
+        self.sentences = 0
+
+    async def load_model(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def cache_key(self, text):
+        return AudioCache.make_key(text, "stub", self.sample_rate)
+
+    def alignment(self, text):
+        return None
+
+    async def stream(self, text):
+        yield await self.synthesize(text)
+
+    async def synthesize(self, text):
+        self.busy += 1
+        try:
+            await asyncio.sleep(len(text) * self.seconds_per_char)
+            self.sentences += 1
+            return speech_for(text, self.sample_rate)
+        finally:
+            self.busy -= 1
+
+    async def play(self, audio_data):
+        self.busy += 1
+        try:
+            await asyncio.sleep(len(audio_data) / self.sample_rate)
+        finally:
+            self.busy -= 1
+
+class NullAvatar:
+    """Avatar sem motor 3D: aceita os comandos e conta as chamadas"""
+    def __init__(self):
+        self.calls = 0
+
+    async def load_avatar(self, vrm_path=None):
+        pass
+
+    async def set_emotion(self, emotion_blend_shape, intensity):
+        self.calls += 1
+
+    async def set_gesture(self, gesture_name, blend_shape, intensity, duration):
+        self.calls += 1
+
+    async def set_viseme(self, viseme, intensity):
+        self.calls += 1
+
+    def set_mouth(self, viseme_index, intensity):
+        self.calls += 1
+
+    async def update_from_vision(self, vision_data):
+        self.calls += 1
+
+    async def render_frame(self):
+        pass
@@ -3,6 +3,33 @@ from pathlib import Path
 
 # Configurações da API
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "sua_chave_aqui")
+GEMINI_MODEL = "gemini-2.5-flash"
+GEMINI_FAKE = os.getenv("GEMINI_FAKE") == "1"  # usa um modelo local simulado (offline)
+GEMINI_TIMEOUT = 10.0  # segundos para uma resposta completa
+GEMINI_FIRST_TOKEN_TIMEOUT = 4.0  # segundos até a primeira parte em streaming
+GEMINI_STREAM_TIMEOUT = 10.0  # segundos máximos entre partes seguintes
+GEMINI_MAX_RETRIES = 2  # novas tentativas para falhas transitórias
+GEMINI_RETRY_BASE_DELAY = 0.5  # base do backoff exponencial com jitter
+GEMINI_RESPONSE_DEADLINE = 5.0  # prazo total até a primeira parte (todas as tentativas) antes da resposta local
+FALLBACK_REPLIES = [
+    "Hmm, me dá só um instante, estou pensando...",
+    "Desculpa, me perdi um pouquinho. Pode repetir?",
+    "Boa pergunta! Deixa eu pensar melhor nisso."
+]
+
+# Configurações do Cache de Respostas
+RESPONSE_CACHE_SIZE = 256  # respostas mantidas no LRU
+RESPONSE_CACHE_TTL = 600  # segundos de validade de uma resposta em cache
+RESPONSE_CACHE_MAX_WORDS = 4  # falas até este tamanho ignoram o contexto recente na chave
+
+# Configurações do Prompt
+SYSTEM_PREAMBLE = "Você é um companion virtual amigável e útil."
+PROMPT_TOKEN_BUDGET = 1500  # tokens para contexto, memórias, visão e entrada
+PROMPT_MAX_TURN_TOKENS = 200  # falas longas são truncadas neste tamanho
+PROMPT_CHARS_PER_TOKEN = 4  # estimativa local de tokens
+PROMPT_CACHE_MIN_TOKENS = 1024  # preâmbulos menores usam instrução de sistema sem cache explícito
+PROMPT_CACHE_TTL = 3600  # segundos de vida do prefixo em cache
+PROMPT_CACHE_REFRESH_MARGIN = 300  # renovar o cache quando faltar este tempo
 
 # Paths
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -18,6 +45,16 @@ CHUNK_SIZE = 1024
 CAMERA_INDEX = 0
 FRAME_WIDTH = 640
 FRAME_HEIGHT = 480
+VISION_TRACKING = True  # detectar esporadicamente e rastrear rostos entre detecções
+VISION_TRACK_INTERVAL = 1 / 30  # intervalo entre frames rastreados
+VISION_DETECT_EVERY = 15  # frames rastreados entre detecções completas
+VISION_DETECTION_SCALE = 0.5  # escala do frame usado na detecção
+VISION_TRACK_IOU = 0.3  # sobreposição mínima para manter a identidade de uma trilha
+VISION_TRACK_MIN_SIZE = 16  # caixas menores que isso contam como perda do rastreio
+VISION_ROI_MARGIN = 0.25  # margem ao recortar rostos para codificação
+FACE_MATCH_TOLERANCE = 0.6  # distância máxima para reconhecer um rosto conhecido
+FACES_DIR = DATA_DIR / "faces"  # galeria de rostos conhecidos (*.jpg)
+FACE_CACHE_DIR = DATA_DIR / "face_cache"  # codificações pré-calculadas da galeria
 
 # Configurações do Avatar
 VRM_PATH = ASSETS_DIR / "avatar.vrm"
@@ -25,6 +62,107 @@ VRM_PATH = ASSETS_DIR / "avatar.vrm"
 # Configurações de Emoção
 EMOTION_TRANSITION_TIME = 1.0  # segundos para transições de emoção
 DEFAULT_EMOTION_INTENSITY = 0.5
+SENTIMENT_WINDOW = 5  # interações recentes consideradas no fator de histórico
+
+# Configurações de Expressão
+AVATAR_TRANSITION_TIMES = {  # segundos de interpolação por camada
+    "emotion": EMOTION_TRANSITION_TIME,
+    "gesture": 0.25,
+    "viseme": 0.06,
+    "blink": 0.05
+}
+AVATAR_CHANNEL_WEIGHTS = {"emotion": 1.0, "gesture": 1.0, "viseme": 1.0, "blink": 1.0}
+
+# Configurações de Sincronia Labial
+LIPSYNC_ENVELOPE_HOP = 0.02  # segundos por janela do envelope RMS
+LIPSYNC_VOICED_THRESHOLD = 0.1  # envelope normalizado acima disso conta como voz
+LIPSYNC_VISEME_WEIGHT = 0.7  # abertura máxima de cada viseme
+LIPSYNC_MIN_OPENING = 0.3  # fração da abertura mantida mesmo com áudio fraco
+LIPSYNC_AUDIO_LATENCY = 0.05  # atraso estimado entre enfileirar e ouvir o áudio
+G2P_LEXICON_PATH = BASE_DIR / "config" / "pronunciations.json"  # opcional: {palavra: "f o n e m a s"}
+G2P_CACHE_SIZE = 4096  # pronúncias de palavras mantidas em cache
+
+# Configurações de Memória
+MEMORY_DIR = DATA_DIR / "memory"
+MEMORY_LOAD_TAIL = 200  # interações de longo prazo mantidas em RAM
+MEMORY_FLUSH_INTERVAL = 1.0  # segundos para agrupar gravações no diário
+MEMORY_COMPACT_EVERY = 1000  # registros gravados entre compactações
+MEMORY_MAX_ENTRIES = 100000  # registros mantidos no diário após compactação
+MEMORY_EMBEDDING_MODEL = "paraphrase-multilingual-MiniLM-L12-v2"  # None (ou modelo indisponível) usa hashing local
+MEMORY_EMBEDDING_DIM = 256  # dimensão do embedding por hashing
+MEMORY_RETRIEVAL_K = 3  # memórias relevantes incluídas no prompt
+MEMORY_MIN_SIMILARITY = 0.3  # similaridade de cosseno mínima para incluir uma memória
+MEMORY_ANN_THRESHOLD = 50000  # a partir deste tamanho a busca usa o índice IVF
+MEMORY_ANN_NPROBE = 8  # listas do IVF visitadas por consulta
+
+# Configurações de Léxicos
+LEXICON_PATH = BASE_DIR / "config" / "lexicons.json"  # opcional: substitui os léxicos padrão
+LEXICON_RELOAD_INTERVAL = 2.0  # segundos entre verificações de alteração do arquivo
 
 # Configurações de Gestos
-GESTURE_COOLDOWN = 5.0  # segundos entre gestos
\ No newline at end of file
+GESTURE_COOLDOWN = 5.0  # segundos entre gestos
+
+# Configurações de Inicialização
+STARTUP_LOAD_TIMEOUT = 120.0  # segundos máximos para carregar cada módulo
+STARTUP_REQUIRED_MODULES = ["memory", "gemini"]  # sem eles o companion não inicia
+
+# Configurações de Rastreamento
+TRACE_ENABLED = os.getenv("LUNA_TRACE") == "1"  # spans e histogramas de latência
+TRACE_PATH = DATA_DIR / "traces" / "trace.json"  # exportado no formato Chrome trace ao encerrar
+TRACE_MAX_EVENTS = 100000  # eventos mantidos no buffer circular
+TRACE_HISTOGRAM_WINDOW = 1000  # amostras recentes por métrica
+
+# Configurações do Pipeline
+VISION_INTERVAL = 0.2  # intervalo mínimo entre detecções de rosto
+VISION_MAX_STALENESS = 0.5  # frames mais antigos que isso não são processados
+VISION_ERROR_BACKOFF = 1.0  # espera após uma falha do detector antes de tentar de novo
+RENDER_FPS = 30  # taxa alvo de atualização do avatar
+RENDER_STATS_WINDOW = 300  # frames considerados nas estatísticas de renderização
+TEXT_QUEUE_SIZE = 2  # falas aguardando o Gemini
+SPEECH_QUEUE_SIZE = 4  # frases aguardando TTS
+AUDIO_QUEUE_SIZE = 2  # áudios sintetizados aguardando lipsync
+
+# Configurações de STT
+STT_SAMPLE_RATE = 16000  # taxa esperada pelos modelos Vosk
+STT_RING_SECONDS = 10  # capacidade do buffer de captura
+STT_PREROLL_SECONDS = 0.3  # áudio mantido antes do início da fala
+STT_SILENCE_DURATION = 0.6  # silêncio que encerra uma fala
+STT_MIN_SPEECH_DURATION = 0.2  # falas mais curtas são descartadas
+STT_PHRASE_TIME_LIMIT = 5.0  # duração máxima de uma fala
+STT_STREAMING = True  # reconhecimento incremental com resultados parciais
+STT_MODEL_PATH = MODELS_DIR / "stt" / "vosk-model-pt"
+STT_STABLE_PARTIAL_TIME = 0.4  # parcial inalterado por este tempo é considerado estável
+SPECULATIVE_DISPATCH = True  # iniciar o Gemini a partir de parciais estáveis
+
+# Configurações de Segmentação de Respostas
+SEGMENT_MIN_CLAUSE_CHARS = 40  # orações menores esperam pela próxima pontuação
+SEGMENT_MAX_CHARS = 200  # corte forçado em respostas sem pontuação
+
+# Configurações de TTS
+TTS_MODEL_PATH = MODELS_DIR / "tts" / "portuguese_model.onnx"
+TTS_PLAYBACK_BUFFER_SECONDS = 2.0  # capacidade do buffer de reprodução
+TTS_PHONEME_ALIGNMENT = True  # pedir ao Piper a duração de cada fonema, se suportado
+TTS_ALIGNMENT_CACHE = 16  # alinhamentos guardados até a sincronia labial consumi-los
+TTS_CACHE_MEMORY_BYTES = 32 * 1024 * 1024  # nível em memória do cache de áudio
+TTS_CACHE_DISK_BYTES = 512 * 1024 * 1024  # nível em disco (DATA_DIR/tts_cache)
+
+# Configurações do Servidor
+SERVER_HOST = "127.0.0.1"  # use "0.0.0.0" para aceitar conexões externas
+SERVER_PORT = 8765
+SERVER_MAX_SESSIONS = 8  # sessões simultâneas; acima disso a conexão recebe 503
+SERVER_MAX_STARTING = 2  # sessões inicializando ao mesmo tempo
+SERVER_RETRY_AFTER = 5  # segundos sugeridos ao cliente recusado
+SERVER_HEARTBEAT = 20.0  # ping do WebSocket para detectar clientes mortos
+SERVER_MAX_MESSAGE_BYTES = 2 * 1024 * 1024  # maior frame de vídeo aceito
+SERVER_VISION_WORKERS = 2  # processos de detecção de rosto compartilhados
+SERVER_USERS_DIR = MEMORY_DIR / "users"  # memória separada por usuário
+
+# Configurações de Micro-lotes (modelos compartilhados no servidor)
+BATCHING_ENABLED = True  # agrupar pedidos concorrentes das sessões
+FACE_BATCH_SIZE = 8  # frames ou rostos por lote
+FACE_BATCH_WINDOW = 0.015  # espera máxima por pedidos de outras sessões
+TTS_BATCH_SIZE = 4  # frases por lote
+TTS_BATCH_WINDOW = 0.02
+STT_BATCH_SIZE = 8  # falas completas por lote (STT sem streaming)
+STT_BATCH_WINDOW = 0.05
+STT_BATCH_WORKERS = 2  # threads de reconhecimento compartilhadas
@@ -1,104 +1,349 @@
+import argparse
 import asyncio
 import time
-from modules.stt_module import SpeechToText
-from modules.tts_module import TextToSpeech
-from modules.vision_module import VisionProcessor
-from modules.memory_module import MemorySystem
-from modules.gemini_module import GeminiBrain
-from modules.avatar_module import AvatarController
-from modules.lipsync_module import LipSync
-from modules.gesture_module import GestureController
-from modules.emotion_module import EmotionEngine
+from config import settings
+from modules.segmenter_module import SentenceSegmenter
+from modules.render_module import RenderClock
+from modules.startup_module import ModuleRegistry
+from modules.tracing_module import tracer
+
+# Estágios do pipeline e os módulos sem os quais eles não rodam
+STAGE_REQUIREMENTS = {
+    "captura": ("vision",),
+    "percepção": ("vision",),
+    "escuta": ("stt",),
+    "raciocínio": ("gemini", "memory"),
+    "fala": ("tts",),
+    "reprodução": ("tts",),
+    "render": ("avatar",)
+}
 
 class VirtualCompanion:
     def __init__(self):
         self.is_running = False
         self.modules = {}
+        self.tasks = []
+        self.latest_vision = None
+        self.render_clock = RenderClock()
+        self.registry = ModuleRegistry()
+        self.started_at = None
+        self.first_interaction_at = None
+        
+        # Filas entre os estágios do pipeline (limitadas para aplicar backpressure)
+        self.vision_queue = asyncio.Queue(maxsize=1)
+        self.text_queue = asyncio.Queue(maxsize=settings.TEXT_QUEUE_SIZE)
+        self.speech_queue = asyncio.Queue(maxsize=settings.SPEECH_QUEUE_SIZE)
+        self.audio_queue = asyncio.Queue(maxsize=settings.AUDIO_QUEUE_SIZE)
         
     async def initialize(self):
-        """Inicializa todos os módulos"""
+        """Inicializa todos os módulos (em paralelo; módulos opcionais podem falhar)"""
         print("Inicializando companion virtual...")
+        self.started_at = time.perf_counter()
+        
+        self.register_modules(self.registry.register)
+        for name in settings.STARTUP_REQUIRED_MODULES:
+            self.registry.specs[name].required = True
         
-        # Inicializar módulos básicos
-        self.modules['memory'] = MemorySystem()
-        self.modules['vision'] = VisionProcessor()
-        self.modules['stt'] = SpeechToText()
-        self.modules['tts'] = TextToSpeech()
-        self.modules['gemini'] = GeminiBrain(self.modules['memory'])
-        self.modules['avatar'] = AvatarController()
-        self.modules['lipsync'] = LipSync(self.modules['tts'])
-        
-        # Inicializar novos módulos
-        self.modules['gesture'] = GestureController(self.modules['avatar'])
-        self.modules['emotion'] = EmotionEngine(
-            self.modules['memory'], 
-            self.modules['avatar']
-        )
-        
-        # Carregar modelos
-        await asyncio.gather(
-            self.modules['stt'].load_model(),
-            self.modules['tts'].load_model(),
-            self.modules['vision'].load_models(),
-            self.modules['memory'].load(),
-            self.modules['avatar'].load_avatar("assets/avatar.vrm")
-        )
-        
-        print("Companion inicializado com sucesso!")
+        self.modules = self.registry.modules
+        await self.registry.start()
+        
+        if self.registry.errors:
+            print(f"Companion inicializado em modo degradado (sem {', '.join(self.registry.errors)})")
+        else:
+            print("Companion inicializado com sucesso!")
+    
+    def register_modules(self, register):
+        """Declara os módulos; classes indicadas por caminho, importadas só na inicialização"""
+        register('memory', "modules.memory_module:MemorySystem", loader="load")
+        register('vision', "modules.vision_module:VisionProcessor", loader="load_models")
+        register('stt', "modules.stt_module:SpeechToText", loader="load_model")
+        register('tts', "modules.tts_module:TextToSpeech", loader="load_model")
+        register('gemini', "modules.gemini_module:GeminiBrain", deps=['memory'], loader="initialize")
+        register('avatar', "modules.avatar_module:AvatarController",
+                 loader="load_avatar", loader_args=[str(settings.VRM_PATH)])
+        register('lipsync', "modules.lipsync_module:LipSync", deps=['tts', 'avatar'])
+        register('gesture', "modules.gesture_module:GestureController", deps=['avatar'])
+        register('emotion', "modules.emotion_module:EmotionEngine", deps=['memory', 'avatar'])
     
     async def run(self):
-        """Loop principal do companion"""
+        """Loop principal do companion: estágios independentes ligados por filas"""
         self.is_running = True
-        last_update_time = time.time()
         
+        stages = {
+            "captura": self.capture_stage,
+            "percepção": self.perception_stage,
+            "escuta": self.listening_stage,
+            "raciocínio": self.reasoning_stage,
+            "fala": self.speech_stage,
+            "reprodução": self.playback_stage,
+            "render": self.render_stage
+        }
+        # Estágios cujos módulos falharam na inicialização ficam desligados
+        self.tasks = [
+            asyncio.create_task(self._supervise(name, stage), name=name)
+            for name, stage in stages.items()
+            if self.registry.available(*STAGE_REQUIREMENTS[name])
+        ]
+        
+        try:
+            await asyncio.gather(*self.tasks)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            await self.stop()
+    
+    async def stop(self):
+        """Interrompe o pipeline e cancela todos os estágios"""
+        self.is_running = False
+        self.render_clock.stop()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        
+        if 'stt' in self.modules:
+            await self.modules['stt'].stop()
+        if 'tts' in self.modules:
+            self.modules['tts'].stop()
+        if 'vision' in self.modules:
+            await self.modules['vision'].stop()
+        if 'memory' in self.modules:
+            await self.modules['memory'].close()
+    
+    async def _supervise(self, name, stage):
+        """Executa um estágio continuamente, isolando falhas dos demais"""
         while self.is_running:
-            current_time = time.time()
-            
-            # Processar visão a cada 0.5 segundos
-            if current_time - last_update_time > 0.5:
-                vision_data = await self.modules['vision'].process_frame()
-                await self.modules['avatar'].update_from_vision(vision_data)
-                last_update_time = current_time
-            
-            # Atualizar animações idle
-            await self.modules['avatar'].update_idle_animations()
-            
-            # Escutar com STT
-            text_input = await self.modules['stt'].listen()
-            
-            if text_input:
-                # Atualizar emoção com base na fala do usuário
-                await self.modules['emotion'].update_emotion(text_input, False)
-                
-                # Processar com Gemini
-                response = await self.modules['gemini'].process_input(
-                    text_input, 
-                    vision_data
-                )
+            try:
+                await stage()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Erro no estágio {name}: {e}")
+                await asyncio.sleep(0.1)
+    
+    @staticmethod
+    def _put_latest(queue, item):
+        """Coloca um item na fila descartando o mais antigo se estiver cheia"""
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(item)
+    
+    async def capture_stage(self):
+        """Encaminha cada novo resultado do detector de visão"""
+        vision_data = await self.modules['vision'].next_result()
+        self._put_latest(self.vision_queue, vision_data)
+    
+    async def perception_stage(self):
+        """Publica o resultado de visão mais recente para o avatar"""
+        vision_data = await self.vision_queue.get()
+        self.latest_vision = vision_data
+        tracer.observe("vision_staleness", time.monotonic() - vision_data['timestamp'])
+        if 'avatar' in self.modules:
+            await self.modules['avatar'].update_from_vision(vision_data)
+    
+    async def listening_stage(self):
+        """Escuta com STT e encaminha falas para o raciocínio"""
+        speculation = None
+        try:
+            async for event in self.modules['stt'].transcripts():
+                text = event['text']
                 
-                # Atualizar memória
-                self.modules['memory'].add_interaction(text_input, response)
+                if not event['final']:
+                    # Parcial estável: iniciar o Gemini antes do fim da fala
+                    if (settings.SPECULATIVE_DISPATCH and event['stable']
+                            and not self._matches(speculation, text)):
+                        self._cancel(speculation)
+                        speculation = self._speculate(text)
+                    continue
                 
-                # Atualizar emoção com base na resposta do companion
-                await self.modules['emotion'].update_emotion(response, True)
+                if not text:
+                    continue
                 
-                # Analisar e executar gestos
-                gesture = await self.modules['gesture'].analyze_text_for_gestures(response)
-                await self.modules['gesture'].execute_gesture(gesture, 
-                    self.modules['emotion'].emotion_intensity)
+                # Descartar a especulação se a transcrição final for diferente
+                if not self._matches(speculation, text):
+                    self._cancel(speculation)
+                    speculation = None
                 
-                # Gerar áudio com TTS
-                audio_data = await self.modules['tts'].synthesize(response)
+                # Marcos do turno, compartilhados pelos estágios seguintes
+                turn = {
+                    "id": tracer.next_turn(),
+                    "end_of_speech": event.get('end_of_speech', event['timestamp']),
+                    "first_token": None,
+                    "first_audio": None
+                }
+                tracer.record("stt", turn['end_of_speech'], event['timestamp'], turn=turn['id'])
+                tracer.observe("end_of_speech→transcript", event['timestamp'] - turn['end_of_speech'])
                 
-                # Sincronizar lábios
-                await self.modules['lipsync'].synchronize(audio_data, response)
+                # Bloqueia se o raciocínio estiver atrasado (backpressure)
+                await self.text_queue.put({"text": text, "speculation": speculation, "turn": turn})
+                speculation = None
+        finally:
+            self._cancel(speculation)
+    
+    def _speculate(self, text):
+        """Inicia o processamento do Gemini a partir de uma hipótese parcial"""
+        return self._start_reply(text)
+    
+    def _start_reply(self, text):
+        """Inicia a geração da resposta em streaming, acumulando as partes numa fila"""
+        chunks = asyncio.Queue()
+        task = asyncio.create_task(self._pump_reply(text, chunks))
+        return {"text": self._normalize(text), "task": task, "chunks": chunks}
+    
+    async def _pump_reply(self, text, chunks):
+        try:
+            with tracer.span("gemini.stream_input", "gemini", text_length=len(text)):
+                async for chunk in self.modules['gemini'].stream_input(text, self.latest_vision):
+                    chunks.put_nowait(chunk)
+        except Exception as e:
+            chunks.put_nowait(e)
+        finally:
+            chunks.put_nowait(None)
+    
+    @staticmethod
+    async def _reply_chunks(reply):
+        """Consome as partes de uma resposta até o fim da geração"""
+        while True:
+            chunk = await reply['chunks'].get()
+            if chunk is None:
+                return
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+    
+    @staticmethod
+    def _normalize(text):
+        return " ".join(text.lower().split())
+    
+    def _matches(self, speculation, text):
+        return speculation is not None and speculation['text'] == self._normalize(text)
+    
+    @staticmethod
+    def _cancel(speculation):
+        if speculation is not None:
+            speculation['task'].cancel()
+    
+    async def reasoning_stage(self):
+        """Processa falas com Gemini, emoções e gestos"""
+        item = await self.text_queue.get()
+        text_input = item['text']
+        turn = item['turn']
+        
+        # Atualizar emoção com base na fala do usuário
+        if 'emotion' in self.modules:
+            await self.modules['emotion'].update_emotion(text_input, False)
+        
+        # Processar com Gemini (reaproveitando a especulação, se houver)
+        reply = item['speculation'] or self._start_reply(text_input)
+        
+        # Entregar cada frase ao TTS enquanto o restante ainda é gerado
+        segmenter = SentenceSegmenter()
+        parts = []
+        sentence_count = 0
+        with tracer.span("raciocínio", turn=turn['id']) as span:
+            try:
+                async for chunk in self._reply_chunks(reply):
+                    if turn['first_token'] is None:
+                        turn['first_token'] = time.monotonic()
+                        tracer.instant("primeiro token", turn=turn['id'])
+                        tracer.observe("end_of_speech→first_token", turn['first_token'] - turn['end_of_speech'])
+                    parts.append(chunk)
+                    for sentence in segmenter.feed(chunk):
+                        await self._hand_off(sentence, sentence_count, turn)
+                        sentence_count += 1
+            finally:
+                self._cancel(reply)
             
-            await asyncio.sleep(0.05)  # Loop mais responsivo
+            tail = segmenter.flush()
+            if tail:
+                await self._hand_off(tail, sentence_count, turn)
+            span.set(sentences=sentence_count + bool(tail))
+        
+        # Atualizar memória com a resposta completa
+        response = "".join(parts)
+        self.modules['memory'].add_interaction(text_input, response)
+    
+    async def _hand_off(self, sentence, index, turn):
+        """Envia uma frase para a fala; a primeira também define emoção e gesto"""
+        if 'tts' in self.modules:
+            await self.speech_queue.put((sentence, turn))
+        else:
+            print(f"Companion: {sentence}")
+        
+        if index == 0 and self.registry.available('emotion', 'gesture'):
+            # Atualizar emoção com base na resposta do companion
+            await self.modules['emotion'].update_emotion(sentence, True)
+            
+            # Analisar e executar gestos
+            gesture = await self.modules['gesture'].analyze_text_for_gestures(sentence)
+            await self.modules['gesture'].execute_gesture(gesture, 
+                self.modules['emotion'].emotion_intensity)
+    
+    async def speech_stage(self):
+        """Gera áudio para cada frase da resposta"""
+        sentence, turn = await self.speech_queue.get()
+        
+        # Gerar áudio com TTS
+        with tracer.span("tts.synthesize", "tts", turn=turn['id'], characters=len(sentence)):
+            audio_data = await self.modules['tts'].synthesize(sentence)
+        await self.audio_queue.put((audio_data, sentence, turn))
+    
+    async def playback_stage(self):
+        """Reproduz e sincroniza os lábios de cada frase enquanto a próxima é sintetizada"""
+        audio_data, sentence, turn = await self.audio_queue.get()
+        self._record_first_interaction()
+        if turn['first_audio'] is None:
+            turn['first_audio'] = time.monotonic()
+            tracer.observe("end_of_speech→first_audio", turn['first_audio'] - turn['end_of_speech'])
+            if turn['first_token'] is not None:
+                tracer.observe("first_token→first_audio", turn['first_audio'] - turn['first_token'])
+        
+        playback = [self.modules['tts'].play(audio_data)]
+        if 'lipsync' in self.modules:
+            playback.append(self.modules['lipsync'].synchronize(audio_data, sentence))
+        with tracer.span("reprodução", "tts", turn=turn['id'], seconds=len(audio_data) / self.modules['tts'].sample_rate):
+            await asyncio.gather(*playback)
+    
+    def _record_first_interaction(self):
+        """Relata o tempo entre o início do programa e a primeira resposta falada"""
+        if self.first_interaction_at is not None or self.started_at is None:
+            return
+        self.first_interaction_at = time.perf_counter()
+        print(f"Tempo até a primeira interação: {self.first_interaction_at - self.started_at:.2f}s")
+    
+    async def render_stage(self):
+        """Renderiza o avatar em taxa fixa, sem esperar rede ou modelos"""
+        await self.render_clock.run(self._render_frame)
+    
+    async def _render_frame(self):
+        """Um tick de renderização: amostra a trilha labial e desenha o avatar"""
+        if 'lipsync' in self.modules:
+            self.modules['lipsync'].update()
+        await self.modules['avatar'].render_frame()
 
 async def main():
-    companion = VirtualCompanion()
-    await companion.initialize()
-    await companion.run()
+    parser = argparse.ArgumentParser(description="Companion virtual")
+    parser.add_argument("--server", action="store_true", help="atender várias sessões via WebSocket")
+    parser.add_argument("--host", default=settings.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=settings.SERVER_PORT)
+    args = parser.parse_args()
+    
+    try:
+        if args.server:
+            from modules.server_module import serve
+            await serve(args.host, args.port)
+            return
+        
+        companion = VirtualCompanion()
+        try:
+            await companion.initialize()
+        except RuntimeError:
+            # Encerrar o que chegou a iniciar antes de desistir
+            await companion.stop()
+            raise
+        await companion.run()
+    finally:
+        tracer.finish()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
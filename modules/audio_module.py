@@ -0,0 +1,139 @@
+import asyncio
+import threading
+import numpy as np
+import pyaudio
+from config import settings
+
+class AudioRingBuffer:
+    """Buffer circular pré-alocado de amostras de áudio (um produtor, um consumidor)"""
+    def __init__(self, capacity, dtype=np.int16):
+        self.capacity = int(capacity)
+        self.buffer = np.zeros(self.capacity, dtype=dtype)
+        self.read_pos = 0   # contadores monotônicos de amostras
+        self.write_pos = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+    
+    @property
+    def available(self):
+        """Amostras prontas para leitura"""
+        with self.lock:
+            return self.write_pos - self.read_pos
+    
+    @property
+    def free(self):
+        """Espaço livre antes de sobrescrever amostras não lidas"""
+        return self.capacity - self.available
+    
+    def write(self, samples, overwrite=True):
+        """Escreve amostras no buffer; retorna quantas foram gravadas
+        
+        Com overwrite=True as amostras mais antigas são descartadas quando o
+        buffer enche (captura). Com overwrite=False a escrita é truncada ao
+        espaço livre (reprodução, onde o produtor deve esperar).
+        """
+        samples = np.asarray(samples, dtype=self.buffer.dtype).ravel()
+        
+        with self.lock:
+            free = self.capacity - (self.write_pos - self.read_pos)
+            if len(samples) > free:
+                if overwrite:
+                    if len(samples) > self.capacity:
+                        self.dropped += len(samples) - self.capacity
+                        samples = samples[-self.capacity:]
+                    overflow = len(samples) - free
+                    self.read_pos += overflow
+                    self.dropped += overflow
+                else:
+                    samples = samples[:free]
+            
+            count = len(samples)
+            start = self.write_pos % self.capacity
+            first = min(count, self.capacity - start)
+            self.buffer[start:start + first] = samples[:first]
+            self.buffer[:count - first] = samples[first:]
+            self.write_pos += count
+            return count
+    
+    def read(self, count, out=None):
+        """Lê até `count` amostras, opcionalmente para um array pré-alocado"""
+        with self.lock:
+            count = min(int(count), self.write_pos - self.read_pos)
+            if out is None:
+                out = np.empty(count, dtype=self.buffer.dtype)
+            
+            start = self.read_pos % self.capacity
+            first = min(count, self.capacity - start)
+            out[:first] = self.buffer[start:start + first]
+            out[first:count] = self.buffer[:count - first]
+            self.read_pos += count
+            return out[:count]
+    
+    def clear(self):
+        """Descarta todas as amostras não lidas"""
+        with self.lock:
+            self.read_pos = self.write_pos
+
+class AudioPlayer:
+    """Saída de áudio alimentada por um buffer circular pré-alocado"""
+    def __init__(self, sample_rate, chunk_size=None, buffer_seconds=None):
+        self.sample_rate = sample_rate
+        self.chunk_size = chunk_size or settings.CHUNK_SIZE
+        buffer_seconds = buffer_seconds or settings.TTS_PLAYBACK_BUFFER_SECONDS
+        self.ring_buffer = AudioRingBuffer(int(sample_rate * buffer_seconds))
+        self.output = np.zeros(self.chunk_size, dtype=np.int16)
+        self.played_samples = 0
+        self.underruns = 0
+        self.audio = None
+        self.stream = None
+    
+    def start(self):
+        """Abre o dispositivo de saída em modo callback"""
+        self.audio = pyaudio.PyAudio()
+        self.stream = self.audio.open(
+            format=pyaudio.paInt16,
+            channels=1,
+            rate=self.sample_rate,
+            output=True,
+            frames_per_buffer=self.chunk_size,
+            stream_callback=self._callback
+        )
+        self.stream.start_stream()
+    
+    def stop(self):
+        if self.stream:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+        if self.audio:
+            self.audio.terminate()
+            self.audio = None
+    
+    def _callback(self, in_data, frame_count, time_info, status):
+        """Chamado pelo PortAudio: copia amostras do buffer, completando com silêncio"""
+        if frame_count > len(self.output):
+            self.output = np.zeros(frame_count, dtype=np.int16)
+        out = self.output[:frame_count]
+        
+        count = len(self.ring_buffer.read(frame_count, out))
+        if count < frame_count:
+            out[count:] = 0
+            if count:
+                self.underruns += 1
+        self.played_samples += count
+        return (out.tobytes(), pyaudio.paContinue)
+    
+    async def write(self, samples):
+        """Enfileira amostras para reprodução, aguardando espaço no buffer"""
+        wait = self.chunk_size / self.sample_rate
+        offset = 0
+        while offset < len(samples):
+            offset += self.ring_buffer.write(samples[offset:], overwrite=False)
+            if offset < len(samples):
+                await asyncio.sleep(wait)
+    
+    async def drain(self):
+        """Aguarda até que todo o áudio enfileirado tenha sido reproduzido"""
+        wait = self.chunk_size / self.sample_rate
+        while self.ring_buffer.available:
+            await asyncio.sleep(wait)
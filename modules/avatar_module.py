@@ -2,6 +2,11 @@ import asyncio
 import time
 from pyvrm import VRM
 import numpy as np
+from modules.expression_module import ExpressionState, SHAPES, SHAPE_INDEX, VISEMES, shape_vector, shape_mask
+
+MOUTH_MASK = shape_mask(VISEMES)
+BLINK_MASK = shape_mask(["eye_blink"])
+MOUTH_INDICES = [SHAPE_INDEX[viseme] for viseme in VISEMES]
 
 class AvatarController:
     def __init__(self):
@@ -12,19 +17,12 @@ class AvatarController:
         self.gesture_intensity = 0.5
         self.gesture_end_time = 0
         
-        # Estados de blend shapes para expressões faciais
-        self.blend_shapes = {
-            "neutral": 0.0,
-            "happy": 0.0,
-            "sad": 0.0,
-            "angry": 0.0,
-            "surprised": 0.0,
-            "aa": 0.0,    # Para sincronia labial
-            "ih": 0.0,
-            "ou": 0.0,
-            "ee": 0.0,
-            "oh": 0.0
-        }
+        # Estado de expressões em arrays (índice fixo em SHAPES, inclusive eye_blink)
+        self.expression = ExpressionState()
+        self.applied_shapes = np.full(len(SHAPES), -1.0, dtype=np.float32)
+        self.blinking = None
+        self.mouth_values = shape_vector()
+        self.mouth_closed = np.zeros(len(SHAPES), dtype=np.float32)
         
         # Parâmetros de animação
         self.animation_parameters = {
@@ -33,33 +31,36 @@ class AvatarController:
             "eye_blink": 0.0,
             "breathing": 0.0
         }
+        self.applied_parameters = {}
+        self.last_changes = {"shapes": {}, "parameters": {}}  # o que mudou no último frame
+    
+    @property
+    def blend_shapes(self):
+        """Valores aplicados por blend shape (somente leitura)"""
+        return dict(zip(SHAPES, self.applied_shapes.clip(0.0).tolist()))
     
     async def load_avatar(self, vrm_path):
         """Carrega modelo VRM do avatar"""
-        self.avatar = VRM.load(vrm_path)
+        self.avatar = await asyncio.to_thread(VRM.load, vrm_path)
         print("Avatar carregado")
     
     async def set_emotion(self, emotion_blend_shape, intensity):
-        """Define a expressão emocional do avatar"""
+        """Define a expressão emocional do avatar (transição suave em EMOTION_TRANSITION_TIME)"""
         self.current_emotion = emotion_blend_shape
         self.emotion_intensity = intensity
         
-        # Resetar todas as expressões
-        for shape in self.blend_shapes:
-            self.blend_shapes[shape] = 0.0
-        
-        # Aplicar a expressão emocional principal
-        if emotion_blend_shape in self.blend_shapes:
-            self.blend_shapes[emotion_blend_shape] = intensity
+        layer = {emotion_blend_shape: intensity}
         
         # Aplicar expressões secundárias baseadas na emoção principal
         if emotion_blend_shape == "happy":
-            self.blend_shapes["aa"] = min(intensity * 0.7, 0.7)
+            layer["aa"] = min(intensity * 0.7, 0.7)
         elif emotion_blend_shape == "surprised":
-            self.blend_shapes["ou"] = min(intensity * 0.8, 0.8)
+            layer["ou"] = min(intensity * 0.8, 0.8)
         
-        # Atualizar o avatar
-        await self._apply_blend_shapes()
+        # A emoção define o rosto inteiro: opacidade total em todos os blend shapes
+        self.expression.set_channel(
+            "emotion", shape_vector(layer), np.ones(len(SHAPES), dtype=np.float32), time.monotonic()
+        )
     
     async def set_gesture(self, gesture_name, blend_shape, intensity, duration):
         """Executa um gesto no avatar"""
@@ -68,19 +69,42 @@ class AvatarController:
         self.gesture_end_time = time.time() + duration
         
         # Aplicar blend shape do gesto
-        if blend_shape in self.blend_shapes:
-            self.blend_shapes[blend_shape] = intensity
-            await self._apply_blend_shapes()
+        if blend_shape in SHAPE_INDEX:
+            self.expression.set_channel(
+                "gesture", shape_vector({blend_shape: intensity}), shape_mask([blend_shape]),
+                time.monotonic()
+            )
+    
+    async def set_viseme(self, viseme, intensity):
+        """Define o viseme atual para sincronia labial"""
+        self.set_mouth(VISEMES.index(viseme) if viseme in VISEMES else -1, intensity)
+    
+    def set_mouth(self, viseme_index, intensity):
+        """Define a boca pelo índice em VISEMES (-1 devolve a boca à camada de emoção)"""
+        now = time.monotonic()
+        if viseme_index < 0:
+            self.mouth_values.fill(0.0)
+            self.expression.set_channel("viseme", self.mouth_values, self.mouth_closed, now)
+            return
+        
+        # Reduzir intensidade de outros visemes e aplicar o atual (buffers reaproveitados)
+        np.subtract(self.mouth_values, 0.3 * MOUTH_MASK, out=self.mouth_values)
+        np.maximum(self.mouth_values, 0.0, out=self.mouth_values)
+        self.mouth_values[MOUTH_INDICES[viseme_index]] = intensity
+        self.expression.set_channel("viseme", self.mouth_values, MOUTH_MASK, now)
     
     async def update_idle_animations(self):
         """Atualiza animações idle (piscar de olhos, respiração)"""
         current_time = time.time()
         
-        # Piscar os olhos periodicamente
-        if int(current_time * 2) % 4 == 0:
-            self.blend_shapes["eye_blink"] = 0.8
-        else:
-            self.blend_shapes["eye_blink"] = 0.0
+        # Piscar os olhos periodicamente (só reescreve o alvo quando o estado muda)
+        blinking = int(current_time * 2) % 4 == 0
+        if blinking != self.blinking:
+            self.blinking = blinking
+            self.expression.set_channel(
+                "blink", shape_vector({"eye_blink": 0.8 if blinking else 0.0}), BLINK_MASK,
+                time.monotonic()
+            )
         
         # Simular respiração
         self.animation_parameters["breathing"] = (np.sin(current_time) + 1) * 0.1
@@ -89,26 +113,41 @@ class AvatarController:
         if self.current_gesture != "idle" and current_time > self.gesture_end_time:
             self.current_gesture = "idle"
             # Manter apenas a expressão emocional atual
-            await self.set_emotion(self.current_emotion, self.emotion_intensity)
-        
-        await self._apply_blend_shapes()
+            self.expression.set_channel(
+                "gesture", shape_vector(), np.zeros(len(SHAPES), dtype=np.float32), time.monotonic()
+            )
     
-    async def _apply_blend_shapes(self):
-        """Aplica os blend shapes ao avatar (implementação específica do motor 3D)"""
+    async def render_frame(self):
+        """Chamado uma vez por tick do relógio: interpola, mescla e envia só o que mudou"""
+        await self.update_idle_animations()
+        await self._apply_blend_shapes(self.expression.evaluate(time.monotonic()))
+    
+    async def _apply_blend_shapes(self, values):
+        """Aplica ao avatar apenas os blend shapes alterados desde o último frame"""
+        changed = np.flatnonzero(np.abs(values - self.applied_shapes) > 1e-3)
+        
         # Esta é uma implementação genérica - precisa ser adaptada para a biblioteca específica
         if self.avatar:
-            for shape_name, value in self.blend_shapes.items():
+            for index in changed:
                 # Aqui você aplicaria o blend shape ao modelo VRM
-                # Exemplo: self.avatar.set_blend_shape_value(shape_name, value)
+                # Exemplo: self.avatar.set_blend_shape_value(SHAPES[index], float(values[index]))
                 pass
+        self.applied_shapes[changed] = values[changed]
+        self.last_changes["shapes"] = {SHAPES[index]: float(values[index]) for index in changed}
         
         # Aplicar parâmetros de animação
         self._apply_animation_parameters()
     
     def _apply_animation_parameters(self):
-        """Aplica parâmetros de animação ao avatar"""
+        """Aplica ao avatar os parâmetros de animação alterados desde o último frame"""
+        changed = {
+            name: value for name, value in self.animation_parameters.items()
+            if self.applied_parameters.get(name) != value
+        }
         # Implementação específica para o motor 3D
-        pass
+        for name, value in changed.items():
+            self.applied_parameters[name] = list(value) if isinstance(value, list) else value
+        self.last_changes["parameters"] = {name: self.applied_parameters[name] for name in changed}
     
     async def update_from_vision(self, vision_data):
         """Atualiza o avatar com base nos dados de visão"""
@@ -121,21 +160,6 @@ class AvatarController:
             center_x = 320  # Metade da largura assumida de 640px
             face_center_x = (face_location[3] + face_location[1]) / 2
             
-            # Ajustar rotação da cabeça baseado na posição do rosto
+            # Ajustar rotação da cabeça baseado na posição do rosto (aplicada no próximo frame)
             deviation = (face_center_x - center_x) / center_x
             self.animation_parameters["head_rotation"][1] = deviation * 0.5
-            
-            await self._apply_animation_parameters()
-
-async def set_viseme(self, viseme, intensity):
-    """Define o viseme atual para sincronia labial"""
-    if viseme in self.blend_shapes:
-        # Reduzir intensidade de outros visemes
-        for v in ['aa', 'ih', 'ou', 'ee', 'oh']:
-            if v != viseme:
-                self.blend_shapes[v] = max(0, self.blend_shapes[v] - 0.3)
-        
-        # Aplicar o viseme atual
-        self.blend_shapes[viseme] = intensity
-        
-        await self._apply_blend_shapes()
\ No newline at end of file
@@ -0,0 +1,150 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from modules.tracing_module import tracer
+
+# Prioridades: menor valor sai primeiro
+PRIORITY_INTERACTIVE = 0  # alguém está esperando pelo resultado agora
+PRIORITY_NORMAL = 1
+PRIORITY_BACKGROUND = 2
+
+class BatchScheduler:
+    """Micro-lotes: junta pedidos concorrentes numa janela curta e os executa juntos
+
+    run_batch(itens) recebe a lista de itens e devolve a lista de resultados
+    na mesma ordem; roda no executor (threads ou processos) para não bloquear
+    o loop. Os pedidos esperam num heap por (prioridade, prazo, chegada):
+    a janela fecha quando o lote enche, quando o pedido mais antigo esperou
+    `window` segundos ou quando o prazo mais próximo já não comporta a
+    duração estimada de um lote. Com expire=True, pedidos cujo prazo passou
+    antes da execução falham com TimeoutError em vez de ocupar o lote.
+    Até `workers` lotes executam ao mesmo tempo.
+    """
+    def __init__(self, name, run_batch, executor=None, max_batch=8, window=0.01, workers=1, expire=False):
+        self.name = name
+        self.run_batch = run_batch
+        self.executor = executor
+        self.max_batch = max_batch
+        self.window = window
+        self.expire = expire
+        self.pending = []  # heap de (prioridade, prazo, sequência, chegada, item, future)
+        self.sequence = itertools.count()
+        self.wakeup = asyncio.Event()
+        self.slots = asyncio.Semaphore(workers)
+        self.dispatcher = None
+        self.running = set()
+        self.batch_time = 0.0  # média móvel da duração de um lote
+        self.batches = 0
+        self.items = 0
+        self.expired = 0
+
+    async def submit(self, item, priority=PRIORITY_NORMAL, deadline=None):
+        """Enfileira um item e aguarda seu resultado (prazo em time.monotonic())"""
+        if self.dispatcher is None:
+            self.dispatcher = asyncio.create_task(self._dispatch_loop(), name=f"lote-{self.name}")
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.pending, (
+            priority, math.inf if deadline is None else deadline,
+            next(self.sequence), time.monotonic(), item, future
+        ))
+        self.wakeup.set()
+        return await future
+
+    async def stop(self):
+        """Cancela o despacho, os lotes em andamento e os pedidos pendentes"""
+        tasks = [task for task in (self.dispatcher, *self.running) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.dispatcher = None
+        for *_, future in self.pending:
+            future.cancel()
+        self.pending = []
+
+    async def _dispatch_loop(self):
+        while True:
+            while not self.pending:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+
+            # Esperar um executor livre: enquanto isso, mais pedidos entram no heap
+            await self.slots.acquire()
+            await self._collect()
+            batch = self._take_batch()
+            if not batch:
+                self.slots.release()
+                continue
+            task = asyncio.create_task(self._run(batch))
+            self.running.add(task)
+            task.add_done_callback(self.running.discard)
+
+    async def _collect(self):
+        """Aguarda mais pedidos até o lote encher ou a janela fechar"""
+        while len(self.pending) < self.max_batch:
+            oldest = min(entry[3] for entry in self.pending)
+            urgent = min(entry[1] for entry in self.pending) - self.batch_time
+            remaining = min(oldest + self.window, urgent) - time.monotonic()
+            if remaining <= 0:
+                return
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), remaining)
+            except asyncio.TimeoutError:
+                return
+
+    def _take_batch(self):
+        """Retira do heap os pedidos mais prioritários ainda válidos"""
+        now = time.monotonic()
+        batch = []
+        while self.pending and len(batch) < self.max_batch:
+            entry = heapq.heappop(self.pending)
+            future = entry[5]
+            if future.done():
+                continue  # quem pediu desistiu (tarefa cancelada)
+            if self.expire and entry[1] < now:
+                self.expired += 1
+                future.set_exception(TimeoutError(f"{self.name}: prazo expirado na fila"))
+                continue
+            batch.append(entry)
+        return batch
+
+    async def _run(self, batch):
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        for entry in batch:
+            tracer.observe(f"lote.{self.name}.espera", started - entry[3])
+        try:
+            with tracer.span(f"lote.{self.name}", "batch", size=len(batch)):
+                results = await loop.run_in_executor(
+                    self.executor, self.run_batch, [entry[4] for entry in batch]
+                )
+        except asyncio.CancelledError:
+            for entry in batch:
+                entry[5].cancel()
+            raise
+        except Exception as e:
+            for entry in batch:
+                if not entry[5].done():
+                    entry[5].set_exception(e)
+        else:
+            for entry, result in zip(batch, results):
+                if not entry[5].done():
+                    entry[5].set_result(result)
+        finally:
+            elapsed = time.monotonic() - started
+            self.batch_time = elapsed if not self.batches else 0.8 * self.batch_time + 0.2 * elapsed
+            self.batches += 1
+            self.items += len(batch)
+            self.slots.release()
+
+    def get_stats(self):
+        """Tamanho médio dos lotes, duração estimada e pedidos expirados"""
+        return {
+            "batches": self.batches,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "batch_time_ms": self.batch_time * 1000,
+            "pending": len(self.pending),
+            "expired": self.expired
+        }
@@ -0,0 +1,255 @@
+import asyncio
+import json
+import os
+import re
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from config import settings
+
+class HashingEmbedder:
+    """Embedding local sem dependências: hashing assinado de palavras e bigramas"""
+    def __init__(self, dimension=None):
+        self.dimension = dimension or settings.MEMORY_EMBEDDING_DIM
+        self.name = f"hashing-{self.dimension}"
+    
+    def load(self):
+        pass
+    
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = re.findall(r"\w+", text.lower())
+            features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+            for feature in features:
+                digest = zlib.crc32(feature.encode("utf-8"))
+                vectors[row, digest % self.dimension] += 1.0 if digest & 0x80000000 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+class SentenceEmbedder:
+    """Embedding com um modelo sentence-transformers executado localmente"""
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.name = re.sub(r"[^\w.-]", "_", model_name)
+        self.model = None
+        self.dimension = None
+    
+    def load(self):
+        # Idempotente: o mesmo embedder pode ser compartilhado por várias memórias
+        if self.model is not None:
+            return
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(self.model_name, device="cpu")
+        self.dimension = self.model.get_sentence_embedding_dimension()
+    
+    def embed(self, texts):
+        vectors = self.model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+        return vectors.astype(np.float32)
+
+class IVFIndex:
+    """Índice aproximado: k-means esférico grosseiro com listas invertidas"""
+    def __init__(self, nlist, nprobe):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.centroids = None
+        self.rows = None
+        self.starts = None
+        self.size = 0
+    
+    def build(self, matrix, iterations=10, seed=0):
+        rng = np.random.default_rng(seed)
+        count = len(matrix)
+        sample = np.asarray(matrix[np.sort(rng.choice(count, min(count, self.nlist * 64), replace=False))])
+        centroids = sample[rng.choice(len(sample), self.nlist, replace=False)].copy()
+        
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            filled = norms[:, 0] > 0
+            centroids[filled] = sums[filled] / norms[filled]
+        
+        labels = np.concatenate([
+            np.argmax(np.asarray(matrix[i:i + 65536]) @ centroids.T, axis=1)
+            for i in range(0, count, 65536)
+        ])
+        self.rows = np.argsort(labels, kind="stable")
+        self.starts = np.searchsorted(labels[self.rows], np.arange(self.nlist + 1))
+        self.centroids = centroids
+        self.size = count
+    
+    def candidates(self, query, total):
+        """Linhas das listas mais próximas mais as adicionadas depois da construção"""
+        probes = np.argsort(self.centroids @ query)[-self.nprobe:]
+        lists = [self.rows[self.starts[p]:self.starts[p + 1]] for p in probes]
+        lists.append(np.arange(self.size, total))
+        return np.concatenate(lists)
+
+class VectorStore:
+    """Vetores float32 normalizados em arquivo append-only, lidos via memmap"""
+    def __init__(self, directory, dimension):
+        self.dimension = dimension
+        self.vectors_path = directory / "vectors.f32"
+        self.offsets_path = directory / "records.idx"
+        self.records_path = directory / "records.jsonl"
+        self.matrix = np.zeros((0, dimension), dtype=np.float32)
+        self.offsets = np.zeros(0, dtype=np.int64)
+        self.ann = None
+    
+    def __len__(self):
+        return len(self.matrix)
+    
+    def open(self):
+        """Mapeia os arquivos, descartando escritas incompletas de uma queda"""
+        self.vectors_path.parent.mkdir(parents=True, exist_ok=True)
+        for path in (self.vectors_path, self.offsets_path, self.records_path):
+            path.touch(exist_ok=True)
+        
+        row_bytes = 4 * self.dimension
+        count = min(self.vectors_path.stat().st_size // row_bytes,
+                    self.offsets_path.stat().st_size // 8)
+        os.truncate(self.vectors_path, count * row_bytes)
+        os.truncate(self.offsets_path, count * 8)
+        self._map(count)
+        self._maybe_build_ann()
+    
+    def _map(self, count):
+        if count:
+            self.matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r",
+                                    shape=(count, self.dimension))
+            self.offsets = np.memmap(self.offsets_path, dtype=np.int64, mode="r", shape=(count,))
+    
+    def append(self, vectors, records):
+        """Acrescenta registros e vetores; os vetores vão por último e definem o total"""
+        offsets = []
+        with open(self.records_path, "ab") as f:
+            for record in records:
+                offsets.append(f.tell())
+                f.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+        with open(self.offsets_path, "ab") as f:
+            f.write(np.asarray(offsets, dtype=np.int64).tobytes())
+        with open(self.vectors_path, "ab") as f:
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        
+        self._map(len(self.matrix) + len(records))
+        self._maybe_build_ann()
+    
+    def _maybe_build_ann(self):
+        """Cria (ou refaz ao dobrar de tamanho) o índice aproximado para coleções grandes"""
+        count = len(self.matrix)
+        if count < settings.MEMORY_ANN_THRESHOLD:
+            return
+        if self.ann is None or count >= 2 * self.ann.size:
+            self.ann = IVFIndex(int(np.sqrt(count)), settings.MEMORY_ANN_NPROBE)
+            self.ann.build(self.matrix)
+    
+    def top_k(self, query, k):
+        """Retorna [(registro, similaridade)] dos k vetores mais próximos por cosseno"""
+        total = len(self.matrix)
+        if not total:
+            return []
+        
+        if self.ann is not None:
+            rows = np.sort(self.ann.candidates(query, total))
+            scores = np.asarray(self.matrix[rows]) @ query
+        else:
+            rows = np.arange(total)
+            scores = np.concatenate([
+                np.asarray(self.matrix[i:i + 65536]) @ query for i in range(0, total, 65536)
+            ])
+        
+        k = min(k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(self._read_record(int(rows[i])), float(scores[i])) for i in best]
+    
+    def _read_record(self, row):
+        with open(self.records_path, "rb") as f:
+            f.seek(int(self.offsets[row]))
+            return json.loads(f.readline())
+
+def make_embedder():
+    """Embedder configurado em settings (modelo local ou hashing)"""
+    if settings.MEMORY_EMBEDDING_MODEL:
+        return SentenceEmbedder(settings.MEMORY_EMBEDDING_MODEL)
+    return HashingEmbedder()
+
+def load_embedder(embedder):
+    """Carrega o embedder; sem o modelo (pacote ausente, download sem rede) usa hashing local"""
+    try:
+        embedder.load()
+    except (ImportError, OSError) as e:
+        print(f"Modelo de embedding indisponível ({e!r}); usando hashing local")
+        return HashingEmbedder()
+    return embedder
+
+class SemanticMemory:
+    """Recuperação semântica de interações passadas com embeddings locais"""
+    def __init__(self, directory=None, embedder=None):
+        self.directory = directory or settings.MEMORY_DIR / "semantic"
+        self.embedder = embedder or make_embedder()
+        self.store = None
+        
+        # Uma única thread acessa os arquivos: anexar e buscar nunca se sobrepõem
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-index")
+        self.pending = []
+        self.wakeup = asyncio.Event()
+        self.writer_task = None
+    
+    async def load(self):
+        """Carrega o modelo de embedding e mapeia o índice existente"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self._open)
+        self.writer_task = asyncio.create_task(self._writer_loop())
+    
+    def _open(self):
+        # Um índice por embedder: vetores de modelos diferentes não são comparáveis
+        self.embedder = load_embedder(self.embedder)
+        self.store = VectorStore(self.directory / self.embedder.name, self.embedder.dimension)
+        self.store.open()
+    
+    async def close(self):
+        if self.writer_task:
+            self.writer_task.cancel()
+            await asyncio.gather(self.writer_task, return_exceptions=True)
+            self.writer_task = None
+        await self._index_pending()
+    
+    def add(self, interaction):
+        """Enfileira uma interação para indexação em segundo plano"""
+        self.pending.append(interaction)
+        self.wakeup.set()
+    
+    async def _writer_loop(self):
+        while True:
+            await self.wakeup.wait()
+            try:
+                await self._index_pending()
+            except Exception as e:
+                print(f"Erro ao indexar memória: {e}")
+    
+    async def _index_pending(self):
+        self.wakeup.clear()
+        if not self.pending or self.store is None:
+            return
+        batch, self.pending = self.pending, []
+        vectors = await asyncio.to_thread(self.embedder.embed, [self._text(r) for r in batch])
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self.store.append, vectors, batch)
+    
+    @staticmethod
+    def _text(interaction):
+        return f"{interaction['input']}\n{interaction['response']}"
+    
+    async def search(self, query, k):
+        """Interações mais relevantes para a consulta, com similaridade mínima"""
+        if self.store is None or not len(self.store):
+            return []
+        vectors = await asyncio.to_thread(self.embedder.embed, [query])
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(self.executor, self.store.top_k, vectors[0], k)
+        return [record for record, score in results if score >= settings.MEMORY_MIN_SIMILARITY]
@@ -1,7 +1,7 @@
 import asyncio
-import re
 from datetime import datetime
 from typing import Dict, List, Tuple
+from modules.lexicon_module import LexiconMatcher
 
 class EmotionEngine:
     def __init__(self, memory_system, avatar_controller):
@@ -31,6 +31,10 @@ class EmotionEngine:
             "confused": ["confuso", "dúvida", "perguntar", "não sei", "não entender"],
             "excited": ["animado", "empolgado", "entusiasmado", "esperançoso", "ansioso"]
         }
+        self.keyword_matcher = LexiconMatcher(self.emotional_keywords, "emotions")
+        
+        # O sentimento de cada interação é calculado uma vez, quando a memória a registra
+        self.memory.sentiment_analyzer = self.classify_sentiment
         
         # Fatores contextuais que influenciam emoções
         self.context_factors = {
@@ -62,21 +66,10 @@ class EmotionEngine:
     
     def get_interaction_history_factor(self) -> Dict[str, float]:
         """Retorna fatores emocionais baseados no histórico de interações"""
-        recent_interactions = self.memory.get_recent_interactions(5)
-        
-        if not recent_interactions:
-            return self.context_factors["interaction_history"]["neutral"]
-        
-        # Analisar sentimento das interações recentes
-        positive_count = 0
-        negative_count = 0
-        
-        for interaction in recent_interactions:
-            emotion = self.analyze_text_emotion(interaction["input"])
-            if emotion in ["happy", "excited"]:
-                positive_count += 1
-            elif emotion in ["sad", "angry"]:
-                negative_count += 1
+        # Agregado mantido pela memória: leitura O(1), sem reanalisar o histórico
+        summary = self.memory.get_sentiment_summary()
+        positive_count = summary["positive"]
+        negative_count = summary["negative"]
         
         if positive_count > negative_count:
             return self.context_factors["interaction_history"]["positive"]
@@ -85,16 +78,23 @@ class EmotionEngine:
         else:
             return self.context_factors["interaction_history"]["neutral"]
     
+    def classify_sentiment(self, text: str) -> str:
+        """Classifica uma fala como positive, negative ou neutral pelas palavras-chave"""
+        keyword_scores = self.keyword_matcher.counts(text)
+        if not any(keyword_scores.values()):
+            return "neutral"
+        
+        emotion = max(keyword_scores, key=keyword_scores.get)
+        if emotion in ["happy", "excited"]:
+            return "positive"
+        elif emotion in ["sad", "angry"]:
+            return "negative"
+        return "neutral"
+    
     def analyze_text_emotion(self, text: str) -> Tuple[str, float]:
         """Analisa o texto para determinar a emoção predominante"""
-        text_lower = text.lower()
-        emotion_scores = {emotion: 0 for emotion in self.emotional_keywords}
-        
-        # Contar palavras-chave emocionais
-        for emotion, keywords in self.emotional_keywords.items():
-            for keyword in keywords:
-                if re.search(r'\b' + re.escape(keyword) + r'\b', text_lower):
-                    emotion_scores[emotion] += 1
+        # Contar palavras-chave emocionais (uma única passada pelo texto)
+        emotion_scores = self.keyword_matcher.counts(text)
         
         # Adicionar fatores contextuais
         time_factor = self.get_time_of_day_factor()
@@ -0,0 +1,84 @@
+import numpy as np
+from config import settings
+
+# Índice fixo de blend shapes e ordem das camadas (a última fica por cima)
+SHAPES = ["neutral", "happy", "sad", "angry", "surprised", "aa", "ih", "ou", "ee", "oh", "eye_blink"]
+SHAPE_INDEX = {name: index for index, name in enumerate(SHAPES)}
+VISEMES = ["aa", "ih", "ou", "ee", "oh"]
+CHANNELS = ["emotion", "gesture", "viseme", "blink"]
+CHANNEL_INDEX = {name: index for index, name in enumerate(CHANNELS)}
+
+def smoothstep(t):
+    """Curva de easing suave na entrada e na saída"""
+    return t * t * (3.0 - 2.0 * t)
+
+def shape_vector(values=None):
+    """Converte {blend shape: valor} num vetor no índice fixo, ignorando nomes desconhecidos"""
+    vector = np.zeros(len(SHAPES), dtype=np.float32)
+    for name, value in (values or {}).items():
+        if name in SHAPE_INDEX:
+            vector[SHAPE_INDEX[name]] = value
+    return vector
+
+def shape_mask(names):
+    return shape_vector({name: 1.0 for name in names})
+
+class ExpressionState:
+    """Estado de expressões em arrays: alvos por canal, easing e mescla vetorizados
+    
+    Cada canal tem valores e opacidades (alpha) por blend shape. Uma escrita
+    inicia uma transição a partir do valor atual; a mescla compõe os canais
+    na ordem de CHANNELS numa única operação de arrays.
+    """
+    def __init__(self, durations=None, weights=None):
+        durations = durations or settings.AVATAR_TRANSITION_TIMES
+        weights = weights or settings.AVATAR_CHANNEL_WEIGHTS
+        shape = (len(CHANNELS), len(SHAPES))
+        
+        self.start_values = np.zeros(shape, dtype=np.float32)
+        self.target_values = np.zeros(shape, dtype=np.float32)
+        self.start_alpha = np.zeros(shape, dtype=np.float32)
+        self.target_alpha = np.zeros(shape, dtype=np.float32)
+        self.start_time = np.zeros(len(CHANNELS))
+        self.duration = np.array([max(durations[c], 1e-3) for c in CHANNELS])
+        self.weights = np.array([weights[c] for c in CHANNELS], dtype=np.float32)[:, None]
+        self.base = np.zeros(len(SHAPES), dtype=np.float32)
+        self.ones = np.ones((1, len(SHAPES)), dtype=np.float32)
+    
+    def _progress(self, now):
+        t = np.clip((now - self.start_time) / self.duration, 0.0, 1.0)
+        return smoothstep(t).astype(np.float32)[:, None]
+    
+    def _current(self, now):
+        progress = self._progress(now)
+        values = self.start_values + (self.target_values - self.start_values) * progress
+        alpha = self.start_alpha + (self.target_alpha - self.start_alpha) * progress
+        return values, alpha
+    
+    def set_channel(self, channel, values, alpha, now):
+        """Define o alvo de um canal, partindo do estado interpolado atual"""
+        index = CHANNEL_INDEX[channel]
+        values_now, alpha_now = self._current(now)
+        # Onde o canal estava transparente não há valor anterior a interpolar
+        self.start_values[index] = np.where(alpha_now[index] > 0.0, values_now[index], values)
+        self.start_alpha[index] = alpha_now[index]
+        self.target_values[index] = values
+        self.target_alpha[index] = alpha
+        self.start_time[index] = now
+    
+    def target(self, channel):
+        """Cópia do vetor alvo de um canal"""
+        return self.target_values[CHANNEL_INDEX[channel]].copy()
+    
+    def evaluate(self, now):
+        """Interpola todos os canais e compõe o resultado final
+        
+        resultado = base·Π(1-aⱼ) + Σ_c v_c·a_c·Π_{j>c}(1-aⱼ)
+        """
+        values, alpha = self._current(now)
+        alpha *= self.weights
+        
+        # Produto de (1 - alpha) de cada canal e de todos os que estão acima dele
+        remaining = np.cumprod((1.0 - alpha)[::-1], axis=0)[::-1]
+        above = np.vstack([remaining[1:], self.ones])
+        return self.base * remaining[0] + (values * alpha * above).sum(axis=0)
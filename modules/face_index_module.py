@@ -0,0 +1,72 @@
+import numpy as np
+from config import settings
+
+class FaceIndex:
+    """Índice de rostos conhecidos numa matriz float32 contígua com busca vetorizada"""
+    def __init__(self, dimension=128, tolerance=None, initial_capacity=64):
+        self.dimension = dimension
+        self.tolerance = tolerance or settings.FACE_MATCH_TOLERANCE
+        self.encodings = np.zeros((initial_capacity, dimension), dtype=np.float32)
+        self.squared_norms = np.zeros(initial_capacity, dtype=np.float32)
+        self.names = []
+        self.size = 0
+    
+    def __len__(self):
+        return self.size
+    
+    def add(self, name, encoding):
+        """Adiciona uma codificação, dobrando a capacidade quando necessário"""
+        self.add_many([name], np.asarray(encoding, dtype=np.float32)[None, :])
+    
+    def add_many(self, names, encodings):
+        """Adiciona várias codificações de uma vez"""
+        encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dimension)
+        required = self.size + len(encodings)
+        if required > len(self.encodings):
+            capacity = max(required, 2 * len(self.encodings))
+            grown = np.zeros((capacity, self.dimension), dtype=np.float32)
+            grown[:self.size] = self.encodings[:self.size]
+            norms = np.zeros(capacity, dtype=np.float32)
+            norms[:self.size] = self.squared_norms[:self.size]
+            self.encodings, self.squared_norms = grown, norms
+        
+        self.encodings[self.size:required] = encodings
+        self.squared_norms[self.size:required] = np.einsum("ij,ij->i", encodings, encodings)
+        self.names.extend(names)
+        self.size = required
+    
+    def remove(self, name):
+        """Remove todas as codificações de uma identidade; retorna quantas saíram"""
+        keep = [i for i, n in enumerate(self.names) if n != name]
+        removed = self.size - len(keep)
+        if removed:
+            self.encodings[:len(keep)] = self.encodings[keep]
+            self.squared_norms[:len(keep)] = self.squared_norms[keep]
+            self.names = [self.names[i] for i in keep]
+            self.size = len(keep)
+        return removed
+    
+    def search(self, queries):
+        """Vizinho mais próximo de cada consulta: (índices, distâncias euclidianas)"""
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dimension)
+        if not self.size or not len(queries):
+            return (np.full(len(queries), -1, dtype=np.int64),
+                    np.full(len(queries), np.inf, dtype=np.float32))
+        
+        # |q - e|² = |q|² + |e|² - 2 q·e, calculado para todas as consultas de uma vez
+        known = self.encodings[:self.size]
+        squared = (np.einsum("ij,ij->i", queries, queries)[:, None]
+                   + self.squared_norms[None, :self.size]
+                   - 2.0 * queries @ known.T)
+        nearest = np.argmin(squared, axis=1)
+        distances = np.sqrt(np.maximum(squared[np.arange(len(queries)), nearest], 0.0))
+        return nearest, distances
+    
+    def match(self, queries, unknown="Desconhecido"):
+        """Retorna (nome, distância) para cada consulta, respeitando a tolerância"""
+        nearest, distances = self.search(queries)
+        return [
+            (self.names[index] if index >= 0 and distance <= self.tolerance else unknown,
+             float(distance))
+            for index, distance in zip(nearest, distances)
+        ]
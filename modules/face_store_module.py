@@ -0,0 +1,146 @@
+import asyncio
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import face_recognition
+from config import settings
+
+def encode_face_file(path):
+    """Codifica o primeiro rosto de uma imagem (executado no pool de processos)"""
+    image = face_recognition.load_image_file(path)
+    encodings = face_recognition.face_encodings(image)
+    return encodings[0] if encodings else None
+
+def file_digest(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def matrix_digest(matrix):
+    """Hash do conteúdo da matriz, guardado no manifesto para detectar pares trocados"""
+    return hashlib.sha1(np.ascontiguousarray(matrix, dtype=np.float32).tobytes()).hexdigest()
+
+class FaceEncodingStore:
+    """Cache em disco das codificações da galeria de rostos (matriz .npy + manifesto)"""
+    def __init__(self, faces_dir=None, cache_dir=None):
+        self.faces_dir = faces_dir or settings.FACES_DIR
+        self.cache_dir = cache_dir or settings.FACE_CACHE_DIR
+        self.matrix_path = self.cache_dir / "encodings.npy"
+        self.manifest_path = self.cache_dir / "manifest.json"
+    
+    async def load(self):
+        """Retorna (nomes, matriz float32), recodificando só imagens novas ou alteradas"""
+        manifest, matrix, pending, changed = await asyncio.to_thread(self._scan)
+        
+        if pending:
+            loop = asyncio.get_running_loop()
+            with ProcessPoolExecutor() as executor:
+                encodings = await asyncio.gather(*(
+                    loop.run_in_executor(executor, encode_face_file, str(path))
+                    for path, _ in pending
+                ))
+            for (path, entry), encoding in zip(pending, encodings):
+                if encoding is None:
+                    print(f"Nenhum rosto encontrado em {path.name}")
+                entry["encoding"] = encoding
+                manifest[path.name] = entry
+            changed = True
+        
+        if changed:
+            return await asyncio.to_thread(self._rebuild, manifest, matrix)
+        
+        # Galeria inalterada: só o carregamento mapeado em memória
+        rows = sorted((entry["row"], entry["name"]) for entry in manifest.values() if entry["row"] >= 0)
+        return [name for _, name in rows], matrix
+    
+    def _scan(self):
+        """Compara a galeria com o manifesto usando caminho, mtime e hash"""
+        manifest, matrix = self._read_cache()
+        current = {}
+        pending = []
+        changed = False
+        
+        if self.faces_dir.exists():
+            for path in sorted(self.faces_dir.glob("*.jpg")):
+                stat = path.stat()
+                entry = manifest.get(path.name)
+                if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+                    current[path.name] = entry
+                    continue
+                
+                # mtime mudou: o hash decide se o conteúdo precisa ser recodificado
+                digest = file_digest(path)
+                changed = True
+                if entry and entry["hash"] == digest:
+                    entry.update(mtime=stat.st_mtime, size=stat.st_size)
+                    current[path.name] = entry
+                else:
+                    pending.append((path, {
+                        "name": path.stem,
+                        "mtime": stat.st_mtime,
+                        "size": stat.st_size,
+                        "hash": digest
+                    }))
+        
+        if set(manifest) - set(current) - {path.name for path, _ in pending}:
+            changed = True
+        return current, matrix, pending, changed
+    
+    def _read_cache(self):
+        if not (self.manifest_path.exists() and self.matrix_path.exists()):
+            return {}, np.zeros((0, 128), dtype=np.float32)
+        try:
+            with open(self.manifest_path, "r") as f:
+                data = json.load(f)
+            manifest = data["entries"]
+            matrix = np.load(self.matrix_path, mmap_mode="r")
+            # Matriz e manifesto são substituídos em dois passos: uma queda entre eles
+            # deixaria nomes apontando para codificações de outra versão
+            if data.get("rows") != len(matrix) or data.get("matrix_hash") != matrix_digest(matrix):
+                raise ValueError("matriz não corresponde ao manifesto")
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Cache de rostos inválido, recodificando: {e}")
+            return {}, np.zeros((0, 128), dtype=np.float32)
+        return manifest, matrix
+    
+    def _rebuild(self, manifest, matrix):
+        """Grava nova matriz e manifesto atomicamente e os retorna"""
+        names = []
+        rows = []
+        for entry in manifest.values():
+            if "encoding" in entry:
+                encoding = entry.pop("encoding")
+            elif entry["row"] >= 0:
+                encoding = matrix[entry["row"]]
+            else:
+                encoding = None
+            
+            if encoding is None:
+                entry["row"] = -1
+                continue
+            entry["row"] = len(rows)
+            rows.append(np.asarray(encoding, dtype=np.float32))
+            names.append(entry["name"])
+        
+        new_matrix = np.stack(rows) if rows else np.zeros((0, 128), dtype=np.float32)
+        
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        temp_matrix = self.matrix_path.with_suffix(".tmp.npy")
+        np.save(temp_matrix, new_matrix)
+        os.replace(temp_matrix, self.matrix_path)
+        
+        temp_manifest = self.manifest_path.with_suffix(".json.tmp")
+        with open(temp_manifest, "w") as f:
+            json.dump({
+                "version": 2,
+                "rows": len(new_matrix),
+                "matrix_hash": matrix_digest(new_matrix),
+                "entries": manifest
+            }, f)
+        os.replace(temp_manifest, self.manifest_path)
+        
+        return names, new_matrix
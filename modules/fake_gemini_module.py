@@ -0,0 +1,49 @@
+import asyncio
+import re
+from google.api_core import exceptions as google_exceptions
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+class FakeStream:
+    """Resposta em streaming simulada, com latência por parte"""
+    def __init__(self, chunks, chunk_latency):
+        self.chunks = chunks
+        self.chunk_latency = chunk_latency
+    
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            await asyncio.sleep(self.chunk_latency)
+            yield FakeChunk(chunk)
+
+class FakeGenerativeModel:
+    """Substituto local e determinístico do GenerativeModel para uso offline
+    
+    Responde ecoando a última fala do usuário, com latências configuráveis e
+    a opção de falhar nas primeiras chamadas para exercitar repetições e fallback.
+    """
+    def __init__(self, first_token_latency=0.05, chunk_latency=0.01, failures=0, replies=None):
+        self.first_token_latency = first_token_latency
+        self.chunk_latency = chunk_latency
+        self.failures = failures
+        self.replies = replies or {}
+        self.calls = 0
+        self.prompts = []
+    
+    def reply_for(self, prompt):
+        matches = re.findall(r"Usuário: (.*)", prompt)
+        text_input = matches[-1].strip() if matches else ""
+        return self.replies.get(text_input, f"Você disse: {text_input}. Que legal conversar com você!")
+    
+    async def generate_content_async(self, prompt, stream=False):
+        self.calls += 1
+        self.prompts.append(prompt)
+        await asyncio.sleep(self.first_token_latency)
+        if self.calls <= self.failures:
+            raise google_exceptions.ServiceUnavailable("falha simulada")
+        
+        reply = self.reply_for(prompt)
+        if not stream:
+            return FakeChunk(reply)
+        return FakeStream(re.findall(r"\S+\s*", reply), self.chunk_latency)
@@ -0,0 +1,185 @@
+import json
+import re
+import unicodedata
+from functools import lru_cache
+from config import settings
+
+# Visemes por fonema (IPA, no mesmo alfabeto do espeak usado pelo Piper); None = boca fechada
+PHONEME_VISEMES = {
+    'a': 'aa', 'ɐ': 'aa', 'ɑ': 'aa',
+    'e': 'ee', 'ɛ': 'ee', 'f': 'ee', 'v': 'ee',
+    'i': 'ih', 'ɪ': 'ih', 'j': 'ih', 's': 'ih', 'z': 'ih', 'ʃ': 'ih', 'ʒ': 'ih',
+    'o': 'oh', 'ɔ': 'oh', 'd': 'oh', 't': 'oh', 'n': 'oh', 'l': 'oh', 'ɲ': 'oh', 'ʎ': 'oh',
+    'u': 'ou', 'ʊ': 'ou', 'w': 'ou', 'ɾ': 'ou', 'r': 'ou', 'x': 'ou', 'h': 'ou', 'k': 'ou', 'g': 'ou', 'ɡ': 'ou',
+    'p': None, 'b': None, 'm': None
+}
+
+# Pronúncias que as regras não acertam (palavra -> fonemas separados por espaço)
+DEFAULT_EXCEPTIONS = {
+    "luna": "l u n ɐ",
+    "nova": "n ɔ v ɐ",
+    "você": "v o s e",
+    "olá": "o l a",
+    "porque": "p u ɾ k e",
+    "também": "t ɐ̃ b ẽ j̃",
+    "muito": "m ũ j̃ t u",
+    "bem": "b ẽ j̃",
+    "sem": "s ẽ j̃",
+    "tem": "t ẽ j̃",
+    "nem": "n ẽ j̃",
+    "quem": "k ẽ j̃",
+    "é": "ɛ",
+    "e": "i",
+    "o": "u",
+    "os": "u s"
+}
+
+VOWELS = set("aeiouáàâãéêíóôõú")
+FRONT_VOWELS = set("eiéêí")
+REDUCED = {'a': 'ɐ', 'e': 'i', 'o': 'u'}
+ACCENTED = {'á': 'a', 'à': 'a', 'â': 'ɐ', 'ã': 'ɐ̃', 'é': 'ɛ', 'ê': 'e', 'í': 'i', 'ó': 'ɔ', 'ô': 'o', 'õ': 'õ', 'ú': 'u'}
+NASAL = {'a': 'ɐ̃', 'e': 'ẽ', 'i': 'ĩ', 'o': 'õ', 'u': 'ũ', 'â': 'ɐ̃', 'ê': 'ẽ', 'ô': 'õ', 'á': 'ɐ̃', 'é': 'ẽ', 'í': 'ĩ', 'ó': 'õ', 'ú': 'ũ'}
+WORD_PATTERN = re.compile(r"[a-záàâãéêíóôõúüç]+")
+
+def viseme_for(phoneme):
+    """Viseme de um fonema IPA, ignorando diacríticos e marcas de duração"""
+    if phoneme in PHONEME_VISEMES:
+        return PHONEME_VISEMES[phoneme]
+    if phoneme == 'sil':
+        return 'neutral'
+    base = unicodedata.normalize("NFD", phoneme)[:1]
+    return PHONEME_VISEMES.get(base, 'neutral')
+
+class PortugueseG2P:
+    """Conversão grafema-fonema baseada em regras para o português brasileiro
+
+    Cobre dígrafos (ch, lh, nh, rr, ss, qu, gu), vogais acentuadas e nasais,
+    palatalização de t/d antes de i e redução das vogais átonas finais.
+    Palavras do léxico de exceções têm prioridade sobre as regras, e as
+    pronúncias ficam num cache LRU por palavra.
+    """
+    def __init__(self, exceptions=None, path=None, cache_size=None):
+        self.path = path or settings.G2P_LEXICON_PATH
+        self.exceptions = dict(DEFAULT_EXCEPTIONS)
+        self.exceptions.update(exceptions or {})
+        self._load_exceptions()
+        self.word = lru_cache(maxsize=cache_size or settings.G2P_CACHE_SIZE)(self._transcribe)
+
+    def _load_exceptions(self):
+        """Acrescenta as pronúncias do arquivo opcional de exceções"""
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.exceptions.update(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"Erro ao carregar pronúncias: {e}")
+
+    def phonemes(self, text):
+        """Fonemas do texto, com 'sil' entre palavras e nas pausas de pontuação"""
+        text = unicodedata.normalize("NFC", text.lower())
+        phonemes = []
+        position = 0
+        for match in WORD_PATTERN.finditer(text):
+            if phonemes and match.start() > position:
+                phonemes.append('sil')
+            phonemes.extend(self.word(match.group()))
+            position = match.end()
+        return phonemes
+
+    def _transcribe(self, word):
+        """Pronúncia de uma palavra (tupla de fonemas), usada através do cache"""
+        if word in self.exceptions:
+            return tuple(self.exceptions[word].split())
+
+        phonemes = []
+        i = 0
+        n = len(word)
+        while i < n:
+            char = word[i]
+            next_char = word[i + 1] if i + 1 < n else ""
+            after = word[i + 2] if i + 2 < n else ""
+            previous = word[i - 1] if i > 0 else ""
+
+            # Dígrafos
+            if char + next_char in ("ch", "lh", "nh"):
+                phonemes.append({"ch": "ʃ", "lh": "ʎ", "nh": "ɲ"}[char + next_char])
+                i += 2
+                continue
+            if char + next_char in ("rr", "ss"):
+                phonemes.append("x" if char == "r" else "s")
+                i += 2
+                continue
+            if char in ("q", "g") and next_char in ("u", "ü") and after in VOWELS:
+                phonemes.append("k" if char == "q" else "g")
+                # O u só é pronunciado antes de a/o ou com trema
+                if after not in FRONT_VOWELS or next_char == "ü":
+                    phonemes.append("w")
+                i += 2
+                continue
+
+            # Ditongos nasais
+            if word[i:i + 2] in ("ão", "õe", "ãe"):
+                phonemes.extend({"ão": ("ɐ̃", "w̃"), "õe": ("õ", "j̃"), "ãe": ("ɐ̃", "j̃")}[word[i:i + 2]])
+                i += 2
+                continue
+            if char == "a" and next_char == "m" and i + 2 == n:
+                phonemes.extend(("ɐ̃", "w̃"))
+                i += 2
+                continue
+
+            if char in VOWELS:
+                # Vogal seguida de m/n em coda fica nasal
+                if next_char in ("m", "n") and after not in VOWELS and after != "h":
+                    phonemes.append(NASAL.get(char, char))
+                    i += 2
+                    continue
+                if char in ACCENTED:
+                    phonemes.append(ACCENTED[char])
+                elif n > 1 and char in REDUCED and (i == n - 1 or i == n - 2 and next_char == "s"):
+                    # Vogais átonas finais se reduzem
+                    phonemes.append(REDUCED[char])
+                else:
+                    phonemes.append(char)
+                i += 1
+                continue
+
+            phonemes.extend(self._consonant(word, i, char, previous, next_char))
+            i += 1
+
+        return tuple(phonemes)
+
+    @staticmethod
+    def _consonant(word, i, char, previous, next_char):
+        """Fonemas de uma consoante simples no contexto"""
+        n = len(word)
+        before_i = next_char in ("i", "í") or (next_char == "e" and word[i + 2:] in ("", "s"))
+
+        if char in ("t", "d") and before_i:
+            return ("tʃ",) if char == "t" else ("dʒ",)
+        if char == "c":
+            return ("s",) if next_char in FRONT_VOWELS else ("k",)
+        if char == "g":
+            return ("ʒ",) if next_char in FRONT_VOWELS else ("g",)
+        if char == "ç":
+            return ("s",)
+        if char == "q":
+            return ("k",)
+        if char == "j":
+            return ("ʒ",)
+        if char == "x":
+            return ("ʃ",)
+        if char == "h":
+            return ()
+        if char == "r":
+            return ("x",) if i == 0 or previous in ("n", "l", "s") or i == n - 1 else ("ɾ",)
+        if char == "s":
+            return ("z",) if previous in VOWELS and next_char in VOWELS else ("s",)
+        if char == "z":
+            return ("s",) if i == n - 1 else ("z",)
+        if char == "l":
+            # L em coda vira semivogal
+            return ("w",) if next_char == "" or next_char not in VOWELS else ("l",)
+        if char in PHONEME_VISEMES:
+            return (char,)
+        return ()
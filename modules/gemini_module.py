@@ -1,46 +1,212 @@
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 import asyncio
+import random
+import time
+from datetime import timedelta
 from config import settings
+from modules.prompt_module import PromptBuilder, estimate_tokens
+from modules.response_cache_module import ResponseCache
+from modules.fake_gemini_module import FakeGenerativeModel
+from modules.tracing_module import tracer
+
+# Falhas transitórias que valem uma nova tentativa
+RETRYABLE_ERRORS = (
+    asyncio.TimeoutError,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError
+)
 
 class GeminiBrain:
-    def __init__(self, memory_system):
+    def __init__(self, memory_system=None):
         self.memory = memory_system
         self.model = None
+        self.prompt_builder = PromptBuilder()
+        self.cached_content = None
+        self.cache_expires_at = 0.0
+        self.response_cache = ResponseCache()
         
     async def initialize(self):
         """Inicializa o modelo Gemini"""
         genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
+        self.model = await asyncio.to_thread(self._create_model)
         print("Modelo Gemini inicializado")
     
+    def for_memory(self, memory_system):
+        """Nova instância para outra memória, reaproveitando o modelo e o prefixo em cache"""
+        brain = GeminiBrain(memory_system)
+        brain.model = self.model
+        brain.prompt_builder = self.prompt_builder
+        brain.cached_content = self.cached_content
+        brain.cache_expires_at = self.cache_expires_at
+        return brain
+    
+    def _create_model(self):
+        """Cria o modelo com o preâmbulo fixo como prefixo estável"""
+        preamble = self.prompt_builder.preamble
+        if settings.GEMINI_FAKE:
+            return FakeGenerativeModel()
+        
+        # Cache explícito só compensa (e só é aceito) a partir de um tamanho mínimo
+        if estimate_tokens(preamble) >= settings.PROMPT_CACHE_MIN_TOKENS:
+            try:
+                self.cached_content = genai.caching.CachedContent.create(
+                    model=f"models/{settings.GEMINI_MODEL}",
+                    system_instruction=preamble,
+                    ttl=timedelta(seconds=settings.PROMPT_CACHE_TTL)
+                )
+                self.cache_expires_at = time.monotonic() + settings.PROMPT_CACHE_TTL
+                return genai.GenerativeModel.from_cached_content(self.cached_content)
+            except Exception as e:
+                print(f"Cache de contexto indisponível: {e}")
+        
+        return genai.GenerativeModel(settings.GEMINI_MODEL, system_instruction=preamble)
+    
+    async def _refresh_cache(self):
+        """Renova o TTL do prefixo em cache antes que ele expire"""
+        if self.cached_content is None:
+            return
+        if time.monotonic() < self.cache_expires_at - settings.PROMPT_CACHE_REFRESH_MARGIN:
+            return
+        await asyncio.to_thread(
+            self.cached_content.update, ttl=timedelta(seconds=settings.PROMPT_CACHE_TTL)
+        )
+        self.cache_expires_at = time.monotonic() + settings.PROMPT_CACHE_TTL
+    
     async def process_input(self, text_input, vision_data=None):
         """Processa entrada com contexto e visão"""
         # Obter contexto da memória
         context = self.memory.get_context()
         
-        # Construir prompt com contexto
-        prompt = self.build_prompt(text_input, context, vision_data)
+        # Respostas repetidas vêm do cache; requisições idênticas simultâneas são agrupadas
+        key = self.response_cache.make_key(text_input, context, vision_data)
+        cached = self.response_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        future = self.response_cache.begin(key)
+        if future is None:
+            try:
+                return await self.response_cache.wait(key)
+            except Exception:
+                future = None
+        
+        try:
+            chunks = []
+            cacheable = True
+            async for chunk, ok in self._generate(text_input, context, vision_data):
+                chunks.append(chunk)
+                cacheable = cacheable and ok
+            response = "".join(chunks)
+        except BaseException as e:
+            if future is not None:
+                self.response_cache.finish(key, future, error=e)
+            raise
+        
+        if future is not None:
+            if cacheable:
+                self.response_cache.put(key, response)
+            self.response_cache.finish(key, future, response)
+        return response
+    
+    async def stream_input(self, text_input, vision_data=None):
+        """Processa entrada produzindo a resposta em partes à medida que é gerada"""
+        context = self.memory.get_context()
+        
+        key = self.response_cache.make_key(text_input, context, vision_data)
+        cached = self.response_cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+        
+        future = self.response_cache.begin(key)
+        if future is None:
+            try:
+                yield await self.response_cache.wait(key)
+                return
+            except Exception:
+                future = None
+        
+        chunks = []
+        cacheable = True
+        try:
+            async for chunk, ok in self._generate(text_input, context, vision_data, stream=True):
+                chunks.append(chunk)
+                cacheable = cacheable and ok
+                yield chunk
+        except BaseException as e:
+            if future is not None:
+                self.response_cache.finish(key, future, error=e)
+            raise
+        
+        if future is not None:
+            response = "".join(chunks)
+            if cacheable:
+                self.response_cache.put(key, response)
+            self.response_cache.finish(key, future, response)
+    
+    async def _generate(self, text_input, context, vision_data, stream=False):
+        """Gera a resposta com timeout e novas tentativas; produz (parte, veio_do_modelo)"""
+        with tracer.span("memory.retrieve", "memory"):
+            memories = await self.memory.retrieve(text_input)
+        with tracer.span("prompt.build", "gemini") as span:
+            prompt = self.build_prompt(text_input, context, vision_data, memories)
+            span.set(characters=len(prompt))
+        await self._refresh_cache()
+        
+        # Prazo total até a primeira parte, somando tentativas e backoff: passou dele,
+        # o usuário ouve a resposta local em vez de esperar todas as tentativas
+        deadline = time.monotonic() + settings.GEMINI_RESPONSE_DEADLINE
+        for attempt in range(settings.GEMINI_MAX_RETRIES + 1):
+            produced = False
+            try:
+                if not stream:
+                    response = await asyncio.wait_for(
+                        self.model.generate_content_async(prompt),
+                        min(settings.GEMINI_TIMEOUT, deadline - time.monotonic())
+                    )
+                    yield response.text, True
+                    return
+                
+                response = await asyncio.wait_for(
+                    self.model.generate_content_async(prompt, stream=True),
+                    min(settings.GEMINI_FIRST_TOKEN_TIMEOUT, deadline - time.monotonic())
+                )
+                chunks = response.__aiter__()
+                while True:
+                    if produced:
+                        timeout = settings.GEMINI_STREAM_TIMEOUT
+                    else:
+                        timeout = min(settings.GEMINI_FIRST_TOKEN_TIMEOUT, deadline - time.monotonic())
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), timeout)
+                    except StopAsyncIteration:
+                        return
+                    if chunk.text:
+                        produced = True
+                        yield chunk.text, True
+            except RETRYABLE_ERRORS as e:
+                # Parte da resposta já foi falada: encerrar aqui em vez de repetir
+                if produced:
+                    return
+                print(f"Gemini indisponível (tentativa {attempt + 1}): {e!r}")
+                remaining = deadline - time.monotonic()
+                if attempt == settings.GEMINI_MAX_RETRIES or remaining <= 0:
+                    break
+                # Backoff exponencial com jitter completo, sem ultrapassar o prazo
+                delay = random.uniform(0, settings.GEMINI_RETRY_BASE_DELAY * 2 ** attempt)
+                await asyncio.sleep(min(delay, remaining))
+            except Exception as e:
+                if produced:
+                    return
+                print(f"Erro no Gemini: {e!r}")
+                break
         
-        # Gerar resposta
-        response = await self.model.generate_content_async(prompt)
-        return response.text
+        # Resposta local imediata para não deixar o usuário sem retorno
+        yield random.choice(settings.FALLBACK_REPLIES), False
     
-    def build_prompt(self, text_input, context, vision_data):
-        """Constrói o prompt para o Gemini com contexto"""
-        prompt = "Você é um companion virtual amigável e útil.\n\n"
-        
-        # Adicionar contexto de memória
-        if context:
-            prompt += "Contexto recente:\n"
-            for interaction in context:
-                prompt += f"Usuário: {interaction['input']}\n"
-                prompt += f"Você: {interaction['response']}\n\n"
-        
-        # Adicionar informações visuais
-        if vision_data and vision_data.get('faces'):
-            prompt += "Informações visuais:\n"
-            for face in vision_data['faces']:
-                prompt += f"- {face['name']} está visível\n"
-        
-        prompt += f"\nUsuário: {text_input}\nCompanion:"
-        return prompt
\ No newline at end of file
+    def build_prompt(self, text_input, context, vision_data, memories=None):
+        """Constrói o prompt para o Gemini com contexto, limitado ao orçamento de tokens"""
+        return self.prompt_builder.build(text_input, context, vision_data, memories)
@@ -1,7 +1,7 @@
 import asyncio
 import random
-import re
 from typing import Dict, List
+from modules.lexicon_module import LexiconMatcher
 
 class GestureController:
     def __init__(self, avatar_controller):
@@ -19,6 +19,7 @@ class GestureController:
             "explicação": ["explicar", "mostrar", "demonstrar", "ensinar"],
             "entusiasmo": ["incrível", "maravilhoso", "fantástico", "surpreendente"]
         }
+        self.keyword_matcher = LexiconMatcher(self.gesture_mapping, "gestures")
         
         # Gestos disponíveis e seus parâmetros
         self.available_gestures = {
@@ -33,15 +34,10 @@ class GestureController:
     
     async def analyze_text_for_gestures(self, text: str) -> str:
         """Analisa o texto para determinar gestos apropriados"""
-        text_lower = text.lower()
-        
         # Verificar correspondências com palavras-chave
-        matched_gestures = []
-        for gesture, keywords in self.gesture_mapping.items():
-            for keyword in keywords:
-                if re.search(r'\b' + re.escape(keyword) + r'\b', text_lower):
-                    matched_gestures.append(gesture)
-                    break
+        matched_gestures = [
+            gesture for gesture, count in self.keyword_matcher.counts(text).items() if count
+        ]
         
         # Escolher o gesto mais apropriado com base no contexto
         if matched_gestures:
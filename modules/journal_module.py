@@ -0,0 +1,185 @@
+import asyncio
+import json
+import os
+from pathlib import Path
+from config import settings
+
+class MemoryJournal:
+    """Diário append-only em JSONL com gravação em lote e compactação atômica"""
+    def __init__(self, path, flush_interval=None, compact_every=None, max_entries=None):
+        self.path = Path(path)
+        # Tamanho e número de registros após a última compactação, fora dos dados
+        self.state_path = self.path.with_suffix(self.path.suffix + ".state")
+        self.flush_interval = flush_interval or settings.MEMORY_FLUSH_INTERVAL
+        self.compact_every = compact_every or settings.MEMORY_COMPACT_EVERY
+        self.max_entries = max_entries or settings.MEMORY_MAX_ENTRIES
+        
+        self.pending = []
+        self.wakeup = asyncio.Event()
+        self.flush_lock = asyncio.Lock()
+        self.writer_task = None
+        self.appended_since_compaction = 0
+    
+    async def start(self):
+        """Prepara o arquivo e inicia o gravador em segundo plano"""
+        await asyncio.to_thread(self._repair)
+        # Registros gravados desde a última compactação, talvez em execuções anteriores:
+        # sem isso, reinícios frequentes nunca compactariam
+        self.appended_since_compaction = await asyncio.to_thread(self._appended_since_compaction)
+        if self.writer_task is None:
+            self.writer_task = asyncio.create_task(self._writer_loop())
+    
+    async def close(self):
+        """Grava o que estiver pendente e encerra o gravador"""
+        if self.writer_task:
+            self.writer_task.cancel()
+            await asyncio.gather(self.writer_task, return_exceptions=True)
+            self.writer_task = None
+        await self.flush()
+    
+    def append(self, record):
+        """Enfileira um registro; custo O(1), sem I/O no loop de eventos"""
+        self.pending.append(record)
+        self.wakeup.set()
+    
+    async def _writer_loop(self):
+        while True:
+            await self.wakeup.wait()
+            # Esperar um pouco para agrupar várias interações numa única escrita
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except OSError as e:
+                print(f"Erro ao gravar memória: {e}")
+    
+    async def flush(self):
+        """Grava todos os registros pendentes num único append com fsync"""
+        async with self.flush_lock:
+            self.wakeup.clear()
+            if not self.pending:
+                return
+            batch, self.pending = self.pending, []
+            try:
+                await asyncio.to_thread(self._write_batch, batch)
+            except OSError:
+                self.pending = batch + self.pending
+                raise
+            
+            self.appended_since_compaction += len(batch)
+            if self.appended_since_compaction >= self.compact_every:
+                await asyncio.to_thread(self._compact)
+                self.appended_since_compaction = 0
+    
+    def _write_batch(self, batch):
+        lines = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in batch)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+    
+    def _repair(self):
+        """Garante que o arquivo termine em nova linha após uma escrita interrompida"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if not self.path.exists() or self.path.stat().st_size == 0:
+            return
+        with open(self.path, "rb+") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+    
+    def _appended_since_compaction(self):
+        """Estima os registros acrescentados desde a última compactação sem ler o histórico
+
+        O crescimento em bytes desde a compactação é dividido pelo tamanho médio
+        de um registro: o do arquivo compactado ou, sem estado salvo (diário
+        ainda não compactado), o da cauda do arquivo.
+        """
+        size = self.path.stat().st_size if self.path.exists() else 0
+        try:
+            with open(self.state_path, "r") as f:
+                state = json.load(f)
+            base_size, base_records = state["size"], state["records"]
+        except (OSError, ValueError, KeyError):
+            base_size, base_records = 0, 0
+        if size < base_size:
+            base_size, base_records = 0, 0  # estado de outro arquivo: recomeçar a contagem
+        
+        growth = size - base_size
+        if growth <= 0:
+            return 0
+        if base_records:
+            record_bytes = base_size / base_records
+        else:
+            with open(self.path, "rb") as f:
+                f.seek(max(0, size - (1 << 16)))
+                tail = f.read()
+            record_bytes = len(tail) / max(1, tail.count(b"\n"))
+        return int(growth / record_bytes)
+    
+    def _compact(self):
+        """Reescreve o diário sem registros corrompidos, mantendo os mais recentes"""
+        records = list(self._iter_records())[-self.max_entries:]
+        temp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        
+        # Estado gravado depois da troca: uma queda entre as duas só superestima a
+        # contagem e antecipa a próxima compactação
+        temp_state = self.state_path.with_suffix(".tmp")
+        with open(temp_state, "w") as f:
+            json.dump({"size": self.path.stat().st_size, "records": len(records)}, f)
+        os.replace(temp_state, self.state_path)
+    
+    def _iter_records(self):
+        if not self.path.exists():
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                record = self._parse(line)
+                if record is not None:
+                    yield record
+    
+    @staticmethod
+    def _parse(line):
+        line = line.strip()
+        if not line:
+            return None
+        try:
+            return json.loads(line)
+        except ValueError:
+            # Linha truncada por uma queda: ignorar
+            return None
+    
+    async def load_tail(self, count):
+        """Lê apenas os últimos `count` registros, do fim do arquivo para trás"""
+        return await asyncio.to_thread(self._read_tail, count)
+    
+    def _read_tail(self, count):
+        if count <= 0 or not self.path.exists():
+            return []
+        
+        block_size = 1 << 16
+        with open(self.path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            data = b""
+            while position > 0 and data.count(b"\n") <= count:
+                step = min(block_size, position)
+                position -= step
+                f.seek(position)
+                data = f.read(step) + data
+        
+        lines = data.decode("utf-8", errors="replace").splitlines()
+        if position > 0:
+            lines = lines[1:]  # a primeira linha pode estar incompleta
+        records = [record for record in map(self._parse, lines) if record is not None]
+        return records[-count:]
+    
+    async def import_records(self, records):
+        """Acrescenta registros em massa (migração do formato antigo)"""
+        async with self.flush_lock:
+            await asyncio.to_thread(self._write_batch, records)
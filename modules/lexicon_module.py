@@ -0,0 +1,94 @@
+import json
+import re
+import time
+from config import settings
+
+def build_trie_pattern(keywords):
+    """Compila palavras-chave numa expressão regular em forma de trie (prefixos compartilhados)"""
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = {}
+    return _node_pattern(trie)
+
+def _node_pattern(node):
+    is_end = "" in node
+    branches = [
+        (r"\s+" if char == " " else re.escape(char)) + _node_pattern(child)
+        for char, child in sorted(node.items()) if char
+    ]
+    if not branches:
+        return ""
+    if len(branches) == 1 and not is_end:
+        return branches[0]
+    # O sufixo opcional é guloso, então a frase mais longa tem prioridade
+    group = "(?:" + "|".join(branches) + ")"
+    return group + "?" if is_end else group
+
+class LexiconMatcher:
+    """Conta palavras-chave de todas as categorias de um léxico numa única passada"""
+    def __init__(self, lexicon, section=None, path=None):
+        self.section = section
+        self.path = path or settings.LEXICON_PATH
+        self.mtime = None
+        self.last_check = 0.0
+        self.compile(lexicon)
+        self.reload_if_changed(force=True)
+    
+    def compile(self, lexicon):
+        """Pré-compila o léxico {categoria: [palavras-chave]}"""
+        self.lexicon = {category: list(keywords) for category, keywords in lexicon.items()}
+        self.categories_by_keyword = {}
+        for category, keywords in self.lexicon.items():
+            for keyword in keywords:
+                normalized = " ".join(keyword.lower().split())
+                self.categories_by_keyword.setdefault(normalized, []).append(category)
+        
+        if self.categories_by_keyword:
+            trie = build_trie_pattern(self.categories_by_keyword)
+            self.pattern = re.compile(r"\b(?:" + trie + r")\b")
+        else:
+            self.pattern = None
+    
+    def reload_if_changed(self, force=False):
+        """Recarrega a seção do arquivo de léxicos se ele tiver sido modificado"""
+        now = time.monotonic()
+        if self.section is None or (not force and now - self.last_check < settings.LEXICON_RELOAD_INTERVAL):
+            return False
+        self.last_check = now
+        
+        try:
+            mtime = self.path.stat().st_mtime
+        except FileNotFoundError:
+            return False
+        if mtime == self.mtime:
+            return False
+        self.mtime = mtime
+        
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                lexicon = json.load(f).get(self.section)
+        except (OSError, ValueError) as e:
+            print(f"Erro ao carregar léxicos: {e}")
+            return False
+        if not lexicon:
+            return False
+        
+        self.compile(lexicon)
+        print(f"Léxico '{self.section}' recarregado")
+        return True
+    
+    def counts(self, text):
+        """Número de palavras-chave distintas encontradas em cada categoria"""
+        self.reload_if_changed()
+        counts = {category: 0 for category in self.lexicon}
+        if self.pattern is None:
+            return counts
+        
+        found = {" ".join(match.split()) for match in self.pattern.findall(text.lower())}
+        for keyword in found:
+            for category in self.categories_by_keyword[keyword]:
+                counts[category] += 1
+        return counts
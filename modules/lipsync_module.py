@@ -1,88 +1,131 @@
 import numpy as np
 import asyncio
-from collections import deque
+import time
+from config import settings
+from modules.expression_module import VISEMES
+from modules.g2p_module import PortugueseG2P, viseme_for
+
+# Índice de viseme por posição na trilha (-1 = boca em repouso)
+VISEME_ID = {viseme: index for index, viseme in enumerate(VISEMES)}
+SILENCE = -1
 
 class LipSync:
     def __init__(self, tts_module, avatar_controller):
         self.tts = tts_module
         self.avatar = avatar_controller
-        self.phoneme_map = {
-            'a': 'aa', 'e': 'ee', 'i': 'ih', 'o': 'oh', 'u': 'ou',
-            'b': 'aa', 'p': 'aa', 'm': 'aa', 'f': 'ee', 'v': 'ee',
-            's': 'ih', 'z': 'ih', 'ʃ': 'ih', 'ʒ': 'ih',
-            'd': 'oh', 't': 'oh', 'n': 'oh', 'l': 'oh',
-            'r': 'ou', 'k': 'ou', 'g': 'ou', 'h': 'ou',
-            'sil': 'neutral'
-        }
+        self.g2p = PortugueseG2P()
         
-        self.audio_buffer = deque()
-        self.phoneme_queue = deque()
+        # Trilha em reprodução e último valor aplicado à boca
+        self.track = None
+        self.track_start = 0.0
+        self.applied = (SILENCE, 0.0)
     
     async def synchronize(self, audio_data, text):
         """Sincroniza movimento labial com áudio"""
-        # Extrair fonemas do texto
-        phonemes = self.text_to_phonemes(text)
+        # Reaproveitar a linha do tempo guardada junto ao áudio em cache
+        key = self.tts.cache_key(text)
+        track = self.tts.cache.get_timeline(key)
+        if track is None:
+            track = self.build_timeline(audio_data, text)
+            self.tts.cache.put_timeline(key, track)
+        
+        # A trilha é amostrada pelo relógio de renderização; aqui só se espera o fim do áudio
+        self.track = track
+        self.track_start = time.monotonic() + settings.LIPSYNC_AUDIO_LATENCY
+        try:
+            await asyncio.sleep(settings.LIPSYNC_AUDIO_LATENCY + len(audio_data) / self.tts.sample_rate)
+        finally:
+            if self.track is track:
+                self.track = None
+    
+    def build_timeline(self, audio_data, text):
+        """Calcula a trilha de visemas e o envelope RMS do áudio de uma vez
         
-        # Calcular timing dos fonemas baseado no áudio
-        audio_length = len(audio_data) / self.tts.sample_rate
-        phoneme_count = len(phonemes)
+        Usa as durações de fonema do próprio Piper quando disponíveis; senão,
+        os fonemas do G2P são distribuídos pelos trechos com voz. A trilha é
+        devolvida como arrays: start, end, viseme, weight, envelope e hop.
+        """
+        hop = settings.LIPSYNC_ENVELOPE_HOP
+        envelope = self.rms_envelope(audio_data, int(self.tts.sample_rate * hop))
         
-        if phoneme_count > 0:
-            phoneme_duration = audio_length / phoneme_count
+        alignment = self.tts.alignment(text)
+        if alignment is not None:
+            phonemes, samples = alignment
+            times = np.concatenate(([0], np.cumsum(samples))) / self.tts.sample_rate
         else:
-            phoneme_duration = 0.1
+            phonemes = self.text_to_phonemes(text)
+            times = self._voiced_times(envelope, hop, len(phonemes))
+        
+        visemes = np.array([self.viseme_id(p) for p in phonemes], dtype=np.int16)
+        weight = np.where(visemes == SILENCE, 0.0, settings.LIPSYNC_VISEME_WEIGHT).astype(np.float32)
+        
+        return {
+            "start": times[:-1].astype(np.float32),
+            "end": times[1:].astype(np.float32),
+            "viseme": visemes,
+            "weight": weight,
+            "envelope": envelope,
+            "hop": np.float32(hop)
+        }
+    
+    @staticmethod
+    def viseme_id(phoneme):
+        """Índice em VISEMES do fonema (SILENCE para pausas e boca fechada)"""
+        return VISEME_ID.get(viseme_for(phoneme), SILENCE)
+    
+    @staticmethod
+    def _voiced_times(envelope, hop, count):
+        """Fronteiras de count fonemas como quantis do tempo com voz, em segundos"""
+        voiced = envelope > settings.LIPSYNC_VOICED_THRESHOLD
+        voiced_time = np.cumsum(voiced)
+        total = int(voiced_time[-1]) if len(voiced_time) else 0
+        if total > 0 and count:
+            bounds = np.linspace(0, total, count + 1)
+            return np.searchsorted(voiced_time, bounds, side="right") * hop
+        return np.linspace(0, len(envelope) * hop, count + 1)
+    
+    @staticmethod
+    def rms_envelope(audio_data, hop_samples):
+        """Envelope RMS normalizado (0 a 1) em janelas de hop_samples amostras"""
+        hop_samples = max(hop_samples, 1)
+        frames = -(-len(audio_data) // hop_samples)
+        if frames == 0:
+            return np.zeros(0, dtype=np.float32)
         
-        # Adicionar fonemas à fila com timing
-        current_time = 0
-        for phoneme in phonemes:
-            self.phoneme_queue.append({
-                'phoneme': phoneme,
-                'start_time': current_time,
-                'duration': phoneme_duration
-            })
-            current_time += phoneme_duration
+        samples = np.zeros(frames * hop_samples, dtype=np.float32)
+        samples[:len(audio_data)] = audio_data
+        samples /= 32768.0
+        envelope = np.sqrt(np.mean(np.square(samples.reshape(frames, hop_samples)), axis=1))
         
-        # Processar fila de fonemas
-        await self.process_phoneme_queue()
+        peak = envelope.max()
+        if peak > 0:
+            envelope /= peak
+        return envelope.astype(np.float32)
     
-    async def process_phoneme_queue(self):
-        """Processa a fila de fonemas em tempo real"""
-        start_time = asyncio.get_event_loop().time()
+    def update(self, now=None):
+        """Amostra a trilha atual; chamado uma vez por frame pelo relógio de renderização"""
+        track = self.track
+        viseme, opening = SILENCE, 0.0
         
-        while self.phoneme_queue:
-            current_phoneme = self.phoneme_queue[0]
-            elapsed_time = asyncio.get_event_loop().time() - start_time
-            
-            if elapsed_time >= current_phoneme['start_time']:
-                # Aplicar fonema atual
-                viseme = self.phoneme_map.get(current_phoneme['phoneme'], 'neutral')
-                await self.avatar.set_viseme(viseme, 0.7)
-                
-                # Remover fonema processado
-                self.phoneme_queue.popleft()
+        if track is not None:
+            elapsed = (now if now is not None else time.monotonic()) - self.track_start
+            index = int(np.searchsorted(track["start"], elapsed, side="right")) - 1
+            if 0 <= index < len(track["start"]) and elapsed < track["end"][index]:
+                frame = min(int(elapsed / track["hop"]), len(track["envelope"]) - 1)
+                level = float(track["envelope"][frame]) if frame >= 0 else 0.0
                 
-                # Agendar retorno ao neutro após duração do fonema
-                asyncio.create_task(
-                    self.reset_viseme_after_delay(
-                        current_phoneme['duration'] * 0.8
-                    )
-                )
-            
-            await asyncio.sleep(0.01)  # Controle de taxa de atualização
-    
-    async def reset_viseme_after_delay(self, delay):
-        """Retorna a boca ao estado neutro após um delay"""
-        await asyncio.sleep(delay)
-        await self.avatar.set_viseme('neutral', 0.3)
+                # A amplitude do áudio modula a abertura da boca
+                floor = settings.LIPSYNC_MIN_OPENING
+                viseme = int(track["viseme"][index])
+                opening = float(track["weight"][index]) * (floor + (1.0 - floor) * level)
+        
+        # Só reescrever a camada quando o viseme mudar ou a abertura variar o bastante
+        applied_viseme, applied_opening = self.applied
+        if viseme == applied_viseme and abs(opening - applied_opening) < 0.05:
+            return
+        self.applied = (viseme, opening)
+        self.avatar.set_mouth(viseme, opening)
     
     def text_to_phonemes(self, text):
-        """Converte texto para fonemas (simplificado)"""
-        # Implementação básica - pode ser substituída por um sistema mais avançado
-        phonemes = []
-        for char in text.lower():
-            if char in self.phoneme_map:
-                phonemes.append(char)
-            elif char == ' ':
-                phonemes.append('sil')
-        
-        return phonemes
\ No newline at end of file
+        """Converte texto para fonemas com o G2P de português"""
+        return self.g2p.phonemes(text)
@@ -1,47 +1,101 @@
 import json
-import numpy as np
+from collections import deque
 from datetime import datetime
-from pathlib import Path
+from config import settings
+from modules.journal_module import MemoryJournal
+from modules.embedding_module import SemanticMemory
 
 class MemorySystem:
-    def __init__(self):
+    def __init__(self, directory=None, embedder=None):
+        # Cada diretório é um espaço de memória independente (um por usuário no servidor)
+        directory = directory or settings.MEMORY_DIR
         self.short_term_memory = []
         self.long_term_memory = []
-        self.memory_file = Path("data/memory/memory.json")
+        self.memory_file = directory / "memory.jsonl"
+        self.legacy_memory_file = directory / "memory.json"
+        self.journal = MemoryJournal(self.memory_file)
+        self.semantic = SemanticMemory(directory / "semantic", embedder)
+        
+        # Sentimento calculado uma vez por interação e agregado numa janela deslizante
+        self.sentiment_analyzer = None
+        self.sentiment_window = deque(maxlen=settings.SENTIMENT_WINDOW)
+        self.sentiment_counts = {"positive": 0, "negative": 0, "neutral": 0}
         
     async def load(self):
         """Carrega memória de longo prazo do arquivo"""
-        if self.memory_file.exists():
-            with open(self.memory_file, 'r') as f:
-                self.long_term_memory = json.load(f)
+        await self.journal.start()
+        try:
+            await self._migrate_legacy_file()
+            await self.semantic.load()
+        except Exception:
+            # Não deixar o gravador do diário rodando se a carga falhar
+            await self.journal.close()
+            raise
+        
+        # Apenas a cauda do diário é carregada; o histórico completo fica em disco
+        self.long_term_memory = await self.journal.load_tail(settings.MEMORY_LOAD_TAIL)
+        
+        # Retomar a janela de sentimento a partir das interações mais recentes
+        for interaction in self.long_term_memory[-settings.SENTIMENT_WINDOW:]:
+            self._record_sentiment(interaction.get("sentiment", "neutral"))
         print("Memória carregada")
     
+    async def _migrate_legacy_file(self):
+        """Converte o memory.json antigo para o diário na primeira execução"""
+        if not self.legacy_memory_file.exists():
+            return
+        if self.memory_file.exists() and self.memory_file.stat().st_size > 0:
+            return
+        with open(self.legacy_memory_file, 'r') as f:
+            records = json.load(f)
+        await self.journal.import_records(records)
+        self.legacy_memory_file.rename(self.legacy_memory_file.with_suffix(".json.migrated"))
+    
     async def save(self):
-        """Salva memória de longo prazo no arquivo"""
-        self.memory_file.parent.mkdir(parents=True, exist_ok=True)
-        with open(self.memory_file, 'w') as f:
-            json.dump(self.long_term_memory, f, indent=2)
+        """Grava no arquivo as interações ainda pendentes"""
+        await self.journal.flush()
+    
+    async def close(self):
+        """Grava pendências e encerra o gravador em segundo plano"""
+        await self.journal.close()
+        await self.semantic.close()
     
     def add_interaction(self, input_text, response):
         """Adiciona uma interação à memória"""
         interaction = {
             "timestamp": datetime.now().isoformat(),
             "input": input_text,
-            "response": response
+            "response": response,
+            "sentiment": self.sentiment_analyzer(input_text) if self.sentiment_analyzer else "neutral"
         }
+        self._record_sentiment(interaction["sentiment"])
         
-        # Adicionar à memória de curto prazo
+        # Adicionar à memória de curto prazo e ao índice semântico
         self.short_term_memory.append(interaction)
+        self.semantic.add(interaction)
         
         # Se importante, adicionar à memória de longo prazo
         if self.is_important(interaction):
             self.long_term_memory.append(interaction)
-            asyncio.create_task(self.save())
+            self.journal.append(interaction)
+            if len(self.long_term_memory) > settings.MEMORY_LOAD_TAIL:
+                self.long_term_memory.pop(0)
         
         # Manter tamanho limitado da memória de curto prazo
         if len(self.short_term_memory) > 10:
             self.short_term_memory.pop(0)
     
+    def _record_sentiment(self, sentiment):
+        """Atualiza a janela deslizante de sentimento em O(1)"""
+        if len(self.sentiment_window) == self.sentiment_window.maxlen:
+            self.sentiment_counts[self.sentiment_window[0]] -= 1
+        self.sentiment_window.append(sentiment)
+        self.sentiment_counts[sentiment] += 1
+    
+    def get_sentiment_summary(self):
+        """Contagem de sentimentos nas interações recentes"""
+        return dict(self.sentiment_counts)
+    
     def is_important(self, interaction):
         """Determina se uma interação é importante o suficiente para memória longa"""
         # Implementar lógica para determinar importância
@@ -50,4 +104,11 @@ class MemorySystem:
     
     def get_context(self, limit=5):
         """Retorna contexto recente para o modelo"""
-        return self.short_term_memory[-limit:] if self.short_term_memory else []
\ No newline at end of file
+        return self.short_term_memory[-limit:] if self.short_term_memory else []
+    
+    async def retrieve(self, query, limit=None):
+        """Retorna as interações passadas mais relevantes que não estão no contexto recente"""
+        limit = limit or settings.MEMORY_RETRIEVAL_K
+        recent = {interaction["timestamp"] for interaction in self.short_term_memory}
+        results = await self.semantic.search(query, limit + len(recent))
+        return [r for r in results if r["timestamp"] not in recent][:limit]
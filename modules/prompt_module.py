@@ -0,0 +1,81 @@
+import math
+from functools import lru_cache
+from config import settings
+
+@lru_cache(maxsize=4096)
+def estimate_tokens(text):
+    """Estimativa local de tokens (sem chamada de rede), memorizada por segmento"""
+    return max(1, math.ceil(len(text) / settings.PROMPT_CHARS_PER_TOKEN))
+
+def truncate_to_tokens(text, max_tokens):
+    max_chars = max_tokens * settings.PROMPT_CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars - 1].rstrip() + "…"
+
+class PromptBuilder:
+    """Monta o prompt por segmentos respeitando um orçamento de tokens"""
+    def __init__(self, preamble=None, budget=None):
+        # O preâmbulo é fixo e vai como instrução de sistema (prefixo estável)
+        self.preamble = preamble or settings.SYSTEM_PREAMBLE
+        self.budget = budget or settings.PROMPT_TOKEN_BUDGET
+        self.last_usage = {}
+    
+    def build(self, text_input, context, vision_data, memories=None):
+        """Constrói o prompt variável: entrada e visão primeiro, depois contexto e memórias"""
+        usage = {"input": 0, "vision": 0, "context": 0, "memories": 0, "dropped_turns": 0}
+        
+        user_segment = f"\nUsuário: {truncate_to_tokens(text_input, self.budget // 2)}\nCompanion:"
+        usage["input"] = estimate_tokens(user_segment)
+        remaining = self.budget - usage["input"]
+        
+        vision_segment = ""
+        if vision_data and vision_data.get('faces'):
+            vision_segment = "Informações visuais:\n" + "".join(
+                f"- {face['name']} está visível\n" for face in vision_data['faces']
+            )
+            if estimate_tokens(vision_segment) <= remaining:
+                usage["vision"] = estimate_tokens(vision_segment)
+                remaining -= usage["vision"]
+            else:
+                vision_segment = ""
+        
+        # Contexto recente: do mais novo para o mais antigo até esgotar o orçamento
+        turns = []
+        for interaction in reversed(context or []):
+            turn = (f"Usuário: {truncate_to_tokens(interaction['input'], settings.PROMPT_MAX_TURN_TOKENS)}\n"
+                    f"Você: {truncate_to_tokens(interaction['response'], settings.PROMPT_MAX_TURN_TOKENS)}\n\n")
+            tokens = estimate_tokens(turn)
+            if tokens > remaining:
+                break
+            turns.append(turn)
+            usage["context"] += tokens
+            remaining -= tokens
+        usage["dropped_turns"] = len(context or []) - len(turns)
+        
+        # Memórias de longo prazo com o que sobrar
+        recalled = []
+        for interaction in memories or []:
+            line = (f"- Usuário: {truncate_to_tokens(interaction['input'], settings.PROMPT_MAX_TURN_TOKENS)}"
+                    f" / Você: {truncate_to_tokens(interaction['response'], settings.PROMPT_MAX_TURN_TOKENS)}\n")
+            tokens = estimate_tokens(line)
+            if tokens > remaining:
+                break
+            recalled.append(line)
+            usage["memories"] += tokens
+            remaining -= tokens
+        
+        prompt = ""
+        if recalled:
+            prompt += "Memórias relevantes de conversas anteriores:\n" + "".join(recalled) + "\n"
+        if turns:
+            prompt += "Contexto recente:\n"
+            if usage["dropped_turns"]:
+                prompt += f"({usage['dropped_turns']} interações anteriores omitidas)\n"
+            prompt += "".join(reversed(turns))
+        prompt += vision_segment
+        prompt += user_segment
+        
+        usage["total"] = self.budget - remaining
+        self.last_usage = usage
+        return prompt
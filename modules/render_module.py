@@ -0,0 +1,60 @@
+import asyncio
+import time
+from collections import deque
+from config import settings
+
+class RenderClock:
+    """Relógio de renderização em taxa fixa com estatísticas de tempo de frame"""
+    def __init__(self, fps=None, window=None):
+        self.fps = fps or settings.RENDER_FPS
+        self.frame_time = 1.0 / self.fps
+        window = window or settings.RENDER_STATS_WINDOW
+        self.work_times = deque(maxlen=window)
+        self.intervals = deque(maxlen=window)
+        self.frames = 0
+        self.overruns = 0
+        self.is_running = False
+    
+    async def run(self, render):
+        """Chama `render` a cada tick até stop(), sem acumular atraso"""
+        self.is_running = True
+        next_tick = time.monotonic()
+        last_start = None
+        
+        while self.is_running:
+            start = time.monotonic()
+            if last_start is not None:
+                self.intervals.append(start - last_start)
+            last_start = start
+            
+            await render()
+            self.work_times.append(time.monotonic() - start)
+            self.frames += 1
+            
+            next_tick += self.frame_time
+            delay = next_tick - time.monotonic()
+            if delay < 0:
+                # Frame atrasado: realinhar o relógio em vez de acumular atraso
+                self.overruns += 1
+                next_tick = time.monotonic()
+                delay = 0
+            await asyncio.sleep(delay)
+    
+    def stop(self):
+        self.is_running = False
+    
+    @staticmethod
+    def _percentile(values, fraction):
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+    
+    def get_stats(self):
+        """Taxa real e tempo de trabalho por frame (ms) na janela recente"""
+        stats = {"frames": self.frames, "target_fps": self.fps, "overruns": self.overruns}
+        if self.intervals:
+            stats["actual_fps"] = len(self.intervals) / sum(self.intervals)
+        if self.work_times:
+            stats["work_ms_mean"] = 1000 * sum(self.work_times) / len(self.work_times)
+            stats["work_ms_p95"] = 1000 * self._percentile(self.work_times, 0.95)
+            stats["work_ms_max"] = 1000 * max(self.work_times)
+        return stats
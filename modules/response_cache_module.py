@@ -0,0 +1,73 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from config import settings
+
+class ResponseCache:
+    """Cache TTL/LRU de respostas do Gemini com agrupamento de requisições idênticas"""
+    def __init__(self, max_entries=None, ttl=None):
+        self.max_entries = max_entries or settings.RESPONSE_CACHE_SIZE
+        self.ttl = ttl or settings.RESPONSE_CACHE_TTL
+        self.entries = OrderedDict()  # chave -> (expira_em, resposta)
+        self.inflight = {}  # chave -> Future da requisição em andamento
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0}
+    
+    @staticmethod
+    def make_key(text_input, context, vision_data):
+        """Entrada normalizada + impressão digital do contexto
+        
+        Falas curtas ("oi", "tudo bem?") só dependem de quem está visível; falas
+        longas também incluem o contexto recente, então só se repetem dentro da
+        mesma conversa (requisições duplicadas ou reenviadas).
+        """
+        normalized = " ".join(text_input.lower().split()).strip(" .!?")
+        faces = sorted(face['name'] for face in (vision_data or {}).get('faces', []))
+        parts = [normalized, ",".join(faces)]
+        if len(normalized.split()) > settings.RESPONSE_CACHE_MAX_WORDS:
+            parts.extend(f"{i['input']}\0{i['response']}" for i in context or [])
+        return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+    
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self.entries[key]
+            self.stats["misses"] += 1
+            return None
+        self.entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return entry[1]
+    
+    def put(self, key, response):
+        self.entries[key] = (time.monotonic() + self.ttl, response)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+    
+    def begin(self, key):
+        """Registra uma requisição em andamento; retorna None se outra já está ativa"""
+        if key in self.inflight:
+            return None
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        return future
+    
+    def finish(self, key, future, response=None, error=None):
+        """Conclui a requisição, liberando quem estava aguardando"""
+        self.inflight.pop(key, None)
+        if future.done():
+            return
+        if error is not None:
+            if not isinstance(error, Exception):
+                # Cancelamento do líder não deve cancelar quem está aguardando
+                error = RuntimeError("requisição interrompida")
+            future.set_exception(error)
+            future.exception()  # evita aviso de exceção não recuperada
+        else:
+            future.set_result(response)
+    
+    async def wait(self, key):
+        """Aguarda a resposta de uma requisição idêntica em andamento"""
+        self.stats["coalesced"] += 1
+        return await asyncio.shield(self.inflight[key])
@@ -0,0 +1,51 @@
+import re
+from config import settings
+
+class SentenceSegmenter:
+    """Corta texto recebido em partes em frases e orações para síntese incremental"""
+    # Pontuação seguida de espaço (a pontuação no fim do buffer ainda é ambígua)
+    BOUNDARY = re.compile(r'([.!?…]+|[,;:])["\'”)\]]*\s+')
+    ABBREVIATIONS = {"sr", "sra", "srta", "dr", "dra", "prof", "profa", "av", "ex", "p"}
+    
+    def __init__(self, min_clause_chars=None, max_chars=None):
+        self.min_clause_chars = min_clause_chars or settings.SEGMENT_MIN_CLAUSE_CHARS
+        self.max_chars = max_chars or settings.SEGMENT_MAX_CHARS
+        self.buffer = ""
+    
+    def feed(self, chunk):
+        """Adiciona texto e retorna as frases completas encontradas"""
+        self.buffer += chunk
+        sentences = []
+        start = 0
+        
+        for match in self.BOUNDARY.finditer(self.buffer):
+            candidate = self.buffer[start:match.end()].strip()
+            strong = match.group(1)[0] in ".!?…"
+            
+            if strong and self._ends_with_abbreviation(candidate):
+                continue
+            # Vírgulas e afins só cortam se a oração já for longa o suficiente
+            if strong or len(candidate) >= self.min_clause_chars:
+                sentences.append(candidate)
+                start = match.end()
+        
+        self.buffer = self.buffer[start:]
+        
+        # Forçar corte no último espaço se não houver pontuação por muito tempo
+        if len(self.buffer) > self.max_chars:
+            cut = self.buffer.rfind(" ", 0, self.max_chars)
+            if cut > 0:
+                sentences.append(self.buffer[:cut].strip())
+                self.buffer = self.buffer[cut + 1:]
+        
+        return sentences
+    
+    def flush(self):
+        """Retorna o texto restante ao fim da resposta"""
+        remaining = self.buffer.strip()
+        self.buffer = ""
+        return remaining
+    
+    def _ends_with_abbreviation(self, candidate):
+        words = candidate.rstrip(".").split()
+        return bool(words) and words[-1].lower() in self.ABBREVIATIONS
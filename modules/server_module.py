@@ -0,0 +1,403 @@
+import asyncio
+import json
+import re
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+import numpy as np
+from aiohttp import web, WSMsgType
+from config import settings
+from main import VirtualCompanion
+from modules.startup_module import ModuleRegistry
+from modules.batching_module import BatchScheduler, PRIORITY_INTERACTIVE, PRIORITY_NORMAL
+from modules.memory_module import MemorySystem
+from modules.embedding_module import make_embedder, load_embedder
+
+# Primeiro byte das mensagens binárias
+AUDIO_FRAME = 1  # PCM int16 mono (entrada em STT_SAMPLE_RATE, saída na taxa do TTS)
+VIDEO_FRAME = 2  # imagem JPEG/PNG
+USER_ID = re.compile(r"[^A-Za-z0-9_-]")
+
+class SharedSpeechModel:
+    """Modelo Vosk carregado uma vez; cada sessão cria o próprio reconhecedor
+
+    Sem streaming, as falas completas de todas as sessões são reconhecidas
+    em micro-lotes num pool de threads compartilhado.
+    """
+    def __init__(self):
+        self.model = None
+        self.executor = None
+        self.batcher = None
+
+    async def load(self):
+        batching = settings.BATCHING_ENABLED and not settings.STT_STREAMING
+        if settings.STT_STREAMING or batching:
+            from vosk import Model
+            self.model = await asyncio.to_thread(Model, str(settings.STT_MODEL_PATH))
+        if batching:
+            from modules.stt_module import recognize_segments
+            self.executor = ThreadPoolExecutor(
+                max_workers=settings.STT_BATCH_WORKERS, thread_name_prefix="stt"
+            )
+            self.batcher = BatchScheduler(
+                "stt", partial(recognize_segments, self.model, settings.STT_SAMPLE_RATE), self.executor,
+                max_batch=settings.STT_BATCH_SIZE, window=settings.STT_BATCH_WINDOW,
+                workers=settings.STT_BATCH_WORKERS
+            )
+
+    async def close(self):
+        if self.batcher:
+            await self.batcher.stop()
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+class SharedFaces:
+    """Galeria de rostos conhecidos e pool de detecção compartilhados pelas sessões"""
+    def __init__(self):
+        self.index = None
+        self.executor = None
+        self.batchers = None
+
+    async def load(self):
+        from modules.face_index_module import FaceIndex
+        from modules.face_store_module import FaceEncodingStore
+        from modules.vision_module import FaceBatchers
+        names, encodings = await FaceEncodingStore().load()
+        self.index = FaceIndex()
+        self.index.add_many(names, encodings)
+        self.executor = ProcessPoolExecutor(max_workers=settings.SERVER_VISION_WORKERS)
+        if settings.BATCHING_ENABLED:
+            self.batchers = FaceBatchers(self.executor, settings.SERVER_VISION_WORKERS)
+
+    async def close(self):
+        if self.batchers:
+            await self.batchers.stop()
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+class SharedEmbedder:
+    """Modelo de embedding da memória semântica, um para todas as sessões"""
+    def __init__(self):
+        self.embedder = make_embedder()
+
+    async def load(self):
+        self.embedder = await asyncio.to_thread(load_embedder, self.embedder)
+
+class SessionSpeech:
+    """TTS de uma sessão: síntese no modelo compartilhado, reprodução enviada ao cliente"""
+    def __init__(self, tts, send_audio, priority):
+        self.tts = tts
+        self.send_audio = send_audio
+        self.priority = priority  # prioridade no lote compartilhado, decidida pela sessão
+
+    @property
+    def sample_rate(self):
+        return self.tts.sample_rate
+
+    @property
+    def cache(self):
+        return self.tts.cache
+
+    def cache_key(self, text):
+        return self.tts.cache_key(text)
+
+    def alignment(self, text):
+        return self.tts.alignment(text)
+
+    async def synthesize(self, text):
+        return await self.tts.synthesize(text, self.priority())
+
+    async def play(self, audio_data):
+        await self.send_audio(audio_data)
+
+    def stop(self):
+        pass
+
+class CompanionSession(VirtualCompanion):
+    """Um companion por conexão: memória própria, modelos pesados do servidor"""
+    def __init__(self, server, user, ws):
+        super().__init__()
+        self.server = server
+        self.user = user
+        self.session_id = uuid.uuid4().hex[:12]
+        self.ws = ws
+        self.send_lock = asyncio.Lock()
+
+        # Vídeo decodificado em segundo plano: só o frame mais recente fica na vaga
+        self.pending_frame = None  # (bytes, instante de chegada)
+        self.frame_arrived = asyncio.Event()
+        self.decoder_task = None
+
+    async def initialize(self):
+        """Monta os módulos da sessão sobre os modelos compartilhados"""
+        self.started_at = time.perf_counter()
+        shared = self.server.registry.modules
+        self.modules = self.registry.modules
+
+        embedder = shared['embedder'].embedder if 'embedder' in shared else None
+        memory = MemorySystem(settings.SERVER_USERS_DIR / self.user, embedder)
+        await memory.load()
+        self.modules['memory'] = memory
+        self.modules['gemini'] = shared['gemini'].for_memory(memory)
+        if 'tts' in shared:
+            self.modules['tts'] = SessionSpeech(shared['tts'], self.send_audio, self._speech_priority)
+
+        # Módulos opcionais: uma falha deixa a sessão em modo degradado
+        await self._optional('stt', self._create_stt)
+        await self._optional('vision', self._create_vision)
+        await self._optional('avatar', self._create_avatar)
+        if self.registry.available('avatar'):
+            from modules.emotion_module import EmotionEngine
+            from modules.gesture_module import GestureController
+            from modules.lipsync_module import LipSync
+            self.modules['emotion'] = EmotionEngine(memory, self.modules['avatar'])
+            self.modules['gesture'] = GestureController(self.modules['avatar'])
+            if 'tts' in self.modules:
+                self.modules['lipsync'] = LipSync(self.modules['tts'], self.modules['avatar'])
+
+    def _speech_priority(self):
+        """Interativa quando não há áudio pronto para tocar em seguida (o usuário esperaria)"""
+        return PRIORITY_INTERACTIVE if self.audio_queue.empty() else PRIORITY_NORMAL
+
+    async def _optional(self, name, create):
+        try:
+            self.modules[name] = await create()
+        except Exception as e:
+            self.registry.errors[name] = e
+            print(f"Sessão {self.session_id}: módulo {name} indisponível: {e!r}")
+
+    async def _create_stt(self):
+        from modules.stt_module import SpeechToText
+        shared = self.server.registry.modules
+        speech = shared.get('speech')
+        stt = SpeechToText(
+            microphone=False,
+            vosk_model=speech.model if speech else None,
+            batcher=speech.batcher if speech else None
+        )
+        await stt.load_model()
+        return stt
+
+    async def _create_vision(self):
+        from modules.vision_module import VisionProcessor
+        faces = self.server.registry.modules['faces']
+        vision = VisionProcessor(
+            camera=False, face_index=faces.index, executor=faces.executor, batchers=faces.batchers
+        )
+        await vision.load_models()
+        return vision
+
+    async def _create_avatar(self):
+        # Sem modelo VRM: o cliente renderiza a partir dos parâmetros enviados
+        from modules.avatar_module import AvatarController
+        return AvatarController()
+
+    async def send_json(self, message):
+        async with self.send_lock:
+            if not self.ws.closed:
+                await self.ws.send_str(json.dumps(message))
+
+    async def send_audio(self, audio_data):
+        payload = bytes([AUDIO_FRAME]) + np.ascontiguousarray(audio_data, dtype=np.int16).tobytes()
+        async with self.send_lock:
+            if not self.ws.closed:
+                await self.ws.send_bytes(payload)
+
+    async def _hand_off(self, sentence, index, turn):
+        await self.send_json({"type": "reply", "text": sentence, "turn": turn['id']})
+        await super()._hand_off(sentence, index, turn)
+
+    async def _render_frame(self):
+        """Renderiza e envia ao cliente só os parâmetros do avatar que mudaram"""
+        await super()._render_frame()
+        changes = self.modules['avatar'].last_changes
+        if changes["shapes"] or changes["parameters"]:
+            await self.send_json({"type": "avatar", **changes})
+
+    def receive(self, data):
+        """Trata uma mensagem binária do cliente sem bloquear a leitura do socket"""
+        if not data:
+            return
+        kind = data[0]
+        if kind == AUDIO_FRAME and 'stt' in self.modules:
+            samples = np.frombuffer(data, dtype=np.int16, count=(len(data) - 1) // 2, offset=1)
+            self.modules['stt'].feed(samples)
+        elif kind == VIDEO_FRAME and 'vision' in self.modules:
+            # Sobrescreve o frame ainda não decodificado: os que chegam durante a
+            # decodificação são descartados e o áudio nunca espera pelo vídeo
+            self.pending_frame = (data, time.monotonic())
+            self.frame_arrived.set()
+            if self.decoder_task is None:
+                self.decoder_task = asyncio.create_task(self._decode_loop())
+
+    async def _decode_loop(self):
+        """Decodifica o frame mais recente numa thread e o entrega à visão"""
+        while True:
+            await self.frame_arrived.wait()
+            self.frame_arrived.clear()
+            pending, self.pending_frame = self.pending_frame, None
+            if pending is None:
+                continue
+            data, received_at = pending
+            try:
+                frame = await asyncio.to_thread(self._decode_frame, data)
+            except Exception as e:
+                print(f"Sessão {self.session_id}: frame inválido: {e!r}")
+                continue
+            if frame is not None:
+                self.modules['vision'].submit_frame(frame, received_at)
+
+    async def stop(self):
+        if self.decoder_task:
+            self.decoder_task.cancel()
+            await asyncio.gather(self.decoder_task, return_exceptions=True)
+            self.decoder_task = None
+        await super().stop()
+
+    @staticmethod
+    def _decode_frame(data):
+        import cv2
+        return cv2.imdecode(np.frombuffer(data, dtype=np.uint8, offset=1), cv2.IMREAD_COLOR)
+
+class CompanionServer:
+    """Servidor WebSocket com várias sessões de companion num só processo
+
+    Os modelos pesados (voz do Piper, modelo Vosk, galeria de rostos,
+    embedding e Gemini) são carregados uma vez e compartilhados. A admissão
+    limita sessões simultâneas, inicializações em paralelo e um usuário por
+    conexão (a memória de cada usuário fica em SERVER_USERS_DIR/<usuário>).
+    """
+    def __init__(self):
+        self.registry = ModuleRegistry()
+        self.sessions = {}
+        self.users = set()
+        self.startup_slots = asyncio.Semaphore(settings.SERVER_MAX_STARTING)
+        self.runner = None
+
+    async def start(self, host, port):
+        register = self.registry.register
+        register('speech', "modules.server_module:SharedSpeechModel", loader="load")
+        register('tts', "modules.tts_module:TextToSpeech", loader="load_model", loader_args=[False])
+        register('faces', "modules.server_module:SharedFaces", loader="load")
+        register('embedder', "modules.server_module:SharedEmbedder", loader="load", required=True)
+        register('gemini', "modules.gemini_module:GeminiBrain", loader="initialize", required=True)
+        await self.registry.start()
+        if settings.BATCHING_ENABLED and 'tts' in self.registry.modules:
+            self.registry.modules['tts'].enable_batching()
+
+        app = web.Application()
+        app.router.add_get("/ws", self.handle_session)
+        app.router.add_get("/health", self.handle_health)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+        print(f"Servidor de companions em ws://{host}:{port}/ws")
+
+    async def stop(self):
+        for session in list(self.sessions.values()):
+            await session.ws.close(code=1001, message=b"servidor encerrando")
+        if self.runner:
+            await self.runner.cleanup()
+        shared = self.registry.modules
+        if 'tts' in shared:
+            if shared['tts'].batcher:
+                await shared['tts'].batcher.stop()
+            shared['tts'].stop()
+        for name in ('speech', 'faces'):
+            if name in shared:
+                await shared[name].close()
+
+    def _admit(self, user):
+        """Motivo da recusa (status, mensagem) ou None se a sessão pode entrar"""
+        if len(self.users) >= settings.SERVER_MAX_SESSIONS:
+            return 503, "capacidade esgotada"
+        if user in self.users:
+            return 409, "usuário já conectado"
+        return None
+
+    async def handle_session(self, request):
+        user = USER_ID.sub("", request.query.get("user", ""))[:64] or uuid.uuid4().hex
+        refusal = self._admit(user)
+        if refusal:
+            status, reason = refusal
+            return web.json_response(
+                {"error": reason}, status=status, headers={"Retry-After": str(settings.SERVER_RETRY_AFTER)}
+            )
+        self.users.add(user)
+
+        ws = web.WebSocketResponse(
+            heartbeat=settings.SERVER_HEARTBEAT, max_msg_size=settings.SERVER_MAX_MESSAGE_BYTES
+        )
+        session = CompanionSession(self, user, ws)
+        runner = None
+        try:
+            await ws.prepare(request)
+            async with self.startup_slots:
+                await session.initialize()
+            self.sessions[session.session_id] = session
+
+            await session.send_json({
+                "type": "ready",
+                "session": session.session_id,
+                "user": user,
+                "input_audio": {"sample_rate": settings.STT_SAMPLE_RATE, "format": "s16le"},
+                "output_audio": {
+                    "sample_rate": session.modules['tts'].sample_rate if 'tts' in session.modules else None,
+                    "format": "s16le"
+                },
+                "degraded": sorted(session.registry.errors)
+            })
+            runner = asyncio.create_task(session.run())
+
+            async for message in ws:
+                if message.type == WSMsgType.BINARY:
+                    session.receive(message.data)
+                elif message.type == WSMsgType.ERROR:
+                    break
+        except Exception as e:
+            print(f"Sessão {session.session_id} encerrada por erro: {e!r}")
+        finally:
+            # run() encerra a sessão ao ser cancelado; sem ele, encerrar diretamente
+            if runner is not None:
+                runner.cancel()
+                await asyncio.gather(runner, return_exceptions=True)
+            else:
+                await session.stop()
+            self.sessions.pop(session.session_id, None)
+            self.users.discard(user)
+            if not ws.closed:
+                await ws.close()
+        return ws
+
+    async def handle_health(self, request):
+        return web.json_response({
+            "sessions": len(self.sessions),
+            "max_sessions": settings.SERVER_MAX_SESSIONS,
+            "shared_models": sorted(self.registry.modules),
+            "unavailable": sorted(self.registry.errors),
+            "batching": self._batching_stats()
+        })
+
+    def _batching_stats(self):
+        shared = self.registry.modules
+        stats = {}
+        if 'tts' in shared and shared['tts'].batcher:
+            stats["tts"] = shared['tts'].batcher.get_stats()
+        if 'speech' in shared and shared['speech'].batcher:
+            stats["stt"] = shared['speech'].batcher.get_stats()
+        if 'faces' in shared and shared['faces'].batchers:
+            stats.update(shared['faces'].batchers.get_stats())
+        return stats
+
+async def serve(host=None, port=None):
+    """Executa o servidor até ser interrompido"""
+    server = CompanionServer()
+    await server.start(host or settings.SERVER_HOST, port or settings.SERVER_PORT)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+if __name__ == "__main__":
+    asyncio.run(serve())
@@ -0,0 +1,131 @@
+import asyncio
+import importlib
+import time
+from config import settings
+
+class ModuleSpec:
+    """Declaração de um módulo: classe (importada só na inicialização), dependências e carregador"""
+    def __init__(self, name, target, deps=(), loader=None, loader_args=(), required=False):
+        self.name = name
+        self.target = target  # "pacote.modulo:Classe"
+        self.deps = tuple(deps)
+        self.loader = loader
+        self.loader_args = tuple(loader_args)
+        self.required = required
+
+class ModuleRegistry:
+    """Inicializa módulos em paralelo respeitando dependências, isolando falhas
+
+    Cada módulo importa sua classe numa thread (as dependências pesadas só são
+    carregadas aqui), é construído assim que as instâncias das dependências
+    existem e executa o carregador em paralelo com os demais. Um módulo que
+    falha, ou cuja dependência falhou, fica de fora; os outros seguem em modo
+    degradado. Só falhas em módulos obrigatórios interrompem a inicialização.
+    """
+    def __init__(self):
+        self.specs = {}
+        self.modules = {}
+        self.errors = {}
+        self.timings = {}
+        self.started_at = None
+        self.finished_at = None
+
+    def register(self, name, target, deps=(), loader=None, loader_args=(), required=False):
+        self.specs[name] = ModuleSpec(name, target, deps, loader, loader_args, required)
+
+    async def start(self, timeout=None):
+        """Carrega todos os módulos registrados e devolve {nome: instância} dos disponíveis"""
+        timeout = timeout or settings.STARTUP_LOAD_TIMEOUT
+        for spec in self.specs.values():
+            for dep in spec.deps:
+                if dep not in self.specs:
+                    raise ValueError(f"Módulo {spec.name} depende de {dep}, que não foi registrado")
+
+        loop = asyncio.get_running_loop()
+        # Sinais por módulo: instância construída e módulo pronto (True/False, nunca exceção)
+        self.constructed = {name: loop.create_future() for name in self.specs}
+        self.ready = {name: loop.create_future() for name in self.specs}
+
+        self.started_at = time.perf_counter()
+        await asyncio.gather(*(self._start_module(spec, timeout) for spec in self.specs.values()))
+        self.finished_at = time.perf_counter()
+
+        self.report()
+        failed = [name for name in self.errors if self.specs[name].required]
+        if failed:
+            raise RuntimeError(f"Módulos obrigatórios indisponíveis: {', '.join(failed)}")
+        return self.modules
+
+    async def _start_module(self, spec, timeout):
+        timing = self.timings.setdefault(spec.name, {})
+        try:
+            cls = await self._timed(timing, "import", asyncio.to_thread(self._resolve, spec.target))
+
+            # Construção assim que as instâncias das dependências existirem
+            for dep in spec.deps:
+                if not await self.constructed[dep]:
+                    raise RuntimeError(f"dependência {dep} indisponível")
+            instance = cls(*(self.modules[dep] for dep in spec.deps))
+            self.modules[spec.name] = instance
+            self.constructed[spec.name].set_result(True)
+
+            if spec.loader:
+                load = getattr(instance, spec.loader)(*spec.loader_args)
+                await self._timed(timing, "load", asyncio.wait_for(load, timeout))
+
+            # Só fica pronto quando as dependências também terminaram de carregar
+            for dep in spec.deps:
+                if not await self.ready[dep]:
+                    raise RuntimeError(f"dependência {dep} indisponível")
+            self.ready[spec.name].set_result(True)
+        except Exception as e:
+            instance = self.modules.pop(spec.name, None)
+            self.errors[spec.name] = e
+            if instance is not None:
+                # O carregador pode ter iniciado threads ou tarefas antes de falhar
+                await self._shutdown(spec.name, instance)
+            for future in (self.constructed[spec.name], self.ready[spec.name]):
+                if not future.done():
+                    future.set_result(False)
+            print(f"Módulo {spec.name} indisponível: {e!r}")
+        finally:
+            timing["ready_at"] = time.perf_counter() - self.started_at
+
+    @staticmethod
+    async def _shutdown(name, instance):
+        """Encerra um módulo descartado chamando seu stop() ou close(), se houver"""
+        for method in ("stop", "close"):
+            if hasattr(instance, method):
+                try:
+                    result = getattr(instance, method)()
+                    if asyncio.iscoroutine(result):
+                        await result
+                except Exception as e:
+                    print(f"Erro ao encerrar o módulo {name}: {e!r}")
+                return
+
+    @staticmethod
+    async def _timed(timing, phase, awaitable):
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            timing[phase] = time.perf_counter() - start
+
+    @staticmethod
+    def _resolve(target):
+        module_name, _, attribute = target.partition(":")
+        return getattr(importlib.import_module(module_name), attribute)
+
+    def available(self, *names):
+        return all(name in self.modules for name in names)
+
+    def report(self):
+        """Imprime o tempo de importação, carregamento e prontidão de cada módulo"""
+        print(f"Inicialização em {self.finished_at - self.started_at:.2f}s")
+        for name, timing in sorted(self.timings.items(), key=lambda item: item[1].get("ready_at", 0.0)):
+            status = "ok" if name in self.modules else "FALHOU"
+            print(
+                f"  {name:<10} {status:<7} importação {timing.get('import', 0.0):6.2f}s  "
+                f"carga {timing.get('load', 0.0):6.2f}s  pronto em {timing.get('ready_at', 0.0):6.2f}s"
+            )
@@ -1,33 +1,290 @@
 import speech_recognition as sr
 import numpy as np
 import asyncio
+import json
+import threading
+import time
+from collections import deque
+import pyaudio
+from vosk import Model, KaldiRecognizer
+from config import settings
+from modules.audio_module import AudioRingBuffer
+from modules.batching_module import PRIORITY_INTERACTIVE
+
+def recognize_segments(model, sample_rate, segments):
+    """Reconhece várias falas completas com o mesmo modelo Vosk (um lote do agendador)"""
+    texts = []
+    for samples in segments:
+        recognizer = KaldiRecognizer(model, sample_rate)
+        recognizer.AcceptWaveform(samples.tobytes())
+        texts.append(json.loads(recognizer.FinalResult()).get("text", "").strip())
+    return texts
 
 class SpeechToText:
-    def __init__(self):
+    def __init__(self, microphone=True, vosk_model=None, batcher=None):
         self.recognizer = sr.Recognizer()
-        self.microphone = sr.Microphone()
+        self.sample_rate = settings.STT_SAMPLE_RATE
+        self.chunk_size = settings.CHUNK_SIZE
+        # Sem microfone o áudio chega por feed() (ex.: de uma conexão no servidor)
+        self.microphone = (
+            sr.Microphone(sample_rate=self.sample_rate, chunk_size=self.chunk_size) if microphone else None
+        )
         self.is_listening = False
+        self.streaming = settings.STT_STREAMING
+        self.vosk_model = vosk_model  # pode ser compartilhado entre instâncias
+        self.batcher = batcher  # BatchScheduler de recognize_segments (STT sem streaming)
+        
+        # Captura contínua: thread dedicada -> buffer circular -> segmentação
+        self.ring_buffer = AudioRingBuffer(self.sample_rate * settings.STT_RING_SECONDS)
+        self.capture_thread = None
+        self.stream_thread = None
+        self.audio_available = threading.Event()
+        self.audio_ready = asyncio.Event()
+        self.segments = asyncio.Queue()
+        self.events = asyncio.Queue(maxsize=16)
+        self.tasks = []
+        self.loop = None
         
     async def load_model(self):
         """Carrega o modelo de STT local"""
-        # Ajustar para ruído ambiente
+        # Ajustar para ruído ambiente (fora do loop de eventos)
+        if self.microphone:
+            await asyncio.to_thread(self._calibrate)
+        if self.streaming and self.vosk_model is None:
+            self.vosk_model = await asyncio.to_thread(Model, str(settings.STT_MODEL_PATH))
+        await self.start()
+        print("Modelo STT carregado")
+    
+    def _calibrate(self):
         with self.microphone as source:
             self.recognizer.adjust_for_ambient_noise(source)
-        print("Modelo STT carregado")
     
-    async def listen(self):
-        """Escuta e transcreve áudio"""
+    async def start(self):
+        """Inicia a captura contínua e o reconhecimento em segundo plano"""
+        if self.is_listening:
+            return
+        self.loop = asyncio.get_running_loop()
+        self.is_listening = True
+        
+        if self.microphone:
+            self.capture_thread = threading.Thread(
+                target=self._capture_loop, name="stt-capture", daemon=True
+            )
+            self.capture_thread.start()
+        
+        if self.streaming:
+            self.stream_thread = threading.Thread(
+                target=self._stream_loop, name="stt-stream", daemon=True
+            )
+            self.stream_thread.start()
+        else:
+            self.tasks = [
+                asyncio.create_task(self._segment_loop()),
+                asyncio.create_task(self._recognition_loop())
+            ]
+    
+    async def stop(self):
+        """Interrompe a captura e o reconhecimento"""
+        self.is_listening = False
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        for thread in (self.capture_thread, self.stream_thread):
+            if thread:
+                await asyncio.to_thread(thread.join)
+        self.capture_thread = None
+        self.stream_thread = None
+    
+    def _capture_loop(self):
+        """Thread de captura: lê frames do PyAudio para o buffer circular"""
+        audio = pyaudio.PyAudio()
+        stream = audio.open(
+            format=pyaudio.paInt16,
+            channels=1,
+            rate=self.sample_rate,
+            input=True,
+            frames_per_buffer=self.chunk_size
+        )
         try:
-            with self.microphone as source:
-                print("Ouvindo...")
-                audio = self.recognizer.listen(source, timeout=1, phrase_time_limit=5)
-            
-            # Usar recognizer offline (precisa de modelo treinado)
-            text = self.recognizer.recognize_vosk(audio)
-            print(f"Texto reconhecido: {text}")
-            return text
-        except sr.WaitTimeoutError:
-            return None
+            while self.is_listening:
+                data = stream.read(self.chunk_size, exception_on_overflow=False)
+                self.ring_buffer.write(np.frombuffer(data, dtype=np.int16))
+                if self.streaming:
+                    self.audio_available.set()
+                else:
+                    self.loop.call_soon_threadsafe(self.audio_ready.set)
         except Exception as e:
-            print(f"Erro no STT: {e}")
-            return None
\ No newline at end of file
+            print(f"Erro na captura de áudio: {e}")
+        finally:
+            stream.stop_stream()
+            stream.close()
+            audio.terminate()
+    
+    def feed(self, samples):
+        """Entrega áudio int16 recebido de fora (chamado no loop de eventos)"""
+        self.ring_buffer.write(samples)
+        if self.streaming:
+            self.audio_available.set()
+        else:
+            self.audio_ready.set()
+    
+    def _stream_loop(self):
+        """Thread de reconhecimento incremental: alimenta o Vosk bloco a bloco"""
+        recognizer = KaldiRecognizer(self.vosk_model, self.sample_rate)
+        last_partial = ""
+        partial_since = 0.0
+        stable_sent = False
+        
+        while self.is_listening:
+            if not self.audio_available.wait(timeout=0.1):
+                continue
+            self.audio_available.clear()
+            
+            while self.ring_buffer.available >= self.chunk_size:
+                chunk = self.ring_buffer.read(self.chunk_size)
+                now = time.monotonic()
+                
+                # AcceptWaveform retorna True quando o Vosk detecta o fim da fala
+                if recognizer.AcceptWaveform(chunk.tobytes()):
+                    text = json.loads(recognizer.Result()).get("text", "").strip()
+                    last_partial = ""
+                    if text:
+                        print(f"Texto reconhecido: {text}")
+                        self._emit({
+                            "text": text,
+                            "final": True,
+                            "stable": True,
+                            "end_of_speech": now,
+                            "timestamp": now
+                        })
+                    continue
+                
+                partial = json.loads(recognizer.PartialResult()).get("partial", "").strip()
+                if not partial:
+                    continue
+                
+                if partial != last_partial:
+                    last_partial = partial
+                    partial_since = now
+                    stable_sent = False
+                    self._emit({"text": partial, "final": False, "stable": False, "timestamp": now})
+                elif not stable_sent and now - partial_since >= settings.STT_STABLE_PARTIAL_TIME:
+                    stable_sent = True
+                    self._emit({"text": partial, "final": False, "stable": True, "timestamp": now})
+    
+    def _emit(self, event):
+        """Entrega um evento da thread de reconhecimento ao loop de eventos"""
+        self.loop.call_soon_threadsafe(self._publish, event)
+    
+    async def _segment_loop(self):
+        """Separa falas do fluxo de áudio usando um limiar de energia"""
+        chunk_duration = self.chunk_size / self.sample_rate
+        preroll = deque(maxlen=max(1, int(settings.STT_PREROLL_SECONDS / chunk_duration)))
+        utterance = []
+        speech_duration = 0.0
+        silence_duration = 0.0
+        
+        while self.is_listening:
+            await self.audio_ready.wait()
+            self.audio_ready.clear()
+            
+            while self.ring_buffer.available >= self.chunk_size:
+                chunk = self.ring_buffer.read(self.chunk_size)
+                is_speech = self._rms(chunk) > self.recognizer.energy_threshold
+                
+                if not utterance:
+                    if is_speech:
+                        utterance = list(preroll)
+                        preroll.clear()
+                    else:
+                        preroll.append(chunk)
+                        continue
+                
+                utterance.append(chunk)
+                if is_speech:
+                    speech_duration += chunk_duration
+                    silence_duration = 0.0
+                else:
+                    silence_duration += chunk_duration
+                
+                total_duration = len(utterance) * chunk_duration
+                if (silence_duration >= settings.STT_SILENCE_DURATION
+                        or total_duration >= settings.STT_PHRASE_TIME_LIMIT):
+                    if speech_duration >= settings.STT_MIN_SPEECH_DURATION:
+                        self.segments.put_nowait({
+                            "audio": np.concatenate(utterance),
+                            "end_of_speech": time.monotonic() - silence_duration
+                        })
+                    utterance = []
+                    speech_duration = 0.0
+                    silence_duration = 0.0
+    
+    @staticmethod
+    def _rms(chunk):
+        """Energia RMS de um bloco int16 (mesma escala do energy_threshold)"""
+        samples = chunk.astype(np.float32)
+        return float(np.sqrt(np.mean(samples * samples)))
+    
+    async def _recognition_loop(self):
+        """Reconhece falas segmentadas em um executor, na ordem de chegada"""
+        while self.is_listening:
+            segment = await self.segments.get()
+            try:
+                if self.batcher:
+                    # Quem falou está esperando: o lote sai antes dos pedidos de fundo
+                    text = await self.batcher.submit(segment["audio"], PRIORITY_INTERACTIVE)
+                else:
+                    text = await self.loop.run_in_executor(
+                        None, self._recognize, segment["audio"]
+                    )
+            except Exception as e:
+                print(f"Erro no STT: {e}")
+                continue
+            
+            if text:
+                print(f"Texto reconhecido: {text}")
+                self._publish({
+                    "text": text,
+                    "final": True,
+                    "stable": True,
+                    "end_of_speech": segment["end_of_speech"],
+                    "timestamp": time.monotonic()
+                })
+    
+    def _recognize(self, samples):
+        # Usar recognizer offline (precisa de modelo treinado)
+        audio = sr.AudioData(samples.tobytes(), self.sample_rate, 2)
+        result = self.recognizer.recognize_vosk(audio)
+        return json.loads(result).get("text", "").strip()
+    
+    def _publish(self, event):
+        """Publica um evento de transcrição; com a fila cheia, descarta parciais antes de finais"""
+        if self.events.full():
+            pending = [self.events.get_nowait() for _ in range(self.events.qsize())]
+            # O parcial mais antigo sai primeiro; sem parciais na fila, o novo parcial é que sobra
+            index = next((i for i, queued in enumerate(pending) if not queued["final"]), None)
+            if index is not None:
+                del pending[index]
+            elif not event["final"]:
+                event = None
+            else:
+                # Só finais pendentes: o consumidor está parado há várias falas
+                print(f"Transcrição descartada: {pending.pop(0)['text']}")
+            for queued in pending:
+                self.events.put_nowait(queued)
+            if event is None:
+                return
+        self.events.put_nowait(event)
+    
+    async def transcripts(self):
+        """Iterador assíncrono de eventos de transcrição"""
+        while self.is_listening:
+            yield await self.events.get()
+    
+    async def listen(self):
+        """Aguarda a próxima transcrição final"""
+        async for event in self.transcripts():
+            if event["final"]:
+                return event["text"]
+        return None
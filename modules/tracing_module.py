@@ -0,0 +1,175 @@
+import asyncio
+import itertools
+import json
+import threading
+import time
+from collections import deque
+import numpy as np
+from config import settings
+
+class _NullSpan:
+    """Span vazio devolvido quando o rastreamento está desligado"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+NULL_SPAN = _NullSpan()
+
+class Span:
+    """Intervalo medido com relógio monotônico; registrado ao sair do bloco"""
+    __slots__ = ("tracer", "name", "category", "args", "start")
+
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer.record(self.name, self.start, time.monotonic(), self.category, **self.args)
+        return False
+
+    def set(self, **args):
+        """Acrescenta atributos ao span (ex.: tamanho do resultado)"""
+        self.args.update(args)
+
+class Tracer:
+    """Spans por turno e por estágio, histogramas de latência e exportação Chrome trace
+
+    Desligado, span() devolve um objeto vazio compartilhado e record/observe
+    retornam na primeira linha, então a instrumentação pode ficar no código.
+    Os eventos usam time.monotonic(), o mesmo relógio dos timestamps do STT e
+    da visão, e ficam num buffer circular até a exportação.
+    """
+    def __init__(self, enabled=None, max_events=None, window=None):
+        self.enabled = settings.TRACE_ENABLED if enabled is None else enabled
+        self.events = deque(maxlen=max_events or settings.TRACE_MAX_EVENTS)
+        self.window = window or settings.TRACE_HISTOGRAM_WINDOW
+        self.histograms = {}
+        self.turns = itertools.count(1)
+        self.origin = time.monotonic()
+
+    def span(self, name, category="pipeline", **args):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, category, args)
+
+    def next_turn(self):
+        """Identificador do próximo turno de conversa"""
+        return next(self.turns)
+
+    def record(self, name, start, end, category="pipeline", **args):
+        """Registra um intervalo já medido (timestamps de time.monotonic())"""
+        if not self.enabled:
+            return
+        self.events.append(("X", name, category, start, end - start, self._track(), args))
+
+    def instant(self, name, category="pipeline", timestamp=None, **args):
+        """Registra um evento pontual (ex.: fim da fala, primeiro token)"""
+        if not self.enabled:
+            return
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        self.events.append(("i", name, category, timestamp, 0.0, self._track(), args))
+
+    def observe(self, metric, seconds):
+        """Adiciona uma amostra (em segundos) ao histograma da métrica"""
+        if not self.enabled:
+            return
+        samples = self.histograms.get(metric)
+        if samples is None:
+            samples = self.histograms[metric] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    @staticmethod
+    def _track():
+        """Linha do trace: a tarefa asyncio (estágio) ou, fora dela, a thread"""
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        return task.get_name() if task is not None else threading.current_thread().name
+
+    def get_stats(self):
+        """p50/p95/p99, média e máximo (ms) de cada métrica na janela recente"""
+        stats = {}
+        for metric, samples in self.histograms.items():
+            if not samples:
+                continue
+            values = np.fromiter(samples, dtype=np.float64, count=len(samples)) * 1000
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            stats[metric] = {
+                "count": len(values),
+                "p50_ms": float(p50),
+                "p95_ms": float(p95),
+                "p99_ms": float(p99),
+                "mean_ms": float(values.mean()),
+                "max_ms": float(values.max())
+            }
+        return stats
+
+    def export(self, path=None):
+        """Grava os eventos no formato Chrome trace (chrome://tracing, Perfetto)"""
+        if not self.enabled:
+            return None
+        path = path or settings.TRACE_PATH
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        track_ids = {}
+        trace_events = []
+        for phase, name, category, start, duration, track, args in list(self.events):
+            if track not in track_ids:
+                track_ids[track] = len(track_ids) + 1
+                trace_events.append({
+                    "ph": "M", "name": "thread_name", "pid": 1, "tid": track_ids[track],
+                    "args": {"name": track}
+                })
+            event = {
+                "ph": phase, "name": name, "cat": category, "pid": 1, "tid": track_ids[track],
+                "ts": (start - self.origin) * 1e6, "args": args
+            }
+            if phase == "X":
+                event["dur"] = duration * 1e6
+            else:
+                event["s"] = "t"
+            trace_events.append(event)
+
+        temp_path = path.with_suffix(".tmp")
+        with open(temp_path, "w") as f:
+            json.dump({
+                "traceEvents": trace_events,
+                "displayTimeUnit": "ms",
+                "otherData": {"metrics": self.get_stats()}
+            }, f, default=str)
+        temp_path.replace(path)
+        return path
+
+    def finish(self):
+        """Exporta o trace e imprime as métricas ao encerrar, se o rastreamento estiver ligado"""
+        if not self.enabled:
+            return
+        print(f"Trace gravado em {self.export()}")
+        self.summary()
+
+    def summary(self):
+        """Imprime as métricas agregadas"""
+        for metric, values in self.get_stats().items():
+            print(
+                f"  {metric:<28} n={values['count']:<5} p50 {values['p50_ms']:8.1f}ms  "
+                f"p95 {values['p95_ms']:8.1f}ms  p99 {values['p99_ms']:8.1f}ms"
+            )
+
+# Instância compartilhada pelos módulos
+tracer = Tracer()
@@ -0,0 +1,90 @@
+import cv2
+from config import settings
+
+def create_tracker():
+    """Cria o rastreador mais leve disponível (KCF no opencv-contrib, senão MIL)"""
+    for module in (cv2, getattr(cv2, "legacy", None)):
+        if module is not None and hasattr(module, "TrackerKCF_create"):
+            return module.TrackerKCF_create()
+    return cv2.TrackerMIL_create()
+
+def location_to_bbox(location):
+    """(top, right, bottom, left) do face_recognition -> (x, y, w, h) do OpenCV"""
+    top, right, bottom, left = location
+    return (left, top, right - left, bottom - top)
+
+def bbox_to_location(bbox):
+    x, y, w, h = (int(v) for v in bbox)
+    return (y, x + w, y + h, x)
+
+def location_iou(a, b):
+    """Interseção sobre união de duas localizações de rosto"""
+    top, right = max(a[0], b[0]), min(a[1], b[1])
+    bottom, left = min(a[2], b[2]), max(a[3], b[3])
+    intersection = max(0, right - left) * max(0, bottom - top)
+    area_a = (a[1] - a[3]) * (a[2] - a[0])
+    area_b = (b[1] - b[3]) * (b[2] - b[0])
+    union = area_a + area_b - intersection
+    return intersection / union if union > 0 else 0.0
+
+class FaceTracker:
+    """Acompanha rostos entre detecções com rastreadores leves do OpenCV"""
+    def __init__(self, detect_every=None, iou_threshold=None, min_size=None):
+        self.detect_every = detect_every or settings.VISION_DETECT_EVERY
+        self.iou_threshold = iou_threshold or settings.VISION_TRACK_IOU
+        self.min_size = min_size or settings.VISION_TRACK_MIN_SIZE
+        self.tracks = []
+        self.next_id = 0
+        self.frames_since_detection = 0
+        self.lost = False
+    
+    def needs_detection(self):
+        """Detectar de novo sem trilhas, quando alguma se perdeu ou a cada N frames"""
+        return (not self.tracks or self.lost
+                or self.frames_since_detection >= self.detect_every)
+    
+    def update(self, frame):
+        """Avança todos os rastreadores um frame, descartando os que se perderam"""
+        height, width = frame.shape[:2]
+        self.frames_since_detection += 1
+        
+        active = []
+        for track in self.tracks:
+            ok, bbox = track["tracker"].update(frame)
+            x, y, w, h = bbox
+            inside = x + w > 0 and y + h > 0 and x < width and y < height
+            if ok and inside and w >= self.min_size and h >= self.min_size:
+                track["location"] = bbox_to_location(bbox)
+                active.append(track)
+            else:
+                self.lost = True
+        self.tracks = active
+        return self.tracks
+    
+    def reconcile(self, frame, locations):
+        """Associa detecções às trilhas existentes por IoU e retorna as trilhas novas"""
+        self.frames_since_detection = 0
+        self.lost = False
+        
+        unmatched = list(self.tracks)
+        updated = []
+        new_tracks = []
+        for location in locations:
+            best = max(unmatched, key=lambda t: location_iou(t["location"], location), default=None)
+            if best is not None and location_iou(best["location"], location) >= self.iou_threshold:
+                unmatched.remove(best)
+                track = best
+            else:
+                track = {"id": self.next_id, "name": "Desconhecido",
+                         "distance": float("inf"), "encoding": None}
+                self.next_id += 1
+                new_tracks.append(track)
+            
+            # Reiniciar o rastreador na caixa detectada corrige a deriva acumulada
+            track["location"] = location
+            track["tracker"] = create_tracker()
+            track["tracker"].init(frame, location_to_bbox(location))
+            updated.append(track)
+        
+        self.tracks = updated
+        return new_tracks
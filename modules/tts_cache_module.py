@@ -0,0 +1,217 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from config import settings
+
+class AudioCache:
+    """Cache de áudio sintetizado em dois níveis: LRU em memória e PCM int16 em disco"""
+    def __init__(self, cache_dir=None, memory_bytes=None, disk_bytes=None):
+        self.cache_dir = cache_dir or settings.DATA_DIR / "tts_cache"
+        self.memory_limit = memory_bytes or settings.TTS_CACHE_MEMORY_BYTES
+        self.disk_limit = disk_bytes or settings.TTS_CACHE_DISK_BYTES
+        
+        self.memory = OrderedDict()  # chave -> {"audio", "timeline"}
+        self.memory_bytes = 0
+        self.disk_index = OrderedDict()  # chave -> bytes, do menos ao mais recente
+        self.disk_bytes = 0
+        self.writing = set()  # chaves sendo gravadas em disco
+        self.lock = threading.Lock()  # protege só os índices; I/O de escrita fica fora dele
+        
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0
+        }
+        self._scan_disk()
+    
+    @staticmethod
+    def make_key(text, voice, sample_rate):
+        """Chave de conteúdo para (texto normalizado, voz, taxa de amostragem)"""
+        normalized = " ".join(text.lower().split())
+        content = f"{voice}\0{sample_rate}\0{normalized}".encode("utf-8")
+        return hashlib.sha256(content).hexdigest()[:32]
+    
+    def _scan_disk(self):
+        """Reconstrói o índice do disco ordenado pelo último uso"""
+        if not self.cache_dir.exists():
+            return
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".pcm"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+        for _, key, size in sorted(entries):
+            self.disk_index[key] = size
+            self.disk_bytes += size
+    
+    def _audio_path(self, key):
+        return self.cache_dir / f"{key}.pcm"
+    
+    def _timeline_path(self, key):
+        return self.cache_dir / f"{key}.npz"
+    
+    def get(self, key, count=True):
+        """Retorna o áudio em cache (array ou memmap somente leitura) ou None
+
+        Com count=False a consulta fica fora das estatísticas: serve para
+        reconferir uma chave cuja consulta o chamador já contou.
+        """
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                self.memory.move_to_end(key)
+                self._count("memory_hits", count)
+                return entry["audio"]
+            
+            if key not in self.disk_index:
+                self._count("misses", count)
+                return None
+            
+            path = self._audio_path(key)
+            try:
+                audio = np.memmap(path, dtype=np.int16, mode="r")
+                os.utime(path)
+            except OSError:
+                self._drop_disk(key)
+                self._count("misses", count)
+                return None
+            
+            self.disk_index.move_to_end(key)
+            self._count("disk_hits", count)
+            self._remember(key, {"audio": audio, "timeline": None})
+            return audio
+    
+    def _count(self, outcome, count):
+        if count:
+            self.stats[outcome] += 1
+    
+    def put(self, key, audio):
+        """Armazena áudio nos dois níveis: memória imediatamente, disco em seguida"""
+        audio = self.remember(key, audio)
+        if audio is not None:
+            self.persist(key, audio)
+    
+    def remember(self, key, audio):
+        """Insere só no nível em memória (barato, pode ser chamado no loop de eventos)"""
+        audio = np.ascontiguousarray(audio, dtype=np.int16)
+        if not len(audio):
+            return None
+        with self.lock:
+            self._remember(key, {"audio": audio, "timeline": None})
+        return audio
+    
+    def persist(self, key, audio):
+        """Grava o áudio em disco (escrita atômica), junto da trilha se já calculada"""
+        with self.lock:
+            if key in self.disk_index or key in self.writing:
+                return
+            self.writing.add(key)
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            path = self._audio_path(key)
+            temp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+            audio.tofile(temp_path)
+            os.replace(temp_path, path)
+            
+            with self.lock:
+                self.disk_index[key] = audio.nbytes
+                self.disk_bytes += audio.nbytes
+                self._evict_disk()
+                entry = self.memory.get(key)
+                timeline = entry["timeline"] if entry is not None else None
+            # Trilha calculada antes de o áudio chegar ao disco: gravar agora
+            if timeline is not None:
+                self._write_timeline(key, timeline)
+        finally:
+            with self.lock:
+                self.writing.discard(key)
+    
+    def get_timeline(self, key):
+        """Retorna a linha do tempo de visemas pré-calculada ou None"""
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None and entry["timeline"] is not None:
+                return entry["timeline"]
+            if key not in self.disk_index:
+                return None
+        
+        path = self._timeline_path(key)
+        try:
+            with np.load(path) as data:
+                timeline = {name: data[name] for name in data.files}
+        except (OSError, ValueError):
+            return None
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                entry["timeline"] = timeline
+        return timeline
+    
+    def put_timeline(self, key, timeline):
+        """Armazena a trilha de visemas (dict de arrays) junto ao áudio correspondente
+
+        Se o áudio ainda está sendo gravado, a trilha fica na entrada em
+        memória e persist() a grava logo depois do áudio.
+        """
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                entry["timeline"] = timeline
+            on_disk = key in self.disk_index
+        if on_disk:
+            self._write_timeline(key, timeline)
+    
+    def _write_timeline(self, key, timeline):
+        path = self._timeline_path(key)
+        temp_path = path.with_suffix(f".{threading.get_ident()}.npz.tmp")
+        with open(temp_path, "wb") as f:
+            np.savez(f, **timeline)
+        os.replace(temp_path, path)
+    
+    def _remember(self, key, entry):
+        """Insere no LRU em memória, removendo os menos usados acima do limite"""
+        previous = self.memory.pop(key, None)
+        if previous is not None:
+            self.memory_bytes -= previous["audio"].nbytes
+            if entry["timeline"] is None:
+                entry["timeline"] = previous["timeline"]
+        
+        self.memory[key] = entry
+        self.memory_bytes += entry["audio"].nbytes
+        
+        while self.memory_bytes > self.memory_limit and len(self.memory) > 1:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_bytes -= evicted["audio"].nbytes
+            self.stats["memory_evictions"] += 1
+    
+    def _evict_disk(self):
+        while self.disk_bytes > self.disk_limit and len(self.disk_index) > 1:
+            key = next(iter(self.disk_index))
+            self._drop_disk(key)
+            self.stats["disk_evictions"] += 1
+    
+    def _drop_disk(self, key):
+        self.disk_bytes -= self.disk_index.pop(key, 0)
+        for path in (self._audio_path(key), self._timeline_path(key)):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+    
+    def get_stats(self):
+        """Estatísticas para dimensionar o cache"""
+        with self.lock:
+            hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+            lookups = hits + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "memory_entries": len(self.memory),
+                "memory_bytes": self.memory_bytes,
+                "disk_entries": len(self.disk_index),
+                "disk_bytes": self.disk_bytes
+            }
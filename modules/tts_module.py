@@ -1,27 +1,178 @@
 import piper
 import numpy as np
 import asyncio
-from pathlib import Path
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from config import settings
+from modules.audio_module import AudioPlayer
+from modules.tts_cache_module import AudioCache
+from modules.batching_module import BatchScheduler, PRIORITY_NORMAL
 
 class TextToSpeech:
     def __init__(self):
         self.model = None
         self.sample_rate = 22050
+        self.player = None
+        self.cache = AudioCache()
+        self.alignments = OrderedDict()  # chave -> (fonemas, amostras por fonema)
         
-    async def load_model(self):
-        """Carrega o modelo Piper TTS"""
-        model_path = Path("models/tts/portuguese_model.onnx")
+        # Uma única thread de síntese: a sessão ONNX já paraleliza internamente
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts")
+        self.batcher = None  # micro-lotes entre sessões (servidor), ver enable_batching()
+        
+    async def load_model(self, output=True):
+        """Carrega o modelo Piper TTS (output=False: só síntese, sem saída de áudio local)"""
+        model_path = settings.TTS_MODEL_PATH
         if not model_path.exists():
             raise FileNotFoundError("Modelo Piper não encontrado")
         
-        self.model = piper.PiperVoice.load(str(model_path))
+        loop = asyncio.get_running_loop()
+        self.model = await loop.run_in_executor(
+            self.executor, piper.PiperVoice.load, str(model_path)
+        )
+        self.sample_rate = self.model.config.sample_rate
+        
+        if output:
+            self.player = AudioPlayer(self.sample_rate)
+            self.player.start()
         print("Modelo TTS carregado")
     
-    async def synthesize(self, text):
-        """Sintetiza fala a partir do texto"""
+    def enable_batching(self):
+        """Agrupa as frases pedidas por várias sessões em lotes na thread de síntese"""
+        self.batcher = BatchScheduler(
+            "tts", self.synthesize_batch, self.executor,
+            max_batch=settings.TTS_BATCH_SIZE, window=settings.TTS_BATCH_WINDOW
+        )
+    
+    def stop(self):
+        """Fecha a saída de áudio e a thread de síntese"""
+        if self.player:
+            self.player.stop()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+    
+    def cache_key(self, text):
+        """Chave do cache de áudio para o texto na voz atual"""
+        return AudioCache.make_key(text, settings.TTS_MODEL_PATH.name, self.sample_rate)
+    
+    async def stream(self, text):
+        """Sintetiza fala numa thread de trabalho, produzindo blocos int16 à medida que ficam prontos"""
         if not self.model:
             raise RuntimeError("Modelo TTS não carregado")
         
-        # Gerar áudio
-        audio_data = self.model.synthesize(text)
-        return np.frombuffer(audio_data, dtype=np.int16)
\ No newline at end of file
+        # Frases repetidas vêm do cache sem rodar o Piper
+        key = self.cache_key(text)
+        cached = self.cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+        
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+        cancelled = threading.Event()
+        alignment = []
+        
+        def produce():
+            try:
+                for chunk in self._synthesize_chunks(text):
+                    if cancelled.is_set():
+                        break
+                    alignment.extend(getattr(chunk, "phoneme_alignments", None) or ())
+                    loop.call_soon_threadsafe(chunks.put_nowait, chunk.audio_int16_array)
+            except Exception as e:
+                loop.call_soon_threadsafe(chunks.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(chunks.put_nowait, None)
+        
+        loop.run_in_executor(self.executor, produce)
+        produced = []
+        try:
+            while True:
+                chunk = await chunks.get()
+                if chunk is None:
+                    break
+                if isinstance(chunk, Exception):
+                    raise chunk
+                produced.append(chunk)
+                yield chunk
+            
+            # Nível em memória já, para a sincronia labial guardar a trilha nesta mesma
+            # entrada; a gravação em disco vai para a thread de síntese
+            if produced:
+                self._remember_alignment(key, alignment)
+                audio = self.cache.remember(key, np.concatenate(produced))
+                if audio is not None:
+                    loop.run_in_executor(self.executor, self.cache.persist, key, audio)
+        finally:
+            cancelled.set()
+    
+    def _synthesize_chunks(self, text):
+        """Blocos do Piper, com o alinhamento de fonemas quando a versão instalada o oferece"""
+        if settings.TTS_PHONEME_ALIGNMENT:
+            try:
+                return self.model.synthesize(text, include_alignments=True)
+            except TypeError:
+                pass
+        return self.model.synthesize(text)
+    
+    def _remember_alignment(self, key, alignment):
+        """Guarda (fonemas, amostras por fonema) produzidos pelo modelo para a sincronia labial"""
+        if not alignment:
+            return
+        self.alignments[key] = (
+            [item.phoneme for item in alignment],
+            np.array([item.num_samples for item in alignment], dtype=np.int64)
+        )
+        while len(self.alignments) > settings.TTS_ALIGNMENT_CACHE:
+            self.alignments.popitem(last=False)
+    
+    def alignment(self, text):
+        """Alinhamento de fonemas da última síntese do texto, ou None (consumido uma vez)"""
+        return self.alignments.pop(self.cache_key(text), None)
+    
+    def synthesize_batch(self, texts):
+        """Sintetiza um lote de frases na thread de síntese: [(áudio, alinhamento)]
+
+        Frases repetidas no lote (saudações comuns a várias sessões) rodam o
+        Piper uma vez só; o cache é consultado e preenchido aqui mesmo.
+        """
+        results = {}
+        for text in dict.fromkeys(texts):
+            key = self.cache_key(text)
+            # synthesize() já contou esta consulta; aqui só se reconfere a chave,
+            # que outro lote pode ter preenchido enquanto o pedido esperava
+            audio = self.cache.get(key, count=False)
+            alignment = []
+            if audio is None:
+                chunks = []
+                for chunk in self._synthesize_chunks(text):
+                    alignment.extend(getattr(chunk, "phoneme_alignments", None) or ())
+                    chunks.append(chunk.audio_int16_array)
+                audio = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int16)
+                if len(audio):
+                    self.cache.put(key, audio)
+            results[text] = (audio, alignment)
+        return [results[text] for text in texts]
+    
+    async def synthesize(self, text, priority=PRIORITY_NORMAL):
+        """Sintetiza fala a partir do texto (a prioridade só vale com micro-lotes)"""
+        if self.batcher:
+            if not self.model:
+                raise RuntimeError("Modelo TTS não carregado")
+            key = self.cache_key(text)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+            audio, alignment = await self.batcher.submit(text, priority)
+            self._remember_alignment(key, alignment)
+            return audio
+        
+        chunks = [chunk async for chunk in self.stream(text)]
+        if not chunks:
+            return np.zeros(0, dtype=np.int16)
+        return np.concatenate(chunks)
+    
+    async def play(self, audio_data):
+        """Enfileira áudio no buffer de reprodução"""
+        if self.player:
+            await self.player.write(audio_data)
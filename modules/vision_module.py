@@ -2,71 +2,338 @@ import cv2
 import face_recognition
 import numpy as np
 import asyncio
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
 from PIL import Image
+from config import settings
+from modules.tracking_module import FaceTracker
+from modules.face_index_module import FaceIndex
+from modules.face_store_module import FaceEncodingStore
+from modules.tracing_module import tracer
+from modules.batching_module import BatchScheduler
+
+def detect_faces(frame):
+    """Detecta e codifica rostos num frame BGR (executado no pool de processos)"""
+    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    face_locations = face_recognition.face_locations(rgb_frame)
+    face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
+    return face_locations, face_encodings
+
+def detect_face_locations(frame, scale):
+    """Detecta rostos num frame reduzido e devolve localizações na escala original"""
+    small_frame = cv2.resize(frame, (0, 0), fx=scale, fy=scale)
+    rgb_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+    return [
+        tuple(int(v / scale) for v in location)
+        for location in face_recognition.face_locations(rgb_frame)
+    ]
+
+def encode_face_regions(regions):
+    """Codifica rostos a partir de recortes (crop BGR, localização no recorte)"""
+    encodings = []
+    for crop, location in regions:
+        rgb_crop = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
+        encodings.append(face_recognition.face_encodings(rgb_crop, [location])[0])
+    return encodings
+
+def detect_faces_batch(frames):
+    """detect_faces para vários frames numa única ida ao pool de processos"""
+    return [detect_faces(frame) for frame in frames]
+
+def detect_face_locations_batch(frames, scale):
+    """detect_face_locations para vários frames numa única ida ao pool de processos"""
+    return [detect_face_locations(frame, scale) for frame in frames]
+
+class FaceBatchers:
+    """Micro-lotes das funções de rosto, compartilhados por vários VisionProcessor
+
+    Frames e recortes de sessões diferentes que chegam na mesma janela vão
+    ao pool numa só chamada, amortizando a serialização e a troca de processo.
+    Detecções têm prazo: um frame que envelheceu na fila é descartado.
+    """
+    def __init__(self, executor, workers=1):
+        options = {
+            "executor": executor,
+            "max_batch": settings.FACE_BATCH_SIZE,
+            "window": settings.FACE_BATCH_WINDOW,
+            "workers": workers
+        }
+        self.detect = BatchScheduler("rostos.detecção", detect_faces_batch, expire=True, **options)
+        self.locate = BatchScheduler(
+            "rostos.localização",
+            partial(detect_face_locations_batch, scale=settings.VISION_DETECTION_SCALE),
+            expire=True, **options
+        )
+        self.encode = BatchScheduler("rostos.codificação", encode_face_regions, **options)
+    
+    async def stop(self):
+        for scheduler in (self.detect, self.locate, self.encode):
+            await scheduler.stop()
+    
+    def get_stats(self):
+        return {
+            scheduler.name: scheduler.get_stats()
+            for scheduler in (self.detect, self.locate, self.encode)
+        }
 
 class VisionProcessor:
-    def __init__(self):
+    def __init__(self, camera=True, face_index=None, executor=None, batchers=None):
         self.cap = None
-        self.known_faces = []
-        self.face_encodings = []
-        self.face_names = []
+        self.camera = camera  # sem câmera os frames chegam por submit_frame()
+        self.face_store = FaceEncodingStore()
+        
+        # Índice de rostos e pool de detecção podem ser compartilhados entre instâncias
+        self.face_index = face_index if face_index is not None else FaceIndex()
+        self.shared_face_index = face_index is not None
+        self.shared_executor = executor
+        self.batchers = batchers  # FaceBatchers: chamadas ao pool agrupadas com outras instâncias
+        
+        # Captura em thread própria: apenas o frame mais recente é mantido
+        self.is_running = False
+        self.capture_thread = None
+        self.frame_lock = threading.Lock()
+        self.latest_frame = None  # (frame, timestamp, frame_id)
+        self.next_frame_id = 0
+        
+        # Detecção em processo separado; resultados publicados com timestamp
+        self.executor = None
+        self.detector_task = None
+        self.latest_result = {"faces": [], "objects": [], "timestamp": 0.0, "frame_id": -1}
+        self.result_ready = asyncio.Event()
+        self.dropped_frames = 0
+        
+        # Modo rastreio: detecção esporádica em frame reduzido, rastreadores entre elas
+        self.tracker = FaceTracker() if settings.VISION_TRACKING else None
         
     async def load_models(self):
         """Carrega modelos de visão computacional"""
-        self.cap = cv2.VideoCapture(0)
-        if not self.cap.isOpened():
-            raise RuntimeError("Não foi possível abrir a câmera")
+        if self.camera:
+            self.cap = await asyncio.to_thread(cv2.VideoCapture, settings.CAMERA_INDEX)
+            if not self.cap.isOpened():
+                raise RuntimeError("Não foi possível abrir a câmera")
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, settings.FRAME_WIDTH)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, settings.FRAME_HEIGHT)
         
-        # Carregar rostos conhecidos
-        await self.load_known_faces()
+        # Carregar rostos conhecidos (um índice compartilhado já vem carregado)
+        if not self.shared_face_index:
+            await self.load_known_faces()
+        await self.start()
         print("Modelos de visão carregados")
     
     async def load_known_faces(self):
-        """Carrega rostos conhecidos do diretório"""
-        faces_dir = Path("data/faces")
-        if faces_dir.exists():
-            for face_file in faces_dir.glob("*.jpg"):
-                image = face_recognition.load_image_file(face_file)
-                encoding = face_recognition.face_encodings(image)[0]
-                self.face_encodings.append(encoding)
-                self.face_names.append(face_file.stem)
+        """Carrega rostos conhecidos do diretório (via cache de codificações)"""
+        names, encodings = await self.face_store.load()
+        self.face_index.add_many(names, encodings)
     
-    async def process_frame(self):
-        """Processa um frame da câmera"""
-        ret, frame = self.cap.read()
-        if not ret:
-            return {"faces": [], "objects": []}
-        
-        # Detectar rostos
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        face_locations = face_recognition.face_locations(rgb_frame)
-        face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
+    async def start(self):
+        """Inicia a thread de captura e o detector em segundo plano"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self.executor = self.shared_executor or ProcessPoolExecutor(max_workers=1)
+        if self.cap is not None:
+            self.capture_thread = threading.Thread(
+                target=self._capture_loop, name="vision-capture", daemon=True
+            )
+            self.capture_thread.start()
+        self.detector_task = asyncio.create_task(self._detector_loop())
+    
+    async def stop(self):
+        """Interrompe captura e detecção e libera a câmera"""
+        self.is_running = False
+        if self.detector_task:
+            self.detector_task.cancel()
+            await asyncio.gather(self.detector_task, return_exceptions=True)
+            self.detector_task = None
+        if self.capture_thread:
+            await asyncio.to_thread(self.capture_thread.join)
+            self.capture_thread = None
+        if self.executor:
+            if self.executor is not self.shared_executor:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        if self.cap:
+            self.cap.release()
+    
+    def _capture_loop(self):
+        """Thread de captura: sobrescreve o último frame a cada leitura"""
+        while self.is_running:
+            ret, frame = self.cap.read()
+            if not ret:
+                time.sleep(0.01)
+                continue
+            self.submit_frame(frame)
+    
+    def submit_frame(self, frame, timestamp=None):
+        """Publica um frame BGR como o mais recente (da câmera ou recebido de fora)"""
+        with self.frame_lock:
+            self.latest_frame = (frame, timestamp or time.monotonic(), self.next_frame_id)
+            self.next_frame_id += 1
+    
+    async def _detector_loop(self):
+        """Detecta rostos no frame mais recente, descartando frames antigos"""
+        loop = asyncio.get_running_loop()
+        last_frame_id = -1
         
-        face_data = []
-        for face_encoding, face_location in zip(face_encodings, face_locations):
-            matches = face_recognition.compare_faces(self.face_encodings, face_encoding)
-            name = "Desconhecido"
+        while self.is_running:
+            started = time.monotonic()
+            with self.frame_lock:
+                latest = self.latest_frame
+            
+            if latest is None or latest[2] == last_frame_id:
+                await asyncio.sleep(0.01)
+                continue
             
-            if True in matches:
-                first_match_index = matches.index(True)
-                name = self.face_names[first_match_index]
+            frame, timestamp, frame_id = latest
+            if frame_id > last_frame_id + 1:
+                self.dropped_frames += frame_id - last_frame_id - 1
+            last_frame_id = frame_id
             
-            face_data.append({
-                "name": name,
-                "location": face_location,
-                "encoding": face_encoding
-            })
+            if started - timestamp > settings.VISION_MAX_STALENESS:
+                # Frame velho demais (captura travada): não vale o custo da detecção
+                continue
+            
+            tracer.observe("vision_frame_age", started - timestamp)
+            try:
+                with tracer.span("vision.process_frame", "vision", frame_id=frame_id) as span:
+                    detected, face_data = await self._process(
+                        loop, frame, timestamp + settings.VISION_MAX_STALENESS
+                    )
+                    span.set(detected=detected, faces=len(face_data))
+            except TimeoutError:
+                # O frame envelheceu na fila de lotes compartilhada
+                continue
+            except Exception as e:
+                # Uma falha (pool quebrado, erro do OpenCV, recorte inválido) não pode
+                # encerrar o detector em silêncio: registrar, esperar e seguir
+                print(f"Erro na detecção de rostos: {e!r}")
+                if isinstance(e, BrokenProcessPool):
+                    self._replace_executor()
+                await asyncio.sleep(settings.VISION_ERROR_BACKOFF)
+                continue
+            self._publish(frame, timestamp, frame_id, face_data)
+            
+            # Limitar a taxa para não ocupar a CPU inteira; rastrear é bem mais barato
+            interval = settings.VISION_INTERVAL if detected else settings.VISION_TRACK_INTERVAL
+            elapsed = time.monotonic() - started
+            await asyncio.sleep(max(0.0, interval - elapsed))
+    
+    def _replace_executor(self):
+        """Recria o pool de detecção próprio após a morte de um processo"""
+        if self.executor is self.shared_executor:
+            return  # o pool compartilhado pertence a quem o criou
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.executor = ProcessPoolExecutor(max_workers=1)
+    
+    async def _process(self, loop, frame, deadline):
+        """Detecta (ou rastreia) e identifica os rostos de um frame"""
+        if self.tracker is not None:
+            detected = self.tracker.needs_detection()
+            face_data = await self._track_step(loop, frame, detected, deadline)
+        else:
+            detected = True
+            if self.batchers:
+                face_locations, face_encodings = await self.batchers.detect.submit(frame, deadline=deadline)
+            else:
+                face_locations, face_encodings = await loop.run_in_executor(
+                    self.executor, detect_faces, frame
+                )
+            identities = self.face_index.match(face_encodings)
+            face_data = [
+                {
+                    "name": name,
+                    "distance": distance,
+                    "location": face_location,
+                    "encoding": face_encoding
+                }
+                for (name, distance), face_encoding, face_location
+                in zip(identities, face_encodings, face_locations)
+            ]
+        return detected, face_data
+    
+    async def _track_step(self, loop, frame, detect, deadline):
+        """Avança o rastreio; detecta e codifica apenas quando necessário"""
+        if not detect:
+            tracks = await asyncio.to_thread(self.tracker.update, frame)
+        else:
+            if self.batchers:
+                face_locations = await self.batchers.locate.submit(frame, deadline=deadline)
+            else:
+                face_locations = await loop.run_in_executor(
+                    self.executor, detect_face_locations, frame, settings.VISION_DETECTION_SCALE
+                )
+            await asyncio.to_thread(self.tracker.reconcile, frame, face_locations)
+            
+            # Codificar (128-d) só rostos ainda sem codificação: os que acabaram de
+            # aparecer e os de uma codificação anterior que falhou
+            new_tracks = [track for track in self.tracker.tracks if track["encoding"] is None]
+            if new_tracks:
+                regions = [self._crop_face(frame, track["location"]) for track in new_tracks]
+                if self.batchers:
+                    encodings = await asyncio.gather(*(
+                        self.batchers.encode.submit(region) for region in regions
+                    ))
+                else:
+                    encodings = await loop.run_in_executor(
+                        self.executor, encode_face_regions, regions
+                    )
+                identities = self.face_index.match(encodings)
+                for track, encoding, (name, distance) in zip(new_tracks, encodings, identities):
+                    track["encoding"] = encoding
+                    track["name"] = name
+                    track["distance"] = distance
+            tracks = self.tracker.tracks
         
+        return [
+            {
+                "name": track["name"],
+                "distance": track["distance"],
+                "location": track["location"],
+                "encoding": track["encoding"],
+                "track_id": track["id"]
+            }
+            for track in tracks
+        ]
+    
+    @staticmethod
+    def _crop_face(frame, location):
+        """Recorta o rosto com margem, devolvendo a localização relativa ao recorte"""
+        height, width = frame.shape[:2]
+        top, right, bottom, left = location
+        margin_y = int((bottom - top) * settings.VISION_ROI_MARGIN)
+        margin_x = int((right - left) * settings.VISION_ROI_MARGIN)
+        y0, y1 = max(0, top - margin_y), min(height, bottom + margin_y)
+        x0, x1 = max(0, left - margin_x), min(width, right + margin_x)
+        crop = np.ascontiguousarray(frame[y0:y1, x0:x1])
+        return crop, (top - y0, right - x0, bottom - y0, left - x0)
+    
+    def _publish(self, frame, timestamp, frame_id, face_data):
         # Detectar objetos (simplificado - pode ser expandido com YOLO/etc)
         object_data = self.detect_objects(frame)
         
-        return {
+        self.latest_result = {
             "faces": face_data,
             "objects": object_data,
-            "raw_frame": frame
+            "raw_frame": frame,
+            "timestamp": timestamp,
+            "frame_id": frame_id
         }
+        self.result_ready.set()
+    
+    async def process_frame(self):
+        """Retorna o resultado de visão mais recente sem esperar pela detecção"""
+        return self.latest_result
+    
+    async def next_result(self):
+        """Aguarda até que um novo resultado de visão seja publicado"""
+        await self.result_ready.wait()
+        self.result_ready.clear()
+        return self.latest_result
     
     def detect_objects(self, frame):
         """Detecta objetos no frame (implementação simplificada)"""
         # TODO: Implementar detecção de objetos com modelo pré-treinado
-        return []
\ No newline at end of file
+        return []
@@ -0,0 +1,93 @@
+import asyncio
+import time
+import unittest
+from unittest import mock
+from config import settings
+
+try:
+    from modules.gemini_module import GeminiBrain
+    from modules.fake_gemini_module import FakeGenerativeModel
+except ImportError:  # google-generativeai não instalado
+    GeminiBrain = None
+
+class StubMemory:
+    """Memória mínima: sem contexto recente nem recuperação semântica"""
+    def get_context(self):
+        return []
+
+    async def retrieve(self, query):
+        return []
+
+@unittest.skipIf(GeminiBrain is None, "google-generativeai não instalado")
+class GeminiBrainTest(unittest.IsolatedAsyncioTestCase):
+    """Repetições, prazo, resposta local e agrupamento contra o modelo simulado"""
+    def setUp(self):
+        patches = {
+            "GEMINI_FIRST_TOKEN_TIMEOUT": 0.5,
+            "GEMINI_STREAM_TIMEOUT": 0.5,
+            "GEMINI_TIMEOUT": 0.5,
+            "GEMINI_RETRY_BASE_DELAY": 0.01,
+            "GEMINI_MAX_RETRIES": 2,
+            "GEMINI_RESPONSE_DEADLINE": 2.0
+        }
+        for name, value in patches.items():
+            patcher = mock.patch.object(settings, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def make_brain(self, **model_options):
+        brain = GeminiBrain(StubMemory())
+        brain.model = FakeGenerativeModel(**model_options)
+        return brain
+
+    async def collect(self, brain, text):
+        return "".join([chunk async for chunk in brain.stream_input(text)])
+
+    async def test_retries_transient_failure(self):
+        brain = self.make_brain(failures=1)
+        reply = await self.collect(brain, "oi")
+        self.assertEqual(reply, brain.model.reply_for("Usuário: oi"))
+        self.assertEqual(brain.model.calls, 2)
+
+    async def test_falls_back_after_retries_and_does_not_cache(self):
+        brain = self.make_brain(failures=10)
+        reply = await self.collect(brain, "oi")
+        self.assertIn(reply, settings.FALLBACK_REPLIES)
+        self.assertEqual(brain.model.calls, settings.GEMINI_MAX_RETRIES + 1)
+
+        # A resposta local não entra no cache: a próxima fala tenta o modelo de novo
+        await self.collect(brain, "oi")
+        self.assertEqual(brain.model.calls, 2 * (settings.GEMINI_MAX_RETRIES + 1))
+
+    async def test_deadline_bounds_time_to_fallback(self):
+        brain = self.make_brain(first_token_latency=5.0)
+        with mock.patch.object(settings, "GEMINI_RESPONSE_DEADLINE", 0.3):
+            started = time.monotonic()
+            reply = await self.collect(brain, "oi")
+            elapsed = time.monotonic() - started
+        self.assertIn(reply, settings.FALLBACK_REPLIES)
+        self.assertLess(elapsed, settings.GEMINI_FIRST_TOKEN_TIMEOUT)
+        self.assertEqual(brain.model.calls, 1)
+
+    async def test_identical_requests_are_coalesced(self):
+        brain = self.make_brain(first_token_latency=0.1)
+        replies = await asyncio.gather(brain.process_input("oi"), brain.process_input("oi"))
+        self.assertEqual(replies[0], replies[1])
+        self.assertEqual(brain.model.calls, 1)
+
+    async def test_follower_recovers_when_leader_is_cancelled(self):
+        brain = self.make_brain(first_token_latency=0.2)
+        leader = asyncio.create_task(self.collect(brain, "oi"))
+        await asyncio.sleep(0.05)
+        follower = asyncio.create_task(brain.process_input("oi"))
+        await asyncio.sleep(0.05)
+        leader.cancel()
+
+        reply = await follower
+        self.assertEqual(reply, brain.model.reply_for("Usuário: oi"))
+        self.assertEqual(brain.model.calls, 2)
+        with self.assertRaises(asyncio.CancelledError):
+            await leader
+
+if __name__ == "__main__":
+    unittest.main()
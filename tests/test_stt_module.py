@@ -0,0 +1,45 @@
+import unittest
+
+try:
+    from modules.stt_module import SpeechToText
+except ImportError:  # speech_recognition, pyaudio ou vosk não instalados
+    SpeechToText = None
+
+def event(text, final):
+    return {"text": text, "final": final, "stable": final, "timestamp": 0.0}
+
+@unittest.skipIf(SpeechToText is None, "dependências de STT não instaladas")
+class PublishTest(unittest.IsolatedAsyncioTestCase):
+    """Fila de eventos cheia enquanto o estágio de escuta está bloqueado"""
+    def setUp(self):
+        self.stt = SpeechToText(microphone=False)
+
+    def drain(self):
+        events = []
+        while not self.stt.events.empty():
+            events.append(self.stt.events.get_nowait())
+        return events
+
+    async def test_final_survives_a_flood_of_partials(self):
+        self.stt._publish(event("primeira fala", True))
+        for i in range(100):
+            self.stt._publish(event(f"parcial {i}", False))
+
+        events = self.drain()
+        finals = [e["text"] for e in events if e["final"]]
+        self.assertEqual(finals, ["primeira fala"])
+        self.assertEqual(len(events), self.stt.events.maxsize)
+        # Os parciais mantidos são os mais recentes, na ordem de chegada
+        self.assertEqual(events[-1]["text"], "parcial 99")
+
+    async def test_new_partial_is_dropped_when_only_finals_are_queued(self):
+        for i in range(self.stt.events.maxsize):
+            self.stt._publish(event(f"final {i}", True))
+        self.stt._publish(event("parcial", False))
+
+        events = self.drain()
+        self.assertTrue(all(e["final"] for e in events))
+        self.assertEqual(len(events), self.stt.events.maxsize)
+
+if __name__ == "__main__":
+    unittest.main()